@@ -14,7 +14,10 @@ from starlette.responses import StreamingResponse
 
 from ontology_llm.app import run_chat, run_chat_trace
 from ontology_llm.dashboard_service import build_dashboard_payload
-from ontology_llm.tools.sql_tools import get_db, init_schema
+from ontology_llm.tools.embedding_tools import get_embedding_cache
+from ontology_llm.tools.pool_tools import pool_stats, read_connection, write_connection
+from ontology_llm.tools.result_cache_tools import get_result_cache
+from ontology_llm.tools.sql_tools import init_schema, shortest_path
 
 
 class ChatRequest(BaseModel):
@@ -109,12 +112,52 @@ def chat_stream(payload: ChatRequest) -> StreamingResponse:
 @app.post("/api/init-db")
 def init_db(db_path: str = DEFAULT_DB) -> dict[str, str]:
     resolved = Path(db_path)
-    resolved.parent.mkdir(parents=True, exist_ok=True)
-    conn = get_db(str(resolved))
-    init_schema(conn)
+    with write_connection(str(resolved)) as conn:
+        init_schema(conn)
     return {"status": "ok", "db_path": str(resolved)}
 
 
+@app.get("/api/path")
+def path(
+    source: str,
+    target: str,
+    db_path: str = DEFAULT_DB,
+    max_depth: int | None = None,
+    time_budget_ms: float | None = None,
+    relation_types: str | None = None,
+    directed: bool = False,
+) -> dict:
+    types = [item.strip() for item in (relation_types or "").split(",") if item.strip()] or None
+    with read_connection(db_path) as conn:
+        search = shortest_path(
+            conn,
+            source,
+            target,
+            max_depth=max_depth,
+            time_budget_ms=time_budget_ms,
+            relation_types=types,
+            directed=directed,
+        )
+    return search.as_dict()
+
+
+@app.get("/api/pool-stats")
+def db_pool_stats() -> dict:
+    return pool_stats()
+
+
+@app.get("/api/embedding-cache-stats")
+def embedding_cache_stats() -> dict:
+    cache = get_embedding_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+
+@app.get("/api/result-cache-stats")
+def result_cache_stats() -> dict:
+    cache = get_result_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+
 def run() -> None:
     import uvicorn
 
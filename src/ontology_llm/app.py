@@ -4,6 +4,7 @@ import argparse
 import json
 import logging
 import os
+from datetime import date
 from pathlib import Path
 from typing import Any, Callable
 
@@ -11,6 +12,7 @@ from dotenv import load_dotenv
 
 from ontology_llm.tools.llm_tools import build_client, try_attach_memori
 from ontology_llm.tools.method_tools import build_system_prompt, normalize_method_id
+from ontology_llm.tools.pool_tools import read_connection, write_connection
 from ontology_llm.tools.prompt_tools import (
     TOKEN_WARN_THRESHOLD_DEFAULT,
     compress_ontology_context,
@@ -21,12 +23,15 @@ from ontology_llm.tools.prompt_tools import (
     log_prompt_budget,
 )
 from ontology_llm.tools.sql_tools import (
-    extract_priority_price_fact,
+    COMPILED_DB_GRACE_HOURS_DEFAULT,
+    bulk_ingest_ontology_yaml,
+    cached_method_lookup,
+    embedding_enabled,
     get_db,
     ingest_ontology_yaml,
     init_schema,
-    is_price_question,
-    lookup_ontology_context_by_method,
+    ontology_sources,
+    refresh_embedding_index,
 )
 
 
@@ -111,237 +116,6 @@ def _normalize_method_id(method_id: str | None) -> str:
     return normalized if normalized in METHOD_IDS else "method1"
 
 
-def _constraint_facts(conn, limit: int) -> list[str]:
-    rows = conn.execute(
-        """
-        SELECT i.id, COALESCE(i.label, ''), COALESCE(group_concat(p.key || '=' || p.value, '; '), '')
-        FROM onto_instances i
-        LEFT JOIN onto_properties p ON p.instance_id = i.id
-        WHERE lower(i.class_name) IN ('constraint', 'rule', 'policy', 'guardrail')
-           OR EXISTS (
-                SELECT 1
-                FROM onto_properties p2
-                WHERE p2.instance_id = i.id
-                  AND lower(p2.key) IN ('constraint', 'rule', 'template', 'policy', 'guardrail')
-           )
-        GROUP BY i.id, i.label
-        LIMIT ?
-        """,
-        (limit,),
-    ).fetchall()
-    return [f"- {inst_id} label='{label}' props=[{props}]" for inst_id, label, props in rows]
-
-
-def _relation_evidence(conn, seed_ids: list[str], limit: int) -> list[str]:
-    if not seed_ids:
-        return []
-    qmarks = ",".join("?" for _ in seed_ids)
-    params: list[Any] = [*seed_ids, *seed_ids, limit]
-    rows = conn.execute(
-        f"""
-        SELECT source_id, type, target_id
-        FROM onto_relations
-        WHERE source_id IN ({qmarks}) OR target_id IN ({qmarks})
-        ORDER BY source_id, type, target_id
-        LIMIT ?
-        """,
-        params,
-    ).fetchall()
-    return [f"- {source} -[{rel}]-> {target}" for source, rel, target in rows]
-
-
-def _multihop_paths(conn, seed_ids: list[str], per_hop_limit: int = 12) -> list[str]:
-    if not seed_ids:
-        return []
-    qmarks = ",".join("?" for _ in seed_ids)
-    first_hop = conn.execute(
-        f"""
-        SELECT source_id, type, target_id
-        FROM onto_relations
-        WHERE source_id IN ({qmarks})
-        LIMIT ?
-        """,
-        [*seed_ids, per_hop_limit],
-    ).fetchall()
-    if not first_hop:
-        return []
-    targets = list({target for _, _, target in first_hop})
-    qmarks2 = ",".join("?" for _ in targets)
-    second_hop = conn.execute(
-        f"""
-        SELECT source_id, type, target_id
-        FROM onto_relations
-        WHERE source_id IN ({qmarks2})
-        LIMIT ?
-        """,
-        [*targets, per_hop_limit],
-    ).fetchall()
-    paths: list[str] = []
-    second_by_source: dict[str, list[tuple[str, str, str]]] = {}
-    for s2, r2, t2 in second_hop:
-        second_by_source.setdefault(s2, []).append((s2, r2, t2))
-    for s1, r1, t1 in first_hop:
-        chained = second_by_source.get(t1, [])
-        if not chained:
-            paths.append(f"- {s1} -[{r1}]-> {t1}")
-            continue
-        for _, r2, t2 in chained:
-            paths.append(f"- {s1} -[{r1}]-> {t1} -[{r2}]-> {t2}")
-    return paths[: per_hop_limit * 2]
-
-
-def _dense_proxy_context(conn, question: str, limit: int) -> tuple[str, dict[str, Any]]:
-    tokens = [t for t in extract_query_terms(question) if t and len(t) >= 2]
-    rows = conn.execute(
-        """
-        SELECT i.id, i.class_name, COALESCE(i.label, ''),
-               COALESCE(group_concat(p.key || '=' || p.value, '; '), '')
-        FROM onto_instances i
-        LEFT JOIN onto_properties p ON p.instance_id = i.id
-        GROUP BY i.id, i.class_name, i.label
-        """
-    ).fetchall()
-    scored: list[dict[str, Any]] = []
-    for inst_id, class_name, label, props in rows:
-        text_id = (inst_id or "").lower()
-        text_class = (class_name or "").lower()
-        text_label = (label or "").lower()
-        text_props = (props or "").lower()
-        score = 0
-        matched: list[str] = []
-        for token in tokens:
-            hit = False
-            if token in text_id:
-                score += 3
-                hit = True
-            if token in text_class:
-                score += 1
-                hit = True
-            if token in text_label:
-                score += 5
-                hit = True
-            if token in text_props:
-                score += 2
-                hit = True
-            if hit:
-                matched.append(token)
-        if score > 0:
-            scored.append(
-                {
-                    "id": inst_id,
-                    "class_name": class_name,
-                    "label": label,
-                    "props": props,
-                    "score": score,
-                    "matched_terms": sorted(set(matched)),
-                }
-            )
-    scored.sort(key=lambda item: (-item["score"], item["id"]))
-    top = scored[:limit]
-    if not top:
-        return "No matching ontology facts found.", {"tokens": tokens, "scored_candidates": []}
-    lines = [
-        f"- {item['id']} ({item['class_name']}) label='{item['label']}' score={item['score']} props=[{item['props']}]"
-        for item in top
-    ]
-    return "\n".join(lines), {"tokens": tokens, "scored_candidates": top}
-
-
-def _enrichment_targets(conn, limit: int) -> list[dict[str, str]]:
-    rows = conn.execute(
-        """
-        SELECT i.id, COALESCE(i.label, ''), p.key, COALESCE(p.value, '')
-        FROM onto_instances i
-        JOIN onto_properties p ON p.instance_id = i.id
-        WHERE lower(COALESCE(p.value, '')) IN ('', 'unknown', 'todo', 'n/a', '?')
-        LIMIT ?
-        """,
-        (limit,),
-    ).fetchall()
-    return [
-        {"id": inst_id, "label": label, "missing_key": key, "value": value}
-        for inst_id, label, key, value in rows
-    ]
-
-
-def _lookup_by_method(
-    conn,
-    *,
-    question: str,
-    method_id: str,
-    limit: int,
-) -> tuple[str, dict[str, Any], dict[str, Any]]:
-    base_context = lookup_ontology_context(conn, question, limit=limit)
-    base_debug = lookup_ontology_debug(conn, question, limit=limit)
-    seed_ids = [item["id"] for item in base_debug.get("candidates", [])[:5] if item.get("id")]
-    method_trace: dict[str, Any] = {"method_id": method_id}
-
-    if method_id == "method1":
-        method_trace["retrieval_type"] = "lexical-grounding"
-        return base_context, base_debug, method_trace
-
-    if method_id == "method2":
-        constraints = _constraint_facts(conn, limit=max(3, limit // 2))
-        method_trace["constraint_count"] = len(constraints)
-        context = base_context
-        if constraints:
-            context = "[Constraint Facts]\n" + "\n".join(constraints) + "\n\n[Entity Facts]\n" + base_context
-        return context, {**base_debug, "constraint_hits": constraints}, method_trace
-
-    if method_id == "method3":
-        rel_lines = _relation_evidence(conn, seed_ids, limit=max(6, limit * 2))
-        method_trace["relation_evidence_count"] = len(rel_lines)
-        context = base_context
-        if rel_lines:
-            context = base_context + "\nrelations:\n" + "\n".join(rel_lines)
-        return context, {**base_debug, "graph_relations": rel_lines}, method_trace
-
-    if method_id == "method4":
-        path_lines = _multihop_paths(conn, seed_ids, per_hop_limit=max(6, limit))
-        method_trace["multi_hop_path_count"] = len(path_lines)
-        context = base_context
-        if path_lines:
-            context = base_context + "\nreasoning_paths:\n" + "\n".join(path_lines)
-        return context, {**base_debug, "reasoning_paths": path_lines}, method_trace
-
-    if method_id == "method5":
-        dense_context, dense_debug = _dense_proxy_context(conn, question, limit=limit)
-        method_trace["retrieval_type"] = "dense-proxy"
-        return dense_context, {**base_debug, **dense_debug}, method_trace
-
-    if method_id == "method6":
-        dense_context, dense_debug = _dense_proxy_context(conn, question, limit=limit)
-        constraints = _constraint_facts(conn, limit=max(3, limit // 2))
-        method_trace["retrieval_type"] = "neuro-symbolic"
-        method_trace["constraint_count"] = len(constraints)
-        context = dense_context
-        if constraints:
-            context = "[Symbolic Rules]\n" + "\n".join(constraints) + "\n\n[Neural Retrieval]\n" + dense_context
-        return context, {**base_debug, **dense_debug, "constraint_hits": constraints}, method_trace
-
-    if method_id == "method7":
-        rel_lines = _relation_evidence(conn, seed_ids, limit=max(4, limit))
-        method_trace["verification_evidence_count"] = len(rel_lines)
-        context = base_context
-        if rel_lines:
-            context = base_context + "\nvalidation_evidence:\n" + "\n".join(rel_lines)
-        return context, {**base_debug, "verification_evidence": rel_lines}, method_trace
-
-    if method_id == "method8":
-        targets = _enrichment_targets(conn, limit=max(3, limit))
-        method_trace["enrichment_target_count"] = len(targets)
-        context = base_context
-        if targets:
-            lines = [
-                f"- {row['id']} label='{row['label']}' missing_key={row['missing_key']} value='{row['value']}'"
-                for row in targets
-            ]
-            context = "[Current Facts]\n" + base_context + "\n\n[Missing Property Signals]\n" + "\n".join(lines)
-        return context, {**base_debug, "enrichment_targets": targets}, method_trace
-
-    return base_context, base_debug, method_trace
-
-
 def run_chat_trace(
     question: str,
     db_path: str,
@@ -357,7 +131,6 @@ def run_chat_trace(
         message="질문 접수",
         input_data={"question": question, "method_id": selected_method},
     )
-    conn = get_db(db_path)
     max_facts = get_env_int("MAX_ONTOLOGY_FACTS", 5)
     max_relations = get_env_int("MAX_RELATIONS", 3, minimum=0)
     max_context_chars = get_env_int("MAX_CONTEXT_CHARS", 1200)
@@ -389,12 +162,14 @@ def run_chat_trace(
             "method_id": selected_method,
         },
     )
-    raw_context, lookup_debug, lookup_trace = _lookup_by_method(
-        conn,
-        question=normalized_question,
-        method_id=selected_method,
-        limit=max(max_facts * 3, max_facts),
-    )
+    with read_connection(db_path) as conn:
+        lookup = cached_method_lookup(
+            conn,
+            question=normalized_question,
+            method_id=selected_method,
+            limit=max(max_facts * 3, max_facts),
+        )
+    raw_context, lookup_debug, lookup_trace = lookup.context, lookup.debug, lookup.trace
     _emit_event(
         on_event,
         stage="lookup",
@@ -405,7 +180,7 @@ def run_chat_trace(
             "lookup_debug": lookup_debug,
             "method_lookup_trace": lookup_trace,
         },
-        meta={"raw_context_chars": len(raw_context)},
+        meta={"raw_context_chars": len(raw_context), "result_cache": "hit" if lookup.cached else "miss"},
     )
 
     _emit_event(
@@ -429,10 +204,9 @@ def run_chat_trace(
         max_relations=max_relations,
         max_context_chars=max_context_chars,
         mode=budget_mode,
+        terms=lookup.terms,
     )
-    price_hint = None
-    if is_price_question(normalized_question):
-        price_hint = extract_priority_price_fact(conn, normalized_question)
+    price_hint = lookup.price_fact
 
     client, model = build_client()
     memori_attached, memori_status = try_attach_memori(client, db_path)
@@ -613,12 +387,78 @@ def main() -> None:
     p_ingest = sub.add_parser("ingest", help="Ingest ontology YAML into SQLite")
     p_ingest.add_argument("--db", default=os.getenv("SQLITE_PATH", "./data/ontology_memori.db"))
     p_ingest.add_argument("--yaml", default="./data/ontology.yaml")
+    p_ingest.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Always apply a content-hash diff instead of bulk loading a YAML seen for the first time",
+    )
+
+    p_comm = sub.add_parser(
+        "build-communities",
+        help="Partition the relation graph into communities and store their summaries (method3)",
+    )
+    p_comm.add_argument("--db", default=os.getenv("SQLITE_PATH", "./data/ontology_memori.db"))
+    p_comm.add_argument(
+        "--full",
+        action="store_true",
+        help="Recompute every community instead of only those touched since the last build",
+    )
+    p_comm.add_argument("--resolution", type=float, default=1.0, help="Louvain resolution (higher = smaller)")
+
+    p_emb = sub.add_parser(
+        "build-embeddings",
+        help="Encode instance documents into the memory-mapped embedding index (method5/6)",
+    )
+    p_emb.add_argument("--db", default=os.getenv("SQLITE_PATH", "./data/ontology_memori.db"))
+    p_emb.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-encode every instance instead of only those changed since the last build",
+    )
 
     p_chat = sub.add_parser("chat", help="Ask ontology-aware question")
     p_chat.add_argument("question")
     p_chat.add_argument("--db", default=os.getenv("SQLITE_PATH", "./data/ontology_memori.db"))
     p_chat.add_argument("--method", default="method1", help="method1..method8")
 
+    p_plans = sub.add_parser(
+        "check-plans",
+        help="Fail if any sql_tools query plan scans a base table on a large synthetic ontology",
+    )
+    p_plans.add_argument("--products", type=int, default=30000)
+    p_plans.add_argument("--stores", type=int, default=5000)
+
+    p_stmt = sub.add_parser(
+        "bench-statements",
+        help="Compare statement-cache hit rate of variable IN-lists vs json_each on a synthetic ontology",
+    )
+    p_stmt.add_argument("--products", type=int, default=5000)
+    p_stmt.add_argument("--stores", type=int, default=500)
+    p_stmt.add_argument("--calls", type=int, default=300)
+    p_stmt.add_argument("--max-seeds", type=int, default=64)
+
+    p_ann = sub.add_parser(
+        "bench-ann",
+        help="Report recall@k and latency of the ANN backends against exact search on synthetic vectors",
+    )
+    p_ann.add_argument("--rows", type=int, default=200_000)
+    p_ann.add_argument("--dim", type=int, default=384)
+    p_ann.add_argument("--queries", type=int, default=200)
+    p_ann.add_argument("--k", type=int, default=10)
+
+    p_prune = sub.add_parser(
+        "prune-ontology-cache",
+        help="Delete superseded compiled ontology DBs (exp --auto-ingest) past a grace period",
+    )
+    p_prune.add_argument("--db", default=os.getenv("SQLITE_PATH", "./data/ontology_memori.db"))
+    p_prune.add_argument(
+        "--grace-hours",
+        type=float,
+        default=COMPILED_DB_GRACE_HOURS_DEFAULT,
+        help="Keep superseded builds younger than this",
+    )
+    p_prune.add_argument("--dry-run", action="store_true", help="Only list what would be deleted")
+
     p_exp = sub.add_parser("exp", help="Run experiment methods under exp/")
     p_exp.add_argument("question", help="User question for experiment")
     p_exp.add_argument("--method", default="all", help="method1..method8 or all")
@@ -627,23 +467,57 @@ def main() -> None:
     p_exp.add_argument(
         "--auto-ingest",
         action="store_true",
-        help="Automatically ingest method-specific ontology before running each method",
+        help="Run each method against its own compiled ontology DB (built once per YAML hash)",
     )
 
     args = parser.parse_args()
 
     if args.cmd == "init-db":
-        Path(args.db).parent.mkdir(parents=True, exist_ok=True)
-        conn = get_db(args.db)
-        init_schema(conn)
+        with write_connection(args.db) as conn:
+            init_schema(conn)
         print(f"Initialized schema at {args.db}")
         return
 
     if args.cmd == "ingest":
-        conn = get_db(args.db)
-        init_schema(conn)
-        ingest_ontology_yaml(conn, args.yaml)
-        print(f"Ingested ontology YAML: {args.yaml} -> {args.db}")
+        with write_connection(args.db) as conn:
+            init_schema(conn)
+            if args.incremental or str(Path(args.yaml).resolve()) in ontology_sources(conn):
+                summary = ingest_ontology_yaml(conn, args.yaml)
+                print(f"Ingested ontology YAML: {args.yaml} -> {args.db} (version {summary['version']})")
+                for kind in ("classes", "instances", "relations"):
+                    counts = ", ".join(f"{op}={count}" for op, count in summary[kind].items())
+                    print(f"  {kind}: {counts}")
+                print(f"  unchanged={summary['unchanged']}")
+            else:
+                report = bulk_ingest_ontology_yaml(conn, args.yaml)
+                print(f"Ingested ontology YAML: {args.yaml} -> {args.db}")
+                print(
+                    f"  rows={report['rows']} (classes={report['classes']}, instances={report['instances']}, "
+                    f"properties={report['properties']}, relations={report['relations']}) "
+                    f"in {report['elapsed_sec']}s -> {report['rows_per_sec']} rows/sec"
+                )
+            if embedding_enabled():
+                print(f"  embeddings: {refresh_embedding_index(conn)}")
+        return
+
+    if args.cmd == "build-embeddings":
+        from ontology_llm.tools.sql_tools import rebuild_embedding_index
+
+        with write_connection(args.db) as conn:
+            init_schema(conn)
+            build = rebuild_embedding_index if args.full else refresh_embedding_index
+            report = build(conn)
+        print(f"Embedding index ({report['mode']}) for {args.db}: {report}")
+        return
+
+    if args.cmd == "build-communities":
+        from ontology_llm.tools.sql_tools import rebuild_communities, refresh_communities
+
+        with write_connection(args.db) as conn:
+            init_schema(conn)
+            build = rebuild_communities if args.full else refresh_communities
+            report = build(conn, resolution=args.resolution)
+        print(f"Communities ({report['mode']}) in {args.db}: {report}")
         return
 
     if args.cmd == "chat":
@@ -651,6 +525,77 @@ def main() -> None:
         print(answer)
         return
 
+    if args.cmd == "check-plans":
+        import tempfile
+
+        from ontology_llm.tools.bench_tools import build_synthetic_ontology, check_query_plans
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = get_db(str(Path(tmp_dir) / "plan_check.db"))
+            init_schema(conn)
+            counts = build_synthetic_ontology(conn, products=args.products, stores=args.stores)
+            results = check_query_plans(conn)
+            conn.close()
+        print(f"Synthetic ontology: {counts}")
+        failed = [item for item in results if not item["ok"]]
+        for item in results:
+            status = "FAIL" if not item["ok"] else ("SCAN*" if item["full_scan_by_design"] else "OK")
+            print(f"[{status}] {item['name']}")
+            for line in item["plan"]:
+                print(f"    {line}")
+        if failed:
+            print(f"Query plan regression: {', '.join(item['name'] for item in failed)}")
+            raise SystemExit(1)
+        return
+
+    if args.cmd == "bench-statements":
+        import tempfile
+
+        from ontology_llm.tools.bench_tools import build_synthetic_ontology, statement_cache_benchmark
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = get_db(str(Path(tmp_dir) / "stmt_bench.db"))
+            init_schema(conn)
+            build_synthetic_ontology(conn, products=args.products, stores=args.stores)
+            report = statement_cache_benchmark(conn, calls=args.calls, max_seeds=args.max_seeds)
+            conn.close()
+        for variant, stats in report.items():
+            print(
+                f"{variant:>15}: hit_rate={stats['hit_rate']:.1%} prepares={stats['prepares']}/{stats['calls']} "
+                f"distinct_sql={stats['distinct_statements']} elapsed={stats['elapsed_ms']}ms"
+            )
+        return
+
+    if args.cmd == "bench-ann":
+        import tempfile
+
+        from ontology_llm.tools.bench_tools import ann_recall_benchmark
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report = ann_recall_benchmark(
+                str(Path(tmp_dir) / "bench.vectors"), rows=args.rows, dim=args.dim, queries=args.queries, k=args.k
+            )
+        print(f"Synthetic vectors: rows={args.rows} dim={args.dim} queries={args.queries} k={args.k}")
+        for item in report:
+            params = " ".join(f"{key}={item[key]}" for key in ("lists", "nprobe", "ef") if key in item)
+            print(
+                f"{item['backend']:>6} {params:<22} recall@{args.k}={item['recall_at_k']:.3f} "
+                f"p50={item['p50_ms']}ms p95={item['p95_ms']}ms build={item['build_sec']}s"
+            )
+        return
+
+    if args.cmd == "prune-ontology-cache":
+        from ontology_llm.exp.controller import ontology_cache_dir
+        from ontology_llm.tools.sql_tools import prune_compiled_ontology_dbs
+
+        cache_dir = ontology_cache_dir(args.db)
+        removed = prune_compiled_ontology_dbs(cache_dir, grace_hours=args.grace_hours, dry_run=args.dry_run)
+        verb = "Would remove" if args.dry_run else "Removed"
+        print(f"{verb} {len(removed)} compiled DB(s) under {cache_dir}")
+        for path in removed:
+            print(f"- {path}")
+        return
+
     if args.cmd == "exp":
         from ontology_llm.exp.controller import run_selected
 
@@ -7,9 +7,8 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
-import yaml
-
 from ontology_llm.tools import prompt_tools
+from ontology_llm.tools.loader_tools import count_ontology_records, iter_ontology_records
 
 
 @dataclass(frozen=True)
@@ -237,7 +236,7 @@ METHOD_EXAMPLE_CATALOG: dict[str, dict[str, Any]] = {
             "빠나 우유가 왜 3000원인지 관계 근거까지 설명해줘",
             "어느 매장에서 팔고 어떤 정책이 연결되는지 알려줘",
         ],
-        "expected_outcome": "node facts + graph relations를 함께 사용해 근거형 응답 생성",
+        "expected_outcome": "node facts + personalized PageRank 상위 relation을 함께 사용해 근거형 응답 생성",
         "extra_group": "method34",
         "dependencies": ["networkx", "neo4j"],
         "env_keys": [
@@ -253,12 +252,15 @@ METHOD_EXAMPLE_CATALOG: dict[str, dict[str, Any]] = {
             "빠나 우유가 생산부터 강남 매장까지 오는 경로를 설명해줘",
             "브랜드에서 매장까지 다단계 경로로 추론해줘",
         ],
-        "expected_outcome": "1-hop/2-hop 경로를 확장하며 선택 경로를 trace로 제시",
+        "expected_outcome": "질문 속 두 엔티티 간 최단 연결 경로 + GRAPH_MAX_HOPS까지 확장한 경로를 trace로 제시",
         "extra_group": "method34",
         "dependencies": ["networkx", "langgraph", "neo4j"],
         "env_keys": [
             "GRAPH_BACKEND",
             "GRAPH_MAX_HOPS",
+            "GRAPH_RELATION_TYPES",
+            "GRAPH_PATH_MAX_DEPTH",
+            "GRAPH_PATH_TIME_BUDGET_MS",
             "NEO4J_URI",
         ],
     },
@@ -274,6 +276,10 @@ METHOD_EXAMPLE_CATALOG: dict[str, dict[str, Any]] = {
         "env_keys": [
             "EMBEDDING_PROVIDER",
             "EMBEDDING_MODEL",
+            "EMBEDDING_INDEX_DTYPE",
+            "EMBEDDING_BATCH_SIZE",
+            "EMBEDDING_ANN",
+            "EMBEDDING_IVF_NPROBE",
             "VECTOR_DB_PROVIDER",
             "VECTOR_TOP_K",
             "HYBRID_ALPHA",
@@ -385,13 +391,7 @@ def build_method_examples(root_dir: Path) -> list[dict[str, Any]]:
 def _load_yaml_counts(path: Path) -> dict[str, int]:
     if not path.exists():
         return {"classes": 0, "instances": 0, "relations": 0}
-    with path.open("r", encoding="utf-8") as fp:
-        payload = yaml.safe_load(fp) or {}
-    return {
-        "classes": len(payload.get("classes", [])),
-        "instances": len(payload.get("instances", [])),
-        "relations": len(payload.get("relations", [])),
-    }
+    return count_ontology_records(path)
 
 
 def _unique_keep_order(items: list[str]) -> tuple[str, ...]:
@@ -411,59 +411,58 @@ def _load_method_ontology_snapshot(root_dir: Path, ontology_file: str) -> Ontolo
     if not path.exists():
         return OntologySnapshot()
 
-    with path.open("r", encoding="utf-8") as fp:
-        payload = yaml.safe_load(fp) or {}
-
-    classes = payload.get("classes", []) or []
-    instances = payload.get("instances", []) or []
-    relations = payload.get("relations", []) or []
-
-    product_labels: list[str] = []
-    rule_ids: list[str] = []
-    relation_types: list[str] = []
-    property_keys: list[str] = []
+    # Streamed record by record; only the distinct labels/keys are kept.
+    counts = {"classes": 0, "instances": 0, "relations": 0}
+    product_labels: dict[str, None] = {}
+    rule_ids: dict[str, None] = {}
+    relation_types: dict[str, None] = {}
+    property_keys: dict[str, None] = {}
     candidate_count = 0
 
-    for inst in instances:
-        inst_id = str(inst.get("id", "")).strip()
-        class_name = str(inst.get("class", "")).strip().lower()
-        label = str(inst.get("label", "")).strip()
+    for section, item in iter_ontology_records(path):
+        counts[section] += 1
+        if section == "relations":
+            rel_type = str(item.get("type", "")).strip()
+            if rel_type:
+                relation_types[rel_type] = None
+            continue
+        if section != "instances":
+            continue
+
+        inst_id = str(item.get("id", "")).strip()
+        class_name = str(item.get("class", "")).strip().lower()
+        label = str(item.get("label", "")).strip()
 
         if (
             class_name in {"product", "beverage"}
             or inst_id.endswith("_MILK")
             or "우유" in label
         ):
-            product_labels.append(label or inst_id)
+            product_labels[label or inst_id] = None
 
         if (
             class_name in {"constraint", "rule", "policy", "guardrail"}
             or inst_id.startswith(("RULE_", "CONS_", "POLICY_"))
         ):
-            rule_ids.append(inst_id or label)
+            rule_ids[inst_id or label] = None
 
         if class_name == "candidateanswer" or inst_id.startswith("CAND_"):
             candidate_count += 1
 
-        for prop in inst.get("properties", []) or []:
+        for prop in item.get("properties", []) or []:
             key = str(prop.get("key", "")).strip()
             if key:
-                property_keys.append(key)
-
-    for rel in relations:
-        rel_type = str(rel.get("type", "")).strip()
-        if rel_type:
-            relation_types.append(rel_type)
+                property_keys[key] = None
 
     return OntologySnapshot(
-        class_count=len(classes),
-        instance_count=len(instances),
-        relation_count=len(relations),
+        class_count=counts["classes"],
+        instance_count=counts["instances"],
+        relation_count=counts["relations"],
         candidate_count=candidate_count,
-        product_labels=_unique_keep_order(product_labels),
-        rule_ids=_unique_keep_order(rule_ids),
-        relation_types=_unique_keep_order(relation_types),
-        property_keys=_unique_keep_order(property_keys),
+        product_labels=_unique_keep_order(list(product_labels)),
+        rule_ids=_unique_keep_order(list(rule_ids)),
+        relation_types=_unique_keep_order(list(relation_types)),
+        property_keys=_unique_keep_order(list(property_keys)),
     )
 
 
@@ -1,15 +1,14 @@
 from __future__ import annotations
 
+import json
 import sqlite3
 from typing import Any
 
 from ontology_llm.tools.llm_tools import build_client, try_attach_memori
 from ontology_llm.tools.sql_tools import (
-    extract_priority_price_fact,
+    RELATIONS_BY_IDS_JSON_QUERY,
     extract_query_terms,
-    get_db,
-    is_price_question,
-    lookup_ontology_context,
+    retrieve_ontology,
 )
 
 _CLIENT = None
@@ -48,18 +47,12 @@ def parse_tokens(question: str) -> list[str]:
 def fetch_relations(conn: sqlite3.Connection, source_ids: list[str]) -> list[tuple[str, str, str]]:
     if not source_ids:
         return []
-    qmarks = ",".join("?" for _ in source_ids)
-    return conn.execute(
-        f"SELECT source_id, type, target_id FROM onto_relations WHERE source_id IN ({qmarks})",
-        source_ids,
-    ).fetchall()
+    return conn.execute(RELATIONS_BY_IDS_JSON_QUERY, (json.dumps(source_ids),)).fetchall()
 
 
-def basic_context(question: str, db_path: str) -> tuple[sqlite3.Connection, str, str | None]:
-    conn = get_db(db_path)
-    context = lookup_ontology_context(conn, question)
-    price_hint = extract_priority_price_fact(conn, question) if is_price_question(question) else None
-    return conn, context, price_hint
+def basic_context(conn: sqlite3.Connection, question: str) -> tuple[str, str | None]:
+    retrieval = retrieve_ontology(conn, question)
+    return retrieval.context(), retrieval.price_fact
 
 
 def format_result(method_id: str, method_name: str, question: str, prompt: str, answer: str) -> dict[str, Any]:
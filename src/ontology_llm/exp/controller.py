@@ -8,7 +8,9 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
-from ontology_llm.tools.sql_tools import get_db, ingest_ontology_yaml, init_schema
+from ontology_llm.exp.base import get_client_model
+from ontology_llm.tools.pool_tools import write_connection
+from ontology_llm.tools.sql_tools import compile_ontology_db, init_schema, reset_ontology
 from ontology_llm.exp import (
     method1_keyword_grounding,
     method2_ontology_prompting,
@@ -47,40 +49,41 @@ ONTOLOGY_MAP = {
 
 
 def reset_ontology_tables(db_path: str) -> None:
-    conn = get_db(db_path)
-    conn.execute("DELETE FROM onto_relations")
-    conn.execute("DELETE FROM onto_properties")
-    conn.execute("DELETE FROM onto_instances")
-    conn.execute("DELETE FROM onto_classes")
-    conn.commit()
+    with write_connection(db_path) as conn:
+        init_schema(conn)
+        reset_ontology(conn)
 
 
-def auto_ingest_for_method(method_key: str, db_path: str) -> None:
+def ontology_cache_dir(db_path: str) -> str:
+    return os.getenv("ONTOLOGY_CACHE_DIR") or str(Path(db_path).parent / "ontology_cache")
+
+
+def auto_ingest_for_method(method_key: str, db_path: str) -> str:
+    """Path of the method's compiled ontology DB, built once per YAML content hash."""
     ontology_path = ONTOLOGY_MAP.get(method_key)
     if not ontology_path:
         raise ValueError(f"No ontology mapping for method: {method_key}")
     if not Path(ontology_path).exists():
         raise FileNotFoundError(f"Ontology file not found: {ontology_path}")
-
-    conn = get_db(db_path)
-    init_schema(conn)
-    reset_ontology_tables(db_path)
-    ingest_ontology_yaml(conn, ontology_path)
+    return compile_ontology_db(ontology_path, ontology_cache_dir(db_path))
 
 
 def run_selected(question: str, db_path: str, method_key: str | None, auto_ingest: bool) -> list[dict]:
     if method_key and method_key != "all":
         if method_key not in METHODS:
             raise ValueError(f"Unknown method: {method_key}. Use one of: {', '.join(METHODS.keys())}, all")
-        if auto_ingest:
-            auto_ingest_for_method(method_key, db_path)
-        return [METHODS[method_key].run(question, db_path)]
+        keys = [method_key]
+    else:
+        keys = list(METHODS.keys())
+
+    if auto_ingest:
+        # Memori (if enabled) stays attached to the shared DB, not the per-method ontology files.
+        get_client_model(db_path)
 
     results: list[dict] = []
-    for key, module in METHODS.items():
-        if auto_ingest:
-            auto_ingest_for_method(key, db_path)
-        results.append(module.run(question, db_path))
+    for key in keys:
+        ontology_db = auto_ingest_for_method(key, db_path) if auto_ingest else db_path
+        results.append(METHODS[key].run(question, ontology_db))
     return results
 
 
@@ -3,13 +3,15 @@ from __future__ import annotations
 import argparse
 
 from ontology_llm.exp.base import basic_context, format_result, llm_answer
+from ontology_llm.tools.pool_tools import read_connection
 
 METHOD_ID = "method1"
 METHOD_NAME = "Keyword Grounding"
 
 
 def run(question: str, db_path: str) -> dict:
-    _, context, _ = basic_context(question, db_path)
+    with read_connection(db_path) as conn:
+        context, _ = basic_context(conn, question)
     system_prompt = "You are an ontology-grounded assistant. Use provided facts first."
     user_prompt = f"[Retrieved by keyword mapping]\n{context}\n\n[Question]\n{question}"
     answer = llm_answer(db_path, system_prompt, user_prompt)
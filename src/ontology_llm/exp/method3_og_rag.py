@@ -2,28 +2,34 @@ from __future__ import annotations
 
 import argparse
 
-from ontology_llm.exp.base import basic_context, format_result, llm_answer
+from ontology_llm.exp.base import format_result, llm_answer
+from ontology_llm.tools.pool_tools import read_connection
+from ontology_llm.tools.sql_tools import (
+    candidate_seed_weights,
+    community_summaries,
+    format_community_summaries,
+    graph_top_k,
+    ranked_relations,
+    retrieve_ontology,
+)
 
 METHOD_ID = "method3"
 METHOD_NAME = "Ontology/Graph RAG"
 
 
 def run(question: str, db_path: str) -> dict:
-    conn, context, _ = basic_context(question, db_path)
-    rows = conn.execute(
-        """
-        SELECT source_id, type, target_id
-        FROM onto_relations
-        ORDER BY source_id, type, target_id
-        LIMIT 20
-        """
-    ).fetchall()
-    rel_text = "\n".join([f"- {s} -[{t}]-> {d}" for s, t, d in rows]) or "- (none)"
+    with read_connection(db_path) as conn:
+        retrieval = retrieve_ontology(conn, question)
+        context = retrieval.context()
+        rows = ranked_relations(conn, candidate_seed_weights(retrieval.candidates, 5), graph_top_k())
+        rel_text = "\n".join([f"- {s} -[{t}]-> {d}" for s, t, d, _ in rows]) or "- (none)"
+        community_text = format_community_summaries(community_summaries(conn, retrieval.seed_ids)) or "- (none)"
 
     system_prompt = "You are a retrieval-augmented assistant grounded on ontology graph structure."
     user_prompt = (
         f"[Node Retrieval]\n{context}\n\n"
         f"[Graph Retrieval]\n{rel_text}\n\n"
+        f"[Community Summaries]\n{community_text}\n\n"
         f"[Question]\n{question}"
     )
     answer = llm_answer(db_path, system_prompt, user_prompt)
@@ -2,21 +2,25 @@ from __future__ import annotations
 
 import argparse
 
-from ontology_llm.exp.base import basic_context, fetch_relations, format_result, llm_answer
+from ontology_llm.exp.base import basic_context, format_result, llm_answer
+from ontology_llm.tools.pool_tools import read_connection
+from ontology_llm.tools.sql_tools import graph_paths, link_entities, shortest_path
 
 METHOD_ID = "method4"
 METHOD_NAME = "KG Reasoning Agent"
 
 
 def run(question: str, db_path: str) -> dict:
-    conn, context, _ = basic_context(question, db_path)
-    seed_rows = conn.execute(
-        "SELECT id FROM onto_instances WHERE lower(label) LIKE '%' || lower(?) || '%' LIMIT 3",
-        (question,),
-    ).fetchall()
-    seeds = [row[0] for row in seed_rows]
-    rels = fetch_relations(conn, seeds)
-    paths = "\n".join([f"- {s} -> {t} -> {d}" for s, t, d in rels]) or "- no path found"
+    with read_connection(db_path) as conn:
+        context, _ = basic_context(conn, question)
+        linked = list(dict.fromkeys(m.instance_id for m in link_entities(conn, question)))
+        seeds = linked[:3]
+        lines = [path.line() for path in graph_paths(conn, seeds)]
+        if len(linked) >= 2:
+            search = shortest_path(conn, linked[0], linked[-1])
+            if search.path:
+                lines.insert(0, search.path.line())
+        paths = "\n".join(lines) or "- no path found"
 
     system_prompt = "You are a graph reasoning agent. Explain answer with explicit relation paths."
     user_prompt = f"[Seed Nodes]\n{seeds}\n\n[Paths]\n{paths}\n\n[Context]\n{context}\n\n[Question]\n{question}"
@@ -2,32 +2,20 @@ from __future__ import annotations
 
 import argparse
 
-from ontology_llm.exp.base import basic_context, format_result, llm_answer, parse_tokens
+from ontology_llm.exp.base import basic_context, format_result, llm_answer
+from ontology_llm.tools.pool_tools import read_connection
+from ontology_llm.tools.sql_tools import dense_context
 
 METHOD_ID = "method5"
-METHOD_NAME = "Ontology-Enhanced Embedding (Token-score proxy)"
+METHOD_NAME = "Ontology-Enhanced Embedding (Hybrid dense + BM25, token-score fallback)"
 
 
 def run(question: str, db_path: str) -> dict:
-    conn, context, _ = basic_context(question, db_path)
-    q_tokens = set(parse_tokens(question))
-    rows = conn.execute(
-        """
-        SELECT i.id, COALESCE(i.label, ''), COALESCE(group_concat(p.value, ' '), '')
-        FROM onto_instances i
-        LEFT JOIN onto_properties p ON p.instance_id = i.id
-        GROUP BY i.id, i.label
-        """
-    ).fetchall()
-
-    scored = []
-    for inst_id, label, values in rows:
-        text = f"{inst_id} {label} {values}".lower()
-        score = sum(1 for tok in q_tokens if tok in text)
-        if score > 0:
-            scored.append((score, inst_id, label, values))
-    scored.sort(reverse=True)
-    top = scored[:5]
+    with read_connection(db_path) as conn:
+        context, _ = basic_context(conn, question)
+        _, debug = dense_context(conn, question, limit=5)
+
+    top = [(item["score"], item["id"], item["label"], item["props"]) for item in debug["scored_candidates"]]
     score_text = "\n".join([f"- score={s} id={i} label={l} values={v}" for s, i, l, v in top]) or "- no scored node"
 
     system_prompt = "You are an assistant that uses ontology-enhanced retrieval scores."
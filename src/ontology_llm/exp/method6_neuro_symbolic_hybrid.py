@@ -3,13 +3,15 @@ from __future__ import annotations
 import argparse
 
 from ontology_llm.exp.base import basic_context, format_result, llm_answer
+from ontology_llm.tools.pool_tools import read_connection
 
 METHOD_ID = "method6"
 METHOD_NAME = "Neuro-Symbolic Hybrid"
 
 
 def run(question: str, db_path: str) -> dict:
-    _, context, price_hint = basic_context(question, db_path)
+    with read_connection(db_path) as conn:
+        context, price_hint = basic_context(conn, question)
     symbolic_section = price_hint or "No deterministic symbolic fact found."
 
     system_prompt = (
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+ANN_BACKENDS = ("auto", "exact", "ivf", "hnsw")
+# Below this many rows one exact matrix-vector product is already a few ms.
+ANN_MIN_ROWS = 50_000
+ANN_BLOCK_ROWS = 4096
+
+IVF_NPROBE_DEFAULT = 16
+IVF_TRAIN_SAMPLE = 65_536
+IVF_KMEANS_ITERS = 12
+IVF_RETRAIN_GROWTH = 2.0
+
+HNSW_M_DEFAULT = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_DEFAULT = 64
+
+
+def resolve_backend(backend: str, rows: int) -> str:
+    """`auto` is ivf from ANN_MIN_ROWS rows up, exact below; unknown names mean exact."""
+    if backend == "auto":
+        return "ivf" if rows >= ANN_MIN_ROWS else "exact"
+    return backend if backend in ANN_BACKENDS else "exact"
+
+
+def ivf_default_lists(rows: int) -> int:
+    return max(1, int(np.sqrt(max(rows, 1))))
+
+
+def _save_npy(path: Path, array: np.ndarray) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp.npy")
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+def _nearest(centroids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ANN_BLOCK_ROWS):
+        block = np.asarray(vectors[start : start + ANN_BLOCK_ROWS], dtype=np.float32)
+        assign[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+class IvfFlat:
+    """Inverted-file index over the embedding rows: spherical k-means centroids
+    plus one list id per row (-1 = free row). Vectors stay in the main file;
+    a query scores only the rows of its `nprobe` closest lists, exactly.
+
+    Files: `centroids.npy` (float32, lists x dim) and `assign.npy` (int32 per row).
+    Trained without live rows it has no lists; searches then fall back to exact.
+    """
+
+    def __init__(self, centroids: np.ndarray, assign: np.ndarray) -> None:
+        self.centroids = centroids
+        self.assign = assign
+        live = np.flatnonzero(assign >= 0)
+        order = live[np.argsort(assign[live], kind="stable")]
+        self.order = order.astype(np.int64)
+        self.indptr = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign[live], minlength=len(centroids)), out=self.indptr[1:])
+
+    @classmethod
+    def train(
+        cls, vectors: np.ndarray, valid: np.ndarray, *, lists: int | None = None, seed: int = 0
+    ) -> IvfFlat:
+        live = np.flatnonzero(valid)
+        if not len(live):
+            empty = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            return cls(empty, np.full(len(valid), -1, dtype=np.int32))
+        lists = min(lists or ivf_default_lists(len(live)), len(live))
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(live), max(IVF_TRAIN_SAMPLE, lists * 40))
+        sample_rows = np.sort(rng.choice(live, size=sample_size, replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), size=lists, replace=False)].copy()
+        for _ in range(IVF_KMEANS_ITERS):
+            labels = _nearest(centroids, sample)
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels, minlength=lists)
+            filled = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+            centroids[filled] = np.add.reduceat(sample[order], starts, axis=0)
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(len(sample), size=len(empty), replace=False)]
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        assign = _nearest(centroids, vectors[: len(valid)])
+        assign[~valid] = -1
+        return cls(centroids, assign)
+
+    @classmethod
+    def load(cls, path: Path) -> IvfFlat:
+        return cls(np.load(path / "centroids.npy"), np.load(path / "assign.npy"))
+
+    def save(self, path: Path) -> None:
+        _save_npy(path / "centroids.npy", self.centroids)
+        _save_npy(path / "assign.npy", self.assign)
+
+    def update(self, rows: np.ndarray, vectors: np.ndarray, deleted: np.ndarray, size: int) -> IvfFlat:
+        assign = np.full(size, -1, dtype=np.int32)
+        assign[: min(size, len(self.assign))] = self.assign[:size]
+        assign[deleted] = -1
+        if len(rows) and len(self.centroids):
+            assign[rows] = _nearest(self.centroids, vectors)
+        return IvfFlat(self.centroids, assign)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        if not len(self.centroids):
+            return np.empty(0, dtype=np.int64)
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+        sims = self.centroids @ query
+        probes = np.argpartition(-sims, nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.order[self.indptr[p] : self.indptr[p + 1]] for p in probes])
+        rows.sort()
+        return rows
+
+
+class HnswIndex:
+    """hnswlib graph (optional dependency) labelled by embedding row; `hnsw.bin`."""
+
+    def __init__(self, index) -> None:
+        self.index = index
+
+    @staticmethod
+    def _module():
+        try:
+            import hnswlib
+        except ModuleNotFoundError as e:
+            raise RuntimeError("ANN backend 'hnsw' needs hnswlib. Run `uv pip install hnswlib` and retry.") from e
+        return hnswlib
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, valid: np.ndarray, *, m: int = HNSW_M_DEFAULT) -> HnswIndex:
+        index = cls._module().Index(space="ip", dim=int(vectors.shape[1]))
+        index.init_index(max_elements=max(len(vectors), 1), ef_construction=HNSW_EF_CONSTRUCTION, M=m)
+        live = np.flatnonzero(valid)
+        for start in range(0, len(live), ANN_BLOCK_ROWS):
+            rows = live[start : start + ANN_BLOCK_ROWS]
+            index.add_items(np.asarray(vectors[rows], dtype=np.float32), rows)
+        return cls(index)
+
+    @classmethod
+    def load(cls, path: Path, dim: int, capacity: int) -> HnswIndex:
+        index = cls._module().Index(space="ip", dim=dim)
+        index.load_index(str(path / "hnsw.bin"), max_elements=max(capacity, 1))
+        return cls(index)
+
+    def save(self, path: Path) -> None:
+        tmp = path / f"hnsw.bin.{os.getpid()}-{threading.get_ident()}.tmp"
+        self.index.save_index(str(tmp))
+        os.replace(tmp, path / "hnsw.bin")
+
+    def update(self, rows: np.ndarray, vectors: np.ndarray, deleted: np.ndarray, size: int) -> HnswIndex:
+        if size > self.index.get_max_elements():
+            self.index.resize_index(size)
+        for row in deleted:
+            self.index.mark_deleted(int(row))
+        if len(rows):
+            # Re-adding a label updates its vector and clears a deleted mark (reused rows).
+            self.index.add_items(np.asarray(vectors, dtype=np.float32), rows)
+        return self
+
+    def search(self, query: np.ndarray, k: int, ef: int) -> tuple[np.ndarray, np.ndarray]:
+        self.index.set_ef(max(ef, k))
+        labels, distances = self.index.knn_query(query.reshape(1, -1), k=k)
+        # space="ip" reports 1 - dot.
+        return labels[0].astype(np.int64), 1.0 - distances[0]
@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+import json
+import random
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from ontology_llm.tools import sql_tools
+
+_SQL_KEYWORDS = {
+    "as", "where", "join", "left", "inner", "on", "group", "order", "limit",
+    "using", "union", "select", "and", "or", "set", "values",
+}
+
+
+@dataclass(frozen=True)
+class PlanCase:
+    name: str
+    sql: str
+    params: tuple[Any, ...]
+    full_scan_by_design: bool = False
+
+
+def build_synthetic_ontology(
+    conn: sqlite3.Connection,
+    *,
+    products: int = 30000,
+    stores: int = 5000,
+    seed: int = 7,
+) -> dict[str, int]:
+    """Populate a milk-retail shaped ontology large enough for planner checks."""
+    rng = random.Random(seed)
+    regions = max(10, stores // 50)
+    suppliers = max(10, products // 200)
+    policies = 40
+
+    classes = [
+        ("Thing", "Root class"),
+        ("Product", "Sellable product"),
+        ("Store", "Retail store"),
+        ("Region", "Sales region"),
+        ("Supplier", "Product supplier"),
+        ("Policy", "Pricing policy"),
+        ("Constraint", "Answering constraint"),
+    ]
+    instances: list[tuple[str, str, str]] = [("PRODUCT_CLASS", "Product", "상품")]
+    properties: list[tuple[str, str, str]] = []
+    relations: list[tuple[str, str, str]] = [("PRODUCT_CLASS", "is_a", "PRODUCT_CLASS")]
+    flavors = ["바나나", "딸기", "초코", "멜론", "커피", "수박", "녹차", "고구마"]
+
+    for r in range(regions):
+        instances.append((f"REGION_{r:04d}", "Region", f"지역{r}"))
+    for s in range(suppliers):
+        instances.append((f"SUPPLIER_{s:05d}", "Supplier", f"공급사{s}"))
+    for p in range(policies):
+        pid = f"POLICY_{p:03d}"
+        instances.append((pid, "Policy", f"가격 정책 {p}"))
+        properties.append((pid, "policy", f"정책 {p}"))
+    for c in range(20):
+        cid = f"RULE_{c:03d}"
+        instances.append((cid, "Constraint", f"응답 규칙 {c}"))
+        properties.append((cid, "rule", f"규칙 본문 {c}"))
+    for s in range(stores):
+        sid = f"STORE_{s:05d}"
+        instances.append((sid, "Store", f"매장{s}"))
+        relations.append((sid, "located_in", f"REGION_{rng.randrange(regions):04d}"))
+    for p in range(products):
+        pid = f"PRODUCT_{p:06d}"
+        flavor = flavors[p % len(flavors)]
+        instances.append((pid, "Product", f"{flavor}우유 {p}"))
+        properties.extend(
+            [
+                (pid, "alias", f"{flavor} 우유 {p}"),
+                (pid, "price_krw", str(1500 + rng.randrange(40) * 100)),
+                (pid, "category", "우유"),
+                (pid, "stock", "unknown" if p % 97 == 0 else str(rng.randrange(50))),
+            ]
+        )
+        relations.append((pid, "is_a", "PRODUCT_CLASS"))
+        relations.append((pid, "supplied_by", f"SUPPLIER_{rng.randrange(suppliers):05d}"))
+        relations.append((pid, "governed_by", f"POLICY_{rng.randrange(policies):03d}"))
+        for store in rng.sample(range(stores), k=min(3, stores)):
+            relations.append((pid, "sold_at", f"STORE_{store:05d}"))
+
+    conn.executemany("INSERT OR REPLACE INTO onto_classes(name, description) VALUES (?, ?)", classes)
+    conn.executemany(
+        "INSERT OR REPLACE INTO onto_instances(id, class_name, label) VALUES (?, ?, ?)", instances
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO onto_properties(instance_id, key, value) VALUES (?, ?, ?)", properties
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO onto_relations(source_id, type, target_id) VALUES (?, ?, ?)", relations
+    )
+    sql_tools.rebuild_instance_docs(conn)
+    sql_tools.rebuild_fts_index(conn)
+    sql_tools.rebuild_surface_index(conn)
+    sql_tools.rebuild_isa_closure(conn)
+    sql_tools.bump_ontology_version(conn)
+    conn.commit()
+    sql_tools.analyze_ontology(conn)
+    return {
+        "instances": len(instances),
+        "properties": len(properties),
+        "relations": len(relations),
+    }
+
+
+def build_plan_cases(seed_ids: list[str]) -> list[PlanCase]:
+    """One case per statement in sql_tools, with representative parameters."""
+    ids_json = json.dumps(seed_ids)
+    docs = "onto_instance_docs"
+    cases = [
+        PlanCase("fts_lookup", sql_tools.FTS_LOOKUP_QUERY, ('"바나나"*', 5)),
+        PlanCase("fts_price_fact", sql_tools.FTS_PRICE_FACT_QUERY, ('"바나나"*',)),
+        PlanCase("fts_delete", sql_tools.FTS_DELETE_SQL, ('id : "PRODUCT_000001"', "PRODUCT_000001")),
+        PlanCase("fts_refresh", sql_tools.FTS_REFRESH_SQL, ("PRODUCT_000001",)),
+        PlanCase("instance_docs", sql_tools.INSTANCE_DOCS_TEMPLATE.format(docs=docs), (ids_json,)),
+        PlanCase("surface_bigram", sql_tools.SURFACE_BIGRAM_QUERY, ("빠나", 200)),
+        PlanCase(
+            "surface_trigram",
+            sql_tools.SURFACE_TRIGRAM_QUERY,
+            (json.dumps(["나나우", "바나나"]), 2, "바나나우", 200),
+        ),
+        PlanCase("surface_forms_by_instance", sql_tools.SURFACE_FORMS_BY_INSTANCE_QUERY, (seed_ids[0],)),
+        PlanCase("surface_sources", sql_tools.SURFACE_SOURCES_QUERY, (seed_ids[0], seed_ids[0])),
+        PlanCase("price_by_ids", sql_tools.PRICE_BY_IDS_QUERY, (ids_json,)),
+        PlanCase("relations_by_ids_json", sql_tools.RELATIONS_BY_IDS_JSON_QUERY, (ids_json,)),
+        PlanCase("constraint_facts", sql_tools.CONSTRAINT_FACTS_TEMPLATE.format(docs=docs), (5,)),
+        PlanCase(
+            "constraint_applicability",
+            sql_tools.CONSTRAINT_APPLICABILITY_TEMPLATE.format(docs=docs),
+            (ids_json, 5),
+        ),
+        PlanCase("community_summaries", sql_tools.COMMUNITY_SUMMARIES_QUERY, (ids_json, 2)),
+        PlanCase("top_communities", sql_tools.TOP_COMMUNITIES_QUERY, (2,), full_scan_by_design=True),
+        PlanCase("community_ids", sql_tools.COMMUNITY_IDS_QUERY, (ids_json,)),
+        PlanCase("community_members", sql_tools.COMMUNITY_MEMBERS_QUERY, ("[1, 2]",)),
+        PlanCase("community_edges", sql_tools.COMMUNITY_EDGES_QUERY, (ids_json,)),
+        PlanCase("isa_edges", sql_tools.ISA_EDGES_QUERY, ()),
+        PlanCase("isa_descendants", sql_tools.ISA_DESCENDANTS_QUERY, ("PRODUCT_CLASS", 5)),
+        PlanCase("isa_ancestor_hits", sql_tools.ISA_ANCESTOR_HITS_QUERY, (ids_json, '["PRODUCT_CLASS"]')),
+        PlanCase("relation_evidence", sql_tools.RELATION_EVIDENCE_QUERY, (ids_json, 10)),
+        PlanCase("graph_paths", sql_tools.GRAPH_PATHS_QUERY, (ids_json, 3, None, None, 12, 400)),
+        PlanCase(
+            "graph_paths_typed",
+            sql_tools.GRAPH_PATHS_QUERY,
+            (ids_json, 3, '["sold_at"]', '["sold_at"]', 12, 400),
+        ),
+        PlanCase("enrichment_targets", sql_tools.ENRICHMENT_TARGETS_QUERY, (5,)),
+        PlanCase(
+            "legacy_like_lookup",
+            sql_tools.LOOKUP_QUERY_TEMPLATE.format(
+                where_clause=sql_tools._build_lookup_where_clause(["바나나"])[0]
+            ),
+            ("%바나나%",) * 5 + (5,),
+            full_scan_by_design=True,
+        ),
+        PlanCase(
+            "dense_proxy",
+            sql_tools.DENSE_PROXY_TEMPLATE.format(docs=docs),
+            (),
+            full_scan_by_design=True,
+        ),
+        PlanCase(
+            "bm25_search",
+            sql_tools.BM25_SEARCH_QUERY,
+            ('{"우유": 1.5, "milk": 0.7}', 10, sql_tools.BM25_K1, sql_tools.BM25_B, 12.0),
+        ),
+        PlanCase(
+            "bm25_scores",
+            sql_tools.BM25_SCORES_QUERY,
+            ('{"우유": 1.5, "milk": 0.7}', ids_json, sql_tools.BM25_K1, sql_tools.BM25_B, 12.0),
+        ),
+        PlanCase("bm25_df", sql_tools.BM25_DF_QUERY, ('["우유", "milk"]',)),
+        PlanCase("bm25_doc_terms", sql_tools.BM25_DOC_TERMS_QUERY, (ids_json,)),
+        PlanCase(
+            "embedding_docs",
+            sql_tools.EMBEDDING_DOCS_TEMPLATE.format(docs=docs),
+            (),
+            full_scan_by_design=True,
+        ),
+        PlanCase(
+            "instance_aggregate", sql_tools.INSTANCE_AGGREGATE_QUERY, (ids_json,)
+        ),
+        PlanCase("hashes_for_keys", sql_tools.HASHES_FOR_KEYS_QUERY, ("bench", "instance", ids_json)),
+        PlanCase(
+            "other_source_hash",
+            sql_tools.OTHER_SOURCE_HASH_QUERY,
+            ("instance", seed_ids[0], "bench"),
+        ),
+        PlanCase(
+            "relations_touching", sql_tools.RELATIONS_TOUCHING_QUERY, (seed_ids[0], seed_ids[0])
+        ),
+        PlanCase("linker_surfaces", sql_tools.LINKER_SURFACES_QUERY, (), full_scan_by_design=True),
+    ]
+    return cases
+
+
+def _base_table_names(sql: str) -> set[str]:
+    names: set[str] = set()
+    for table, alias in re.findall(r"\b(onto_[a-z_]+)\b(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?", sql):
+        names.add(table)
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            names.add(alias)
+    return names
+
+
+def explain_plan(conn: sqlite3.Connection, sql: str, params: tuple[Any, ...]) -> list[str]:
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def check_query_plans(conn: sqlite3.Connection) -> list[dict[str, Any]]:
+    """EXPLAIN QUERY PLAN for every sql_tools statement, flagging base-table SCANs."""
+    seed_ids = [
+        row[0]
+        for row in conn.execute(
+            "SELECT id FROM onto_instances WHERE id >= 'PRODUCT_' ORDER BY id LIMIT 5"
+        )
+    ] or ["PRODUCT_000000"]
+    results: list[dict[str, Any]] = []
+    for case in build_plan_cases(seed_ids):
+        plan = explain_plan(conn, case.sql, case.params)
+        tables = _base_table_names(case.sql)
+        scans = [
+            line
+            for line in plan
+            if line.startswith("SCAN ")
+            and "VIRTUAL TABLE" not in line
+            and line.split()[1] in tables
+        ]
+        results.append(
+            {
+                "name": case.name,
+                "plan": plan,
+                "scans": scans,
+                "full_scan_by_design": case.full_scan_by_design,
+                "ok": case.full_scan_by_design or not scans,
+            }
+        )
+    return results
+
+
+# The IN-list statements as they were before json_each: one SQL text per seed count.
+_VARIABLE_ARITY_SQL = {
+    "relation_evidence": (
+        "SELECT source_id, type, target_id FROM onto_relations "
+        "WHERE source_id IN ({qmarks}) OR target_id IN ({qmarks}) "
+        "ORDER BY source_id, type, target_id LIMIT ?"
+    ),
+    "relations_by_ids": "SELECT source_id, type, target_id FROM onto_relations WHERE source_id IN ({qmarks})",
+}
+
+
+def _variable_arity_call(name: str, ids: list[str]) -> tuple[str, list[Any]]:
+    sql = _VARIABLE_ARITY_SQL[name].format(qmarks=",".join("?" for _ in ids))
+    if name == "relation_evidence":
+        return sql, [*ids, *ids, 10]
+    return sql, list(ids)
+
+
+def _json_call(name: str, ids: list[str]) -> tuple[str, list[Any]]:
+    ids_json = json.dumps(ids)
+    if name == "relation_evidence":
+        return sql_tools.RELATION_EVIDENCE_QUERY, [ids_json, 10]
+    return sql_tools.RELATIONS_BY_IDS_JSON_QUERY, [ids_json]
+
+
+def statement_cache_benchmark(
+    conn: sqlite3.Connection,
+    *,
+    calls: int = 300,
+    max_seeds: int = 64,
+    seed: int = 7,
+) -> dict[str, dict[str, Any]]:
+    """Statement-cache hit rate of variable-arity IN-lists vs. json_each, same workload.
+
+    A call counts as a miss when SQLite had to prepare the statement, detected
+    through the authorizer callback (it only fires while preparing).
+    """
+    rng = random.Random(seed)
+    all_ids = [row[0] for row in conn.execute("SELECT id FROM onto_instances ORDER BY id")]
+    if not all_ids:
+        raise ValueError("statement_cache_benchmark needs a populated ontology")
+    ids = rng.sample(all_ids, min(max_seeds, len(all_ids)))
+    workload = [
+        (name, rng.sample(ids, rng.randint(1, len(ids))))
+        for name in rng.choices(sorted(_VARIABLE_ARITY_SQL), k=calls)
+    ]
+
+    prepared = [False]
+
+    def authorizer(*_: Any) -> int:
+        prepared[0] = True
+        return sqlite3.SQLITE_OK
+
+    report: dict[str, dict[str, Any]] = {}
+    conn.set_authorizer(authorizer)
+    try:
+        for variant, build in (("variable_arity", _variable_arity_call), ("json_each", _json_call)):
+            misses = 0
+            texts: set[str] = set()
+            started = time.perf_counter()
+            for name, seed_ids in workload:
+                sql, params = build(name, seed_ids)
+                texts.add(sql)
+                prepared[0] = False
+                conn.execute(sql, params).fetchall()
+                misses += prepared[0]
+            elapsed = time.perf_counter() - started
+            report[variant] = {
+                "calls": calls,
+                "distinct_statements": len(texts),
+                "prepares": misses,
+                "hit_rate": round(1 - misses / calls, 3) if calls else 0.0,
+                "elapsed_ms": round(elapsed * 1000, 2),
+            }
+    finally:
+        conn.set_authorizer(None)
+    return report
+
+
+def _synthetic_unit_vectors(rng: Any, rows: int, dim: int, clusters: int) -> Any:
+    import numpy as np
+
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, size=rows)] + 0.6 * rng.standard_normal((rows, dim)).astype(
+        np.float32
+    )
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def ann_recall_benchmark(
+    index_path: str,
+    *,
+    rows: int = 200_000,
+    dim: int = 384,
+    queries: int = 200,
+    k: int = 10,
+    nprobes: tuple[int, ...] = (4, 8, 16, 32, 64),
+    efs: tuple[int, ...] = (16, 32, 64, 128),
+    clusters: int = 256,
+    seed: int = 7,
+) -> list[dict[str, Any]]:
+    """recall@k and latency of each ANN setting against exact search on clustered unit vectors.
+
+    The index is written to `index_path` (float32, same file layout as the
+    embedding index); hnsw rows are skipped when hnswlib is not installed.
+    """
+    import importlib.util
+
+    import numpy as np
+
+    from ontology_llm.tools.ann_tools import ivf_default_lists
+    from ontology_llm.tools.embedding_tools import SEARCH_BLOCK_ROWS, EmbeddingIndex
+
+    rng = np.random.default_rng(seed)
+    data = _synthetic_unit_vectors(rng, rows, dim, clusters)
+    probes = _synthetic_unit_vectors(np.random.default_rng(seed + 1), queries, dim, clusters)
+    ids = [f"V{row:08d}" for row in range(rows)]
+    index = EmbeddingIndex.build(
+        index_path,
+        model="synthetic",
+        dtype="float32",
+        version=0,
+        count=rows,
+        chunks=(
+            (ids[start : start + SEARCH_BLOCK_ROWS], data[start : start + SEARCH_BLOCK_ROWS])
+            for start in range(0, rows, SEARCH_BLOCK_ROWS)
+        ),
+    )
+
+    def measure(backend: str, params: dict[str, int], build_sec: float, **search: Any) -> dict[str, Any]:
+        latencies = []
+        hits = 0
+        for query, truth in zip(probes, exact):
+            started = time.perf_counter()
+            found = index.search(query, k, **search)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len(truth & {inst_id for inst_id, _ in found})
+        latencies.sort()
+        return {
+            "backend": backend,
+            **params,
+            "recall_at_k": round(hits / (k * len(probes)), 4),
+            "p50_ms": round(latencies[len(latencies) // 2], 3),
+            "p95_ms": round(latencies[int(len(latencies) * 0.95)], 3),
+            "build_sec": round(build_sec, 3),
+        }
+
+    exact = [{inst_id for inst_id, _ in index.search(query, k, exact=True)} for query in probes]
+    report = [measure("exact", {}, 0.0, exact=True)]
+
+    started = time.perf_counter()
+    index = index.train_ann("ivf")
+    build_sec = time.perf_counter() - started
+    lists = ivf_default_lists(rows)
+    report.extend(
+        measure("ivf", {"lists": lists, "nprobe": nprobe}, build_sec, nprobe=nprobe) for nprobe in nprobes
+    )
+
+    if importlib.util.find_spec("hnswlib") is not None:
+        started = time.perf_counter()
+        index = index.train_ann("hnsw")
+        build_sec = time.perf_counter() - started
+        report.extend(measure("hnsw", {"ef": ef}, build_sec, ef=ef) for ef in efs)
+    return report
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import math
+import re
+import unicodedata
+from collections import Counter
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Query terms carried by more than this share of documents are dropped while a
+# rarer term remains: they barely move the ranking but their postings dominate the cost.
+BM25_MAX_DF_RATIO = 0.25
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+|[가-힣]+")
+
+
+def bm25_terms(text: str) -> Counter[str]:
+    """Term frequencies: lowercase latin/digit words and Hangul character bigrams.
+
+    Bigrams let "바나나우유가" match "바나나우유" without a morphological
+    analyzer; a one-syllable Hangul word is kept whole.
+    """
+    counts: Counter[str] = Counter()
+    for token in _TOKEN_RE.findall(unicodedata.normalize("NFKC", text).lower()):
+        if token[0] >= "가":
+            if len(token) == 1:
+                counts[token] += 1
+            else:
+                counts.update(token[i : i + 2] for i in range(len(token) - 1))
+        elif len(token) >= 2 or token.isdigit():
+            counts[token] += 1
+    return counts
+
+
+def bm25_idf(docs: int, df: int) -> float:
+    """Lucene-style idf, never negative."""
+    return math.log(1.0 + (docs - df + 0.5) / (df + 0.5))
+
+
+def query_term_weights(terms: Counter[str], df: dict[str, int], docs: int) -> dict[str, float]:
+    """idf x query tf for terms present in the index, dropping very common ones when rarer exist."""
+    present = {term: count for term, count in terms.items() if df.get(term)}
+    rare = {term: count for term, count in present.items() if df[term] <= BM25_MAX_DF_RATIO * docs}
+    chosen = rare or present
+    return {term: count * bm25_idf(docs, df[term]) for term, count in chosen.items()}
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterable
+
+COMMUNITY_RESOLUTION_DEFAULT = 1.0
+COMMUNITY_SEED = 42
+SUMMARY_KEY_MEMBERS = 5
+SUMMARY_RELATION_TYPES = 5
+SUMMARY_FACTS = 3
+
+
+@dataclass(frozen=True)
+class CommunitySummary:
+    """Extractive digest of one community: same members and facts give the same text."""
+
+    members: tuple[str, ...]
+    title: str
+    summary: str
+
+
+def detect_communities(
+    edges: Iterable[tuple[str, str]],
+    *,
+    resolution: float = COMMUNITY_RESOLUTION_DEFAULT,
+    seed: int = COMMUNITY_SEED,
+) -> list[list[str]]:
+    """Louvain partition of the undirected relation graph (parallel edges add weight).
+
+    Communities come back as sorted member lists, largest first, ties by first
+    member, so a fixed seed gives a reproducible order.
+    """
+    import networkx as nx
+
+    graph = nx.Graph()
+    for source, target in edges:
+        if source == target:
+            graph.add_node(source)
+            continue
+        if graph.has_edge(source, target):
+            graph[source][target]["weight"] += 1
+        else:
+            graph.add_edge(source, target, weight=1)
+    if not graph.number_of_nodes():
+        return []
+    parts = nx.community.louvain_communities(graph, weight="weight", resolution=resolution, seed=seed)
+    communities = [sorted(part) for part in parts]
+    communities.sort(key=lambda members: (-len(members), members[0]))
+    return communities
+
+
+def summarize_community(
+    members: list[str],
+    *,
+    labels: dict[str, str],
+    classes: dict[str, str],
+    facts: dict[str, str],
+    edges: list[tuple[str, str, str]],
+) -> CommunitySummary:
+    """Title plus a few key lines: class mix, hub members, relation types, top facts.
+
+    `edges` are the (source, type, target) rows inside the community; members
+    are ranked by that internal degree, then id.
+    """
+    degree: Counter[str] = Counter()
+    for source, _, target in edges:
+        degree[source] += 1
+        degree[target] += 1
+    ranked = sorted(members, key=lambda node: (-degree[node], node))
+    hub = ranked[0]
+    class_mix = Counter(classes.get(node, "?") for node in members)
+    mix = ", ".join(f"{cls} {count}" for cls, count in sorted(class_mix.items(), key=lambda kv: (-kv[1], kv[0])))
+    title = labels.get(hub) or hub
+    if len(members) > 1:
+        title = f"{title} 외 {len(members) - 1}개"
+
+    key_members = ", ".join(
+        f"{node}({labels[node]})" if labels.get(node) else node for node in ranked[:SUMMARY_KEY_MEMBERS]
+    )
+    rel_mix = Counter(rel for _, rel, _ in edges)
+    relations = ", ".join(
+        f"{rel}×{count}"
+        for rel, count in sorted(rel_mix.items(), key=lambda kv: (-kv[1], kv[0]))[:SUMMARY_RELATION_TYPES]
+    )
+    lines = [f"members: {len(members)} ({mix})", f"key members: {key_members}"]
+    if relations:
+        lines.append(f"relations: {relations}")
+    lines.extend(facts[node] for node in ranked[:SUMMARY_FACTS] if facts.get(node))
+    return CommunitySummary(members=tuple(members), title=title, summary="\n".join(lines))
@@ -0,0 +1,554 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from ontology_llm.tools.ann_tools import (
+    HNSW_EF_DEFAULT,
+    IVF_NPROBE_DEFAULT,
+    IVF_RETRAIN_GROWTH,
+    HnswIndex,
+    IvfFlat,
+    resolve_backend,
+)
+from ontology_llm.tools.pool_tools import DbScopedCache, read_connection, write_connection
+
+EMBEDDING_MODEL_DEFAULT = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE_DEFAULT = 256
+# float32 is searched in place; float16 halves the file but is upcast per block (~5x slower search).
+EMBEDDING_DTYPES = ("float32", "float16")
+INDEX_SUFFIX = ".vectors"
+SEARCH_BLOCK_ROWS = 4096
+QUERY_CACHE_SIZE = 1024
+EMBEDDING_CACHE_PATH_DEFAULT = "./data/embedding_cache.db"
+EMBEDDING_CACHE_MAX_ENTRIES_DEFAULT = 500_000
+# Pending last_used refreshes are written with the next put_many, or once this many pile up.
+EMBEDDING_CACHE_TOUCH_FLUSH_ROWS = 4096
+
+EMBEDDING_CACHE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    model TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY(model, text_hash)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache(last_used);
+"""
+
+EMBEDDING_CACHE_GET_QUERY = """
+SELECT text_hash, vector
+FROM embedding_cache
+WHERE model = ?1 AND text_hash IN (SELECT value FROM json_each(?2))
+"""
+
+EMBEDDING_CACHE_TOUCH_SQL = """
+UPDATE embedding_cache SET last_used = ?3
+WHERE model = ?1 AND text_hash IN (SELECT value FROM json_each(?2))
+"""
+
+EMBEDDING_CACHE_EVICT_SQL = """
+DELETE FROM embedding_cache
+WHERE (model, text_hash) IN (
+    SELECT model, text_hash FROM embedding_cache ORDER BY last_used LIMIT ?
+)
+"""
+
+
+def index_dir(db_path: str | Path) -> Path:
+    """Sidecar directory of a database's embedding index: `<db>.vectors/`."""
+    db_path = Path(db_path)
+    return db_path.with_name(db_path.name + INDEX_SUFFIX)
+
+
+@lru_cache(maxsize=2)
+def load_encoder(model_name: str):
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ModuleNotFoundError as e:
+        missing = e.name or "dependency"
+        raise RuntimeError(
+            f"Embedding dependency missing: {missing}. Run `uv sync --extra method5` and retry."
+        ) from e
+    return SentenceTransformer(model_name, device="cpu")
+
+
+def normalize_text(text: str) -> str:
+    """NFKC + collapsed whitespace: the form cache keys are hashed from."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk vectors keyed by (model, sha256 of the normalized text), in SQLite.
+
+    Lookups and inserts are batched (one json_each statement per call).
+    Lookups use pooled read connections; only inserts take the pool's single
+    WAL writer. Hits are remembered in memory and their `last_used` is
+    written with the next put_many (or once EMBEDDING_CACHE_TOUCH_FLUSH_ROWS
+    are pending), right before eviction drops the least recently used rows
+    past `max_entries`. Hit/miss counters are kept per process.
+    """
+
+    def __init__(self, path: str, *, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES_DEFAULT) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._ready = False
+        self._touched: dict[str, set[str]] = {}
+        self._pending_touches = 0
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+        self.evicted = 0
+
+    def _connection(self):
+        self._ensure_schema()
+        return write_connection(self.path)
+
+    def _reader(self):
+        self._ensure_schema()
+        return read_connection(self.path)
+
+    def _ensure_schema(self) -> None:
+        if not self._ready:
+            with write_connection(self.path) as conn:
+                conn.executescript(EMBEDDING_CACHE_SCHEMA_SQL)
+            self._ready = True
+
+    def _take_touches(self) -> dict[str, set[str]]:
+        with self._lock:
+            touched, self._touched, self._pending_touches = self._touched, {}, 0
+        return touched
+
+    def _write_touches(self, conn, touched: dict[str, set[str]]) -> None:
+        now = time.time()
+        for model, keys in touched.items():
+            conn.execute(EMBEDDING_CACHE_TOUCH_SQL, (model, json.dumps(sorted(keys)), now))
+
+    def get_many(self, model: str, keys: list[str]) -> dict[str, np.ndarray]:
+        """Cached float32 vectors for the given text hashes (misses are absent)."""
+        if not keys:
+            return {}
+        keys_json = json.dumps(sorted(set(keys)))
+        with self._reader() as conn:
+            found = {
+                key: np.frombuffer(blob, dtype=np.float32)
+                for key, blob in conn.execute(EMBEDDING_CACHE_GET_QUERY, (model, keys_json))
+            }
+        with self._lock:
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+            if found:
+                touched = self._touched.setdefault(model, set())
+                before = len(touched)
+                touched.update(found)
+                self._pending_touches += len(touched) - before
+            flush = self._pending_touches >= EMBEDDING_CACHE_TOUCH_FLUSH_ROWS
+        if flush:
+            self.flush_touches()
+        return found
+
+    def flush_touches(self) -> None:
+        """Write the pending `last_used` refreshes in one transaction."""
+        touched = self._take_touches()
+        if touched:
+            with self._connection() as conn:
+                self._write_touches(conn, touched)
+                conn.commit()
+
+    def put_many(self, model: str, items: dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+        now = time.time()
+        touched = self._take_touches()
+        with self._connection() as conn:
+            self._write_touches(conn, touched)
+            conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache(model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [
+                    (model, key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                    for key, vector in items.items()
+                ],
+            )
+            excess = conn.execute("SELECT count(*) FROM embedding_cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(EMBEDDING_CACHE_EVICT_SQL, (excess,))
+            conn.commit()
+        with self._lock:
+            self.puts += len(items)
+            self.evicted += max(excess, 0)
+
+    def stats(self) -> dict[str, object]:
+        with self._reader() as conn:
+            entries, size = conn.execute(
+                "SELECT count(*), COALESCE(sum(length(vector)), 0) FROM embedding_cache"
+            ).fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "vector_bytes": size,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "puts": self.puts,
+                "evicted": self.evicted,
+            }
+
+
+_CACHE: EmbeddingCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    """Process-wide cache at EMBEDDING_CACHE_PATH (empty value disables it)."""
+    global _CACHE
+    path = os.getenv("EMBEDDING_CACHE_PATH", EMBEDDING_CACHE_PATH_DEFAULT).strip()
+    if not path:
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None or _CACHE.path != path:
+            try:
+                max_entries = max(1, int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "")))
+            except ValueError:
+                max_entries = EMBEDDING_CACHE_MAX_ENTRIES_DEFAULT
+            _CACHE = EmbeddingCache(path, max_entries=max_entries)
+        return _CACHE
+
+
+def encode_texts(model_name: str, texts: list[str], batch_size: int = EMBEDDING_BATCH_SIZE_DEFAULT) -> np.ndarray:
+    """L2-normalized float32 rows (dot product = cosine), encoded `batch_size` texts per forward pass.
+
+    Texts already in the embedding cache are not re-encoded; duplicates
+    within `texts` are encoded once.
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    cache = get_embedding_cache()
+    keys = [text_hash(text) for text in texts]
+    known = cache.get_many(model_name, keys) if cache is not None else {}
+    todo = {key: text for key, text in zip(keys, texts) if key not in known}
+    if todo:
+        vectors = load_encoder(model_name).encode(
+            list(todo.values()),
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        fresh = dict(zip(todo, np.asarray(vectors, dtype=np.float32)))
+        if cache is not None:
+            cache.put_many(model_name, fresh)
+        known.update(fresh)
+    return np.stack([known[key] for key in keys])
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def encode_query(model_name: str, text: str) -> np.ndarray:
+    vector = encode_texts(model_name, [text], batch_size=1)[0].copy()
+    vector.setflags(write=False)
+    return vector
+
+
+def _write_json(path: Path, payload: object) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class EmbeddingIndex:
+    """Row-major vector file (`vectors.npy`, memory-mapped) plus its id map.
+
+    Row i of the file belongs to `ids[i]`; an empty id marks a free row left
+    by a deleted instance, reused by a later insert once that empty id has
+    been published. The file may have spare
+    capacity beyond `len(ids)` so inserts do not rewrite it every time.
+    `meta.json` holds the model, dtype, ANN settings and the ontology version
+    it reflects, and is replaced last on every write. In-place row writes only
+    touch rows that readers of the previous ids.json treat as free, past its
+    end, or owned by the same id (a newer vector), so every reader gets an
+    id-consistent view; a reader that sees a new meta also sees the vectors,
+    ids and ANN files it describes.
+    """
+
+    def __init__(self, path: Path, meta: dict, ids: list[str], vectors: np.ndarray) -> None:
+        self.path = path
+        self.meta = meta
+        self.ids = ids
+        self.vectors = vectors
+        self.rows = {inst_id: row for row, inst_id in enumerate(ids) if inst_id}
+        self.valid = np.fromiter((bool(inst_id) for inst_id in ids), dtype=bool, count=len(ids))
+        self.ann: IvfFlat | HnswIndex | None = None
+        if self.backend == "ivf":
+            self.ann = IvfFlat.load(path)
+        elif self.backend == "hnsw":
+            self.ann = HnswIndex.load(path, int(meta["dim"]), vectors.shape[0])
+
+    @property
+    def backend(self) -> str:
+        return self.meta.get("ann", "exact")
+
+    @property
+    def model(self) -> str:
+        return self.meta["model"]
+
+    @property
+    def version(self) -> int:
+        return int(self.meta["version"])
+
+    @classmethod
+    def open(cls, path: str | Path, mode: str = "r") -> EmbeddingIndex | None:
+        path = Path(path)
+        try:
+            meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+            ids = json.loads((path / "ids.json").read_text(encoding="utf-8"))
+            vectors = np.load(path / "vectors.npy", mmap_mode=mode)
+        except FileNotFoundError:
+            return None
+        return cls(path, meta, ids, vectors)
+
+    def _top(self, rows: np.ndarray | None, scores: np.ndarray, k: int) -> list[tuple[str, float]]:
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        picked = top if rows is None else rows[top]
+        return [(self.ids[row], float(scores[pos])) for row, pos in zip(picked, top) if np.isfinite(scores[pos])]
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        *,
+        nprobe: int = IVF_NPROBE_DEFAULT,
+        ef: int = HNSW_EF_DEFAULT,
+        exact: bool = False,
+    ) -> list[tuple[str, float]]:
+        """Top-k (id, cosine) through the index's ANN backend, or exactly.
+
+        Exact search is one matrix-vector product over the mapped rows
+        (float16 files are upcast one block of SEARCH_BLOCK_ROWS at a time).
+        `ivf` scores only the rows of the `nprobe` nearest lists; `hnsw` walks
+        the graph with search breadth `ef`. Larger values trade latency for recall.
+        """
+        count = len(self.ids)
+        if not count or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        if not exact and isinstance(self.ann, HnswIndex):
+            live = int(self.valid.sum())
+            rows, scores = self.ann.search(query, min(k, live), ef)
+            return [(self.ids[row], float(score)) for row, score in zip(rows, scores) if self.ids[row]]
+        if not exact and isinstance(self.ann, IvfFlat) and len(self.ann.centroids):
+            rows = self.ann.candidates(query, nprobe)
+            scores = np.empty(len(rows), dtype=np.float32)
+            for start in range(0, len(rows), SEARCH_BLOCK_ROWS):
+                block = rows[start : start + SEARCH_BLOCK_ROWS]
+                scores[start : start + len(block)] = self.vectors[block].astype(np.float32, copy=False) @ query
+            return self._top(rows, scores, k)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            stop = min(start + SEARCH_BLOCK_ROWS, count)
+            scores[start:stop] = self.vectors[start:stop].astype(np.float32, copy=False) @ query
+        scores[~self.valid] = -np.inf
+        return self._top(None, scores, k)
+
+    def score_ids(self, query: np.ndarray, ids: list[str]) -> dict[str, float]:
+        """Exact cosine of the given ids (unknown ids are skipped)."""
+        known = [inst_id for inst_id in ids if inst_id in self.rows]
+        if not known:
+            return {}
+        rows = np.array([self.rows[inst_id] for inst_id in known], dtype=np.int64)
+        scores = self.vectors[rows].astype(np.float32, copy=False) @ np.asarray(query, dtype=np.float32)
+        return dict(zip(known, scores.tolist()))
+
+    def train_ann(self, setting: str, *, lists: int | None = None, m: int | None = None) -> EmbeddingIndex:
+        """(Re)build the ANN structure over the current rows without re-encoding.
+
+        `setting` is stored so later inserts keep it (`auto` re-resolves as
+        the index grows past ANN_MIN_ROWS).
+        """
+        live = int(self.valid.sum())
+        backend = resolve_backend(setting, live) if live else "exact"
+        params = {**self.meta.get("ann_params", {})}
+        if lists is not None:
+            params["lists"] = lists
+        if m is not None:
+            params["m"] = m
+        if backend == "ivf":
+            IvfFlat.train(self.vectors, self.valid, lists=params.get("lists")).save(self.path)
+        elif backend == "hnsw":
+            kwargs = {"m": params["m"]} if params.get("m") else {}
+            HnswIndex.train(self.vectors, self.valid, **kwargs).save(self.path)
+        _write_json(
+            self.path / "meta.json",
+            {**self.meta, "ann": backend, "ann_setting": setting, "ann_rows": live, "ann_params": params},
+        )
+        return EmbeddingIndex.open(self.path)  # type: ignore[return-value]
+
+    @classmethod
+    def build(
+        cls,
+        path: str | Path,
+        *,
+        model: str,
+        dtype: str,
+        version: int,
+        count: int,
+        chunks: Iterable[tuple[list[str], np.ndarray]],
+        ann: str = "exact",
+        lists: int | None = None,
+        m: int | None = None,
+    ) -> EmbeddingIndex:
+        """Stream `count` rows of (ids, vectors) chunks into a fresh index, then train its ANN.
+
+        The files are written beside `path` and swapped in at the end, so memory
+        stays at one chunk and readers never see a half-written index.
+        """
+        path = Path(path)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        ids: list[str] = []
+        out = None
+        for chunk_ids, vectors in chunks:
+            if out is None:
+                out = np.lib.format.open_memmap(
+                    tmp / "vectors.npy", mode="w+", dtype=dtype, shape=(count, vectors.shape[1])
+                )
+            out[len(ids) : len(ids) + len(chunk_ids)] = vectors
+            ids.extend(chunk_ids)
+        if out is None:
+            out = np.lib.format.open_memmap(tmp / "vectors.npy", mode="w+", dtype=dtype, shape=(0, 0))
+        dim = int(out.shape[1])
+        out.flush()
+        del out
+        _write_json(tmp / "ids.json", ids)
+        _write_json(tmp / "meta.json", {"model": model, "dtype": dtype, "dim": dim, "version": version})
+        cls.open(tmp).train_ann(ann, lists=lists, m=m)  # type: ignore[union-attr]
+        old = path.with_name(f"{tmp.name}.old")
+        if path.exists():
+            os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+        return cls.open(path)  # type: ignore[return-value]
+
+    def apply(
+        self,
+        *,
+        version: int,
+        upserts: dict[str, np.ndarray],
+        deletes: Iterable[str],
+    ) -> EmbeddingIndex:
+        """Overwrite changed rows in place, free deleted rows, append new ids.
+
+        New ids take rows that were already free before this call; rows freed
+        here become reusable only after the new ids.json/meta.json are
+        published, so a reader never sees one id's row holding another's vector.
+
+        Only when the inserts outgrow the file's capacity is it copied into a
+        new file with doubled capacity. The ANN structure is patched the same
+        way: changed rows are re-assigned to their nearest IVF list (or
+        re-added to the HNSW graph) and freed rows are dropped. IVF centroids
+        are retrained once the live rows reach IVF_RETRAIN_GROWTH times the
+        count they were trained on. Returns the reopened index.
+        """
+        ids = list(self.ids)
+        rows = dict(self.rows)
+        # Only rows already free in the published ids.json are reused: a reader
+        # on that ids.json skips them, so writing them in place is invisible.
+        free = [row for row, inst_id in enumerate(ids) if not inst_id][::-1]
+        freed: list[int] = []
+        for inst_id in deletes:
+            row = rows.pop(inst_id, None)
+            if row is not None:
+                ids[row] = ""
+                freed.append(row)
+        placed: dict[int, np.ndarray] = {}
+        for inst_id, vector in upserts.items():
+            row = rows.get(inst_id)
+            if row is None:
+                if free:
+                    row = free.pop()
+                    ids[row] = inst_id
+                else:
+                    row = len(ids)
+                    ids.append(inst_id)
+                rows[inst_id] = row
+            placed[row] = vector
+
+        dim = int(self.meta["dim"]) or (len(next(iter(upserts.values()))) if upserts else 0)
+        vector_file = self.path / "vectors.npy"
+        capacity = self.vectors.shape[0] if self.meta["dim"] else 0
+        if len(ids) > capacity:
+            grown = self.path / "vectors.npy.grow"
+            out = np.lib.format.open_memmap(
+                grown, mode="w+", dtype=self.meta["dtype"], shape=(max(len(ids), capacity * 2), dim)
+            )
+            out[:capacity] = self.vectors[:capacity]
+            out.flush()
+            del out
+            self.vectors = None  # type: ignore[assignment]
+            os.replace(grown, vector_file)
+        out = np.load(vector_file, mmap_mode="r+")
+        order = np.array(sorted(placed), dtype=np.int64)
+        stacked = np.stack([placed[row] for row in order]) if placed else np.zeros((0, dim), dtype=np.float32)
+        if placed:
+            out[order] = stacked
+        cleared = np.array([row for row in freed if not ids[row]], dtype=np.int64)
+        if len(cleared):
+            out[cleared] = 0
+        out.flush()
+        del out
+        if self.ann is not None:
+            self.ann.update(order, stacked, cleared, len(ids)).save(self.path)
+        _write_json(self.path / "ids.json", ids)
+        _write_json(self.path / "meta.json", {**self.meta, "dim": dim, "version": version})
+        index: EmbeddingIndex = EmbeddingIndex.open(self.path)  # type: ignore[assignment]
+        live = int(index.valid.sum())
+        setting = index.meta.get("ann_setting", "exact")
+        if resolve_backend(setting, live) != index.backend or (
+            index.backend == "ivf" and live >= IVF_RETRAIN_GROWTH * max(index.meta.get("ann_rows", 0), 1)
+        ):
+            index = index.train_ann(setting)
+        return index
+
+
+# Keyed by the resolved `<db>.vectors` dir; dropped with its database when the pool evicts it.
+_INDEXES: DbScopedCache[EmbeddingIndex | None] = DbScopedCache(
+    db_path_of=lambda key: key.removesuffix(INDEX_SUFFIX)
+)
+
+
+def get_embedding_index(path: str | Path) -> EmbeddingIndex | None:
+    """Shared read-only mapping of the index at `path`, reopened when its meta.json changes."""
+    path = Path(path)
+    try:
+        stamp = (path / "meta.json").stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    key = str(path.resolve())
+    index = _INDEXES.get((key, stamp), lambda: EmbeddingIndex.open(path))
+    if index is None:
+        _INDEXES.discard(key)
+    return index
@@ -0,0 +1,531 @@
+from __future__ import annotations
+
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from typing import Any, Callable, Iterable
+
+import numpy as np
+
+from ontology_llm.tools.pool_tools import DbScopedCache
+
+PPR_CACHE_SIZE = 1024
+PPR_MAX_ROUNDS = 100
+
+
+class RelationGraph:
+    """Integer-ID CSR adjacency of onto_relations, forward and reverse.
+
+    Node and relation-type codes follow sorted string order, and every row is
+    sorted by (type, neighbor), so code order matches SQL ORDER BY on the ids.
+    Edges cost int32 neighbor + int16/int32 type per direction.
+    """
+
+    def __init__(
+        self,
+        node_ids: list[str],
+        type_names: list[str],
+        src: np.ndarray,
+        rel: np.ndarray,
+        dst: np.ndarray,
+    ) -> None:
+        self.node_ids = node_ids
+        self.node_index = {node: i for i, node in enumerate(node_ids)}
+        self.type_names = type_names
+        self.type_index = {name: i for i, name in enumerate(type_names)}
+        self.fwd_indptr, self.fwd_types, self.fwd_nodes = self._csr(src, rel, dst)
+        self.rev_indptr, self.rev_types, self.rev_nodes = self._csr(dst, rel, src)
+        self.degree = np.diff(self.fwd_indptr) + np.diff(self.rev_indptr)
+        self._ppr_cache: OrderedDict[tuple[int, float, float], tuple[np.ndarray, np.ndarray]] = OrderedDict()
+        self._ppr_lock = threading.Lock()
+
+    @classmethod
+    def from_rows(
+        cls,
+        node_ids: Iterable[str],
+        edges: Iterable[tuple[str, str, str]],
+    ) -> "RelationGraph":
+        """Build from instance ids and (source, type, target) rows, streaming into int arrays."""
+        nodes = sorted(set(node_ids))
+        index = {node: i for i, node in enumerate(nodes)}
+        type_index: dict[str, int] = {}
+        src, rel, dst = array("i"), array("i"), array("i")
+        for source, rel_type, target in edges:
+            for node in (source, target):
+                if node not in index:
+                    index[node] = len(nodes)
+                    nodes.append(node)
+            src.append(index[source])
+            rel.append(type_index.setdefault(rel_type, len(type_index)))
+            dst.append(index[target])
+
+        # Recode so integer order equals string order (edge rows may name unknown ids).
+        node_order = np.argsort(np.array(nodes, dtype=object), kind="stable")
+        node_code = np.empty(len(nodes), dtype=np.int32)
+        node_code[node_order] = np.arange(len(nodes), dtype=np.int32)
+        type_names = sorted(type_index)
+        type_code = np.empty(len(type_index), dtype=np.int32)
+        for name, old in type_index.items():
+            type_code[old] = type_names.index(name)
+        return cls(
+            [nodes[i] for i in node_order],
+            type_names,
+            node_code[np.frombuffer(src, dtype=np.int32)] if src else np.empty(0, np.int32),
+            type_code[np.frombuffer(rel, dtype=np.int32)] if rel else np.empty(0, np.int32),
+            node_code[np.frombuffer(dst, dtype=np.int32)] if dst else np.empty(0, np.int32),
+        )
+
+    def _csr(self, row: np.ndarray, rel: np.ndarray, col: np.ndarray):
+        order = np.lexsort((col, rel, row))
+        indptr = np.zeros(len(self.node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row, minlength=len(self.node_ids)), out=indptr[1:])
+        type_dtype = np.int16 if len(self.type_names) < 2**15 else np.int32
+        return indptr, rel[order].astype(type_dtype), col[order].astype(np.int32)
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return int(self.fwd_nodes.size)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (
+            self.fwd_indptr, self.fwd_types, self.fwd_nodes,
+            self.rev_indptr, self.rev_types, self.rev_nodes, self.degree,
+        )
+        return int(sum(arr.nbytes for arr in arrays))
+
+    def codes(self, node_ids: Iterable[str]) -> np.ndarray:
+        return np.array(
+            [self.node_index[node] for node in node_ids if node in self.node_index], dtype=np.int32
+        )
+
+    def type_codes(self, relation_types: Iterable[str] | None) -> np.ndarray | None:
+        if relation_types is None:
+            return None
+        return np.array(
+            [self.type_index[name] for name in relation_types if name in self.type_index], dtype=np.int32
+        )
+
+    def out_degree(self, node_ids: Iterable[str]) -> dict[str, int]:
+        codes = self.codes(node_ids)
+        degrees = self.fwd_indptr[codes + 1] - self.fwd_indptr[codes]
+        return {self.node_ids[c]: int(d) for c, d in zip(codes, degrees)}
+
+    def in_degree(self, node_ids: Iterable[str]) -> dict[str, int]:
+        codes = self.codes(node_ids)
+        degrees = self.rev_indptr[codes + 1] - self.rev_indptr[codes]
+        return {self.node_ids[c]: int(d) for c, d in zip(codes, degrees)}
+
+    def _gather(self, indptr: np.ndarray, codes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(row code, edge position) for every edge in the given rows."""
+        starts, ends = indptr[codes], indptr[codes + 1]
+        counts = ends - starts
+        total = int(counts.sum())
+        if not total:
+            return np.empty(0, np.int32), np.empty(0, np.int64)
+        rows = np.repeat(codes, counts)
+        offsets = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+        return rows, np.repeat(starts, counts) + offsets
+
+    def neighbors(
+        self,
+        node_ids: Iterable[str],
+        *,
+        direction: str = "out",
+        relation_types: Iterable[str] | None = None,
+    ) -> list[str]:
+        """Distinct one-hop neighbors of the given nodes ('out', 'in' or 'both')."""
+        codes = self.codes(node_ids)
+        types = self.type_codes(relation_types)
+        found: list[np.ndarray] = []
+        for name, indptr, rel, col in (
+            ("out", self.fwd_indptr, self.fwd_types, self.fwd_nodes),
+            ("in", self.rev_indptr, self.rev_types, self.rev_nodes),
+        ):
+            if direction not in (name, "both"):
+                continue
+            _, pos = self._gather(indptr, codes)
+            if types is not None:
+                pos = pos[np.isin(rel[pos], types)]
+            found.append(col[pos])
+        if not found:
+            return []
+        return [self.node_ids[c] for c in np.unique(np.concatenate(found))]
+
+    def expand(
+        self,
+        node_ids: Iterable[str],
+        hops: int = 1,
+        *,
+        direction: str = "both",
+        relation_types: Iterable[str] | None = None,
+    ) -> list[str]:
+        """Nodes within `hops` of the seeds (seeds included)."""
+        frontier = list(dict.fromkeys(node_ids))
+        seen = set(frontier)
+        for _ in range(hops):
+            nxt = [
+                node
+                for node in self.neighbors(frontier, direction=direction, relation_types=relation_types)
+                if node not in seen
+            ]
+            if not nxt:
+                break
+            seen.update(nxt)
+            frontier = nxt
+        return sorted(node for node in seen if node in self.node_index)
+
+    def edges_touching(
+        self,
+        node_ids: Iterable[str],
+        limit: int | None = None,
+    ) -> list[tuple[str, str, str]]:
+        """Edges with a seed at either end, ordered by (source, type, target)."""
+        codes = np.unique(self.codes(node_ids))
+        if not codes.size:
+            return []
+        out_rows, out_pos = self._gather(self.fwd_indptr, codes)
+        in_rows, in_pos = self._gather(self.rev_indptr, codes)
+        n, t = np.int64(self.num_nodes), np.int64(max(1, len(self.type_names)))
+        keys = np.concatenate(
+            [
+                (out_rows.astype(np.int64) * t + self.fwd_types[out_pos]) * n + self.fwd_nodes[out_pos],
+                (self.rev_nodes[in_pos].astype(np.int64) * t + self.rev_types[in_pos]) * n + in_rows,
+            ]
+        )
+        if limit is not None and keys.size > 2 * limit:
+            # An edge shows up at most twice (out of one seed, into another), so the
+            # `limit` smallest distinct keys are among the 2*limit smallest entries.
+            keys = keys[np.argpartition(keys, 2 * limit - 1)[: 2 * limit]]
+        keys = np.sort(keys)
+        if keys.size > 1:
+            keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+        if limit is not None:
+            keys = keys[:limit]
+        return [
+            (self.node_ids[int(k // n // t)], self.type_names[int(k // n % t)], self.node_ids[int(k % n)])
+            for k in keys
+        ]
+
+    def walk(
+        self,
+        seed_ids: Iterable[str],
+        *,
+        max_hops: int,
+        fan_out: int,
+        relation_types: Iterable[str] | None = None,
+        budget: int,
+    ) -> list[tuple[tuple[str, ...], tuple[str, ...]]]:
+        """Breadth-first outgoing walks, same rules and order as the SQL recursive CTE.
+
+        Per step at most `fan_out` edges per node (row order = type, target), no
+        node twice on one path; stops after `budget` rows including the seeds.
+        """
+        types = self.type_codes(relation_types)
+        allowed = None if types is None else set(types.tolist())
+        queue: deque[tuple[tuple[int, ...], tuple[int, ...]]] = deque()
+        produced = 0
+        for seed in dict.fromkeys(seed_ids):
+            if produced >= budget:
+                break
+            produced += 1
+            if seed in self.node_index:
+                queue.append(((self.node_index[seed],), ()))
+
+        walks: list[tuple[tuple[int, ...], tuple[int, ...]]] = []
+        while queue and produced < budget:
+            nodes, rels = queue.popleft()
+            if len(rels) >= max_hops:
+                continue
+            start, end = self.fwd_indptr[nodes[-1]], self.fwd_indptr[nodes[-1] + 1]
+            taken = 0
+            for rel, node in zip(self.fwd_types[start:end].tolist(), self.fwd_nodes[start:end].tolist()):
+                if taken >= fan_out or produced >= budget:
+                    break
+                if (allowed is not None and rel not in allowed) or node in nodes:
+                    continue
+                taken += 1
+                produced += 1
+                step = (nodes + (node,), rels + (rel,))
+                walks.append(step)
+                queue.append(step)
+        return [
+            (tuple(self.node_ids[n] for n in nodes), tuple(self.type_names[r] for r in rels))
+            for nodes, rels in walks
+        ]
+
+    def _step(
+        self,
+        frontier: np.ndarray,
+        csrs: list[tuple[tuple[np.ndarray, np.ndarray, np.ndarray], bool]],
+        types: np.ndarray | None,
+        depth: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Unvisited neighbors of the frontier as sorted (node, parent, type, forward) arrays."""
+        nodes, parents, rels, forward = [], [], [], []
+        for (indptr, rel, col), along in csrs:
+            rows, pos = self._gather(indptr, frontier)
+            if types is not None:
+                keep = np.isin(rel[pos], types)
+                rows, pos = rows[keep], pos[keep]
+            nodes.append(col[pos])
+            parents.append(rows.astype(np.int32))
+            rels.append(rel[pos].astype(np.int32))
+            forward.append(np.full(pos.size, along))
+        node = np.concatenate(nodes)
+        parent, rel, fwd = np.concatenate(parents), np.concatenate(rels), np.concatenate(forward)
+        fresh = depth[node] == 0
+        node, parent, rel, fwd = node[fresh], parent[fresh], rel[fresh], fwd[fresh]
+        # One parent per node, preferring forward edges, then (type, parent) order.
+        order = np.lexsort((parent, rel, ~fwd, node))
+        node, parent, rel, fwd = node[order], parent[order], rel[order], fwd[order]
+        first = np.concatenate(([True], node[1:] != node[:-1])) if node.size else np.empty(0, bool)
+        return node[first], parent[first], rel[first], fwd[first]
+
+    @staticmethod
+    def _trace(
+        levels: list[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]],
+        depth: np.ndarray,
+        node: int,
+    ) -> list[tuple[int, int, bool]]:
+        """(parent, type, forward) steps from `node` back to its side's root."""
+        steps: list[tuple[int, int, bool]] = []
+        level = int(depth[node]) - 1
+        while level > 0:
+            nodes, parents, rels, forward = levels[level - 1]
+            i = int(np.searchsorted(nodes, node))
+            steps.append((int(parents[i]), int(rels[i]), bool(forward[i])))
+            node = int(parents[i])
+            level -= 1
+        return steps
+
+    def shortest_path(
+        self,
+        source_id: str,
+        target_id: str,
+        *,
+        max_depth: int,
+        relation_types: Iterable[str] | None = None,
+        directed: bool = False,
+        deadline: float | None = None,
+        max_visited: int | None = None,
+    ) -> tuple[tuple[tuple[str, ...], tuple[str, ...], tuple[bool, ...]] | None, dict[str, Any]]:
+        """Bidirectional level-synchronous BFS between two nodes.
+
+        Returns ((nodes, relation types, forward flags) or None, stats). Edges may
+        be walked against their direction unless `directed`; forward[i] says
+        whether relation i points from nodes[i] to nodes[i + 1]. The smaller
+        frontier is expanded each round; the search stops at `max_depth` hops,
+        at `deadline` (time.perf_counter()) or after `max_visited` nodes, and
+        stats["stopped"] names the budget that ended it.
+        """
+        stats: dict[str, Any] = {"visited": 0, "depth": 0, "stopped": None}
+        if source_id not in self.node_index or target_id not in self.node_index:
+            return None, stats
+        if source_id == target_id:
+            return ((source_id,), (), ()), stats
+        types = self.type_codes(relation_types)
+        fwd = (self.fwd_indptr, self.fwd_types, self.fwd_nodes)
+        rev = (self.rev_indptr, self.rev_types, self.rev_nodes)
+        # Each side walks away from its root; "forward" means along source -> target.
+        sides = []
+        for root, csrs in (
+            (self.node_index[source_id], [(fwd, True)] + ([] if directed else [(rev, False)])),
+            (self.node_index[target_id], [(rev, True)] + ([] if directed else [(fwd, False)])),
+        ):
+            depth = np.zeros(self.num_nodes, dtype=np.int32)  # hop count + 1, 0 = unseen
+            depth[root] = 1
+            sides.append(
+                {"root": root, "csrs": csrs, "depth": depth, "frontier": np.array([root], np.int32), "levels": []}
+            )
+        stats["visited"] = 2
+
+        meet = None
+        while meet is None:
+            hops = len(sides[0]["levels"]) + len(sides[1]["levels"])
+            if hops >= max_depth:
+                stats["stopped"] = "max_depth"
+                break
+            if deadline is not None and time.perf_counter() > deadline:
+                stats["stopped"] = "time_budget"
+                break
+            if max_visited is not None and stats["visited"] >= max_visited:
+                stats["stopped"] = "max_visited"
+                break
+            a = 0 if sides[0]["frontier"].size <= sides[1]["frontier"].size else 1
+            side, other = sides[a], sides[1 - a]
+            if not side["frontier"].size:
+                break
+            level = self._step(side["frontier"], side["csrs"], types, side["depth"])
+            side["levels"].append(level)
+            side["depth"][level[0]] = len(side["levels"]) + 1
+            side["frontier"] = level[0]
+            stats["visited"] += int(level[0].size)
+            stats["depth"] = hops + 1
+            hit = level[0][other["depth"][level[0]] > 0]
+            if hit.size:
+                meet = int(hit[0])  # nodes come sorted, so the smallest id wins ties
+
+        if meet is None:
+            return None, stats
+        head = self._trace(sides[0]["levels"], sides[0]["depth"], meet)[::-1]
+        tail = self._trace(sides[1]["levels"], sides[1]["depth"], meet)
+        nodes = [step[0] for step in head] + [meet] + [step[0] for step in tail]
+        steps = head + tail
+        return (
+            tuple(self.node_ids[n] for n in nodes),
+            tuple(self.type_names[step[1]] for step in steps),
+            tuple(step[2] for step in steps),
+        ), stats
+
+    def _ppr_push(self, seed: int, alpha: float, epsilon: float) -> tuple[np.ndarray, np.ndarray]:
+        """Approximate PPR of one seed over the undirected graph (batched forward push).
+
+        Every round pushes all nodes whose residual exceeds epsilon * degree at
+        once: a sparse matvec restricted to the active frontier, so the cost
+        depends on the seed's neighborhood rather than the graph size. Mass at
+        a node without edges restarts at the seed.
+        """
+        # State lives only on the touched nodes: `support` is sorted node codes,
+        # `residual`/`estimate` are aligned with it and grow as the frontier does.
+        support = np.array([seed], dtype=np.int32)
+        residual = np.ones(1)
+        estimate = np.zeros(1)
+        active = np.zeros(1, dtype=np.int64)
+        for _ in range(PPR_MAX_ROUNDS):
+            nodes = support[active]
+            mass = residual[active]
+            residual[active] = 0.0
+            estimate[active] += alpha * mass
+            degree = self.degree[nodes]
+            dangling = float(mass[degree == 0].sum())
+            share = np.where(degree > 0, (1.0 - alpha) * mass / np.maximum(degree, 1), 0.0)
+            out_rows, out_pos = self._gather(self.fwd_indptr, nodes)
+            in_rows, in_pos = self._gather(self.rev_indptr, nodes)
+            counts = np.concatenate((
+                self.fwd_indptr[nodes + 1] - self.fwd_indptr[nodes],
+                self.rev_indptr[nodes + 1] - self.rev_indptr[nodes],
+            ))
+            neighbors = np.concatenate((self.fwd_nodes[out_pos], self.rev_nodes[in_pos]))
+            amounts = np.repeat(np.concatenate((share, share)), counts)
+            hit = np.empty(0, dtype=np.int64)
+            if neighbors.size:
+                codes, inverse = np.unique(neighbors, return_inverse=True)
+                grown = np.union1d(support, codes)
+                if grown.size != support.size:
+                    slots = np.searchsorted(grown, support)
+                    grown_residual, grown_estimate = np.zeros(grown.size), np.zeros(grown.size)
+                    grown_residual[slots] = residual
+                    grown_estimate[slots] = estimate
+                    support, residual, estimate = grown, grown_residual, grown_estimate
+                hit = np.searchsorted(support, codes)
+                residual[hit] += np.bincount(inverse, weights=amounts)
+            if dangling:
+                seed_slot = int(np.searchsorted(support, seed))
+                residual[seed_slot] += (1.0 - alpha) * dangling
+                hit = np.unique(np.append(hit, seed_slot))
+            threshold = epsilon * np.maximum(self.degree[support[hit]], 1)
+            active = hit[residual[hit] > threshold]
+            if not active.size:
+                break
+        keep = estimate > 0
+        return support[keep], estimate[keep]
+
+    def personalized_pagerank(
+        self,
+        seed_weights: dict[str, float],
+        *,
+        alpha: float = 0.15,
+        epsilon: float = 1e-4,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Sparse (node codes, scores) PPR for a weighted seed set.
+
+        PPR is linear in the restart vector, so each seed's vector is solved
+        once per graph (LRU-cached) and queries only re-weight and sum them:
+        repeated seeds cost no pushes at all.
+        """
+        weights = {self.node_index[node]: w for node, w in seed_weights.items() if node in self.node_index and w > 0}
+        total = sum(weights.values())
+        if not total:
+            return np.empty(0, np.int32), np.empty(0)
+        parts_codes, parts_scores = [], []
+        for code, weight in weights.items():
+            key = (code, alpha, epsilon)
+            with self._ppr_lock:
+                cached = self._ppr_cache.get(key)
+                if cached is not None:
+                    self._ppr_cache.move_to_end(key)
+            if cached is None:
+                cached = self._ppr_push(code, alpha, epsilon)
+                with self._ppr_lock:
+                    self._ppr_cache[key] = cached
+                    while len(self._ppr_cache) > PPR_CACHE_SIZE:
+                        self._ppr_cache.popitem(last=False)
+            parts_codes.append(cached[0])
+            parts_scores.append(cached[1] * (weight / total))
+        codes, inverse = np.unique(np.concatenate(parts_codes), return_inverse=True)
+        return codes, np.bincount(inverse, weights=np.concatenate(parts_scores))
+
+    def ranked_edges(
+        self,
+        seed_weights: dict[str, float],
+        limit: int,
+        *,
+        alpha: float = 0.15,
+        epsilon: float = 1e-4,
+        max_nodes: int | None = None,
+    ) -> list[tuple[str, str, str, float]]:
+        """Top edges by PPR flow, score[u]/deg(u) + score[v]/deg(v), around the top-scored nodes."""
+        codes, scores = self.personalized_pagerank(seed_weights, alpha=alpha, epsilon=epsilon)
+        if not codes.size or limit <= 0:
+            return []
+        max_nodes = max_nodes or 4 * limit
+        if codes.size > max_nodes:
+            top = np.argpartition(-scores, max_nodes - 1)[:max_nodes]
+            top_codes = codes[top]
+        else:
+            top_codes = codes
+        top_codes = np.sort(top_codes)
+        out_rows, out_pos = self._gather(self.fwd_indptr, top_codes)
+        in_rows, in_pos = self._gather(self.rev_indptr, top_codes)
+        src = np.concatenate((out_rows, self.rev_nodes[in_pos])).astype(np.int64)
+        rel = np.concatenate((self.fwd_types[out_pos], self.rev_types[in_pos])).astype(np.int64)
+        dst = np.concatenate((self.fwd_nodes[out_pos], in_rows)).astype(np.int64)
+        n, t = np.int64(self.num_nodes), np.int64(max(1, len(self.type_names)))
+        keys, first = np.unique((src * t + rel) * n + dst, return_index=True)
+        src, rel, dst = src[first], rel[first], dst[first]
+
+        lookup = np.searchsorted(codes, np.concatenate((src, dst)))
+        lookup = np.minimum(lookup, codes.size - 1)
+        endpoints = np.concatenate((src, dst))
+        node_score = np.where(codes[lookup] == endpoints, scores[lookup], 0.0)
+        per_degree = node_score / np.maximum(self.degree[endpoints], 1)
+        flow = per_degree[: src.size] + per_degree[src.size :]
+        if flow.size > limit:
+            # Keep ties at the cut so the (score, key) order below is exact.
+            cut = np.partition(flow, flow.size - limit)[flow.size - limit]
+            keep = flow >= cut
+            keys, src, rel, dst, flow = keys[keep], src[keep], rel[keep], dst[keep], flow[keep]
+        order = np.lexsort((keys, -flow))[:limit]
+        return [
+            (self.node_ids[int(src[i])], self.type_names[int(rel[i])], self.node_ids[int(dst[i])], float(flow[i]))
+            for i in order
+        ]
+
+
+_GRAPH_CACHE: DbScopedCache[RelationGraph] = DbScopedCache()
+
+
+def get_relation_graph(
+    cache_key: tuple[str, int],
+    load_nodes: Callable[[], Iterable[str]],
+    load_edges: Callable[[], Iterable[tuple[str, str, str]]],
+) -> RelationGraph:
+    """Return the CSR graph for (db identity, ontology version), building it once."""
+    return _GRAPH_CACHE.get(cache_key, lambda: RelationGraph.from_rows(load_nodes(), load_edges()))
+
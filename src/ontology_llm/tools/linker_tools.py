@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+from ontology_llm.tools.pool_tools import DbScopedCache
+
+MIN_SURFACE_CHARS = 2
+
+
+@dataclass(frozen=True)
+class EntityMention:
+    instance_id: str
+    field: str
+    surface: str
+    start: int
+    end: int
+
+
+def _fold(ch: str) -> str:
+    low = ch.lower()
+    return low if len(low) == 1 else ch
+
+
+def _is_ascii_word(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class EntityLinker:
+    """Aho-Corasick automaton over normalized label/alias surface forms.
+
+    Patterns are stored without whitespace, and the question is scanned the
+    same way, so "빠나 우유" and "빠나우유" link to the same instance.
+    """
+
+    def __init__(self, surfaces: Iterable[tuple[str, str, str]]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[int]] = [[]]
+        self._entries: list[tuple[int, str, str]] = []
+
+        for instance_id, field, surface in surfaces:
+            norm = "".join(_fold(ch) for ch in surface if not ch.isspace())
+            if len(norm) < MIN_SURFACE_CHARS:
+                continue
+            node = 0
+            for ch in norm:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(len(self._entries))
+            self._entries.append((len(norm), instance_id, field))
+        self._build_fail_links()
+
+    def _build_fail_links(self) -> None:
+        queue: deque[int] = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child].extend(self._out[self._fail[child]])
+
+    @property
+    def pattern_count(self) -> int:
+        return len(self._entries)
+
+    def find_all(self, text: str) -> list[EntityMention]:
+        """Every pattern occurrence, found in one pass over `text`."""
+        positions = [idx for idx, ch in enumerate(text) if not ch.isspace()]
+        mentions: list[EntityMention] = []
+        node = 0
+        for pos, orig_idx in enumerate(positions):
+            ch = _fold(text[orig_idx])
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for entry_idx in self._out[node]:
+                length, instance_id, field = self._entries[entry_idx]
+                start = positions[pos - length + 1]
+                end = orig_idx + 1
+                if not self._on_word_boundary(text, start, end):
+                    continue
+                mentions.append(
+                    EntityMention(
+                        instance_id=instance_id,
+                        field=field,
+                        surface=text[start:end],
+                        start=start,
+                        end=end,
+                    )
+                )
+        return mentions
+
+    def link(self, text: str) -> list[EntityMention]:
+        """Leftmost-longest, non-overlapping mentions.
+
+        Instances sharing the selected span (e.g. two products labelled
+        "바나나우유") are all kept.
+        """
+        spans: dict[tuple[int, int], list[EntityMention]] = {}
+        for mention in self.find_all(text):
+            spans.setdefault((mention.start, mention.end), []).append(mention)
+
+        selected: list[EntityMention] = []
+        cursor = -1
+        for start, end in sorted(spans, key=lambda span: (span[0], -span[1])):
+            if start < cursor:
+                continue
+            group = spans[(start, end)]
+            seen: set[str] = set()
+            for mention in sorted(group, key=lambda m: (m.field != "label", m.instance_id)):
+                if mention.instance_id not in seen:
+                    seen.add(mention.instance_id)
+                    selected.append(mention)
+            cursor = end
+        return selected
+
+    @staticmethod
+    def _on_word_boundary(text: str, start: int, end: int) -> bool:
+        # Latin surfaces must not match inside a longer word ("milk" in "milkshake");
+        # Hangul keeps attached particles ("우유가") so it is not checked.
+        if _is_ascii_word(text[start]) and start > 0 and _is_ascii_word(text[start - 1]):
+            return False
+        if _is_ascii_word(text[end - 1]) and end < len(text) and _is_ascii_word(text[end]):
+            return False
+        return True
+
+
+_LINKER_CACHE: DbScopedCache[EntityLinker] = DbScopedCache()
+
+
+def get_entity_linker(
+    cache_key: tuple[str, int],
+    load_surfaces: Callable[[], Iterable[tuple[str, str, str]]],
+) -> EntityLinker:
+    """Return the automaton for (db identity, ontology version), building it once."""
+    return _LINKER_CACHE.get(cache_key, lambda: EntityLinker(load_surfaces()))
+
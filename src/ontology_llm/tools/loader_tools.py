@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Iterator
+
+import yaml
+
+ONTOLOGY_SECTIONS = ("classes", "instances", "relations")
+
+# JSONL ontologies carry one record per line: {"kind": "instance", "id": ..., ...}.
+JSONL_KINDS = {"class": "classes", "instance": "instances", "relation": "relations"}
+JSONL_SUFFIXES = (".jsonl", ".ndjson")
+
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _compose_node(loader: Any, event: yaml.Event, anchors: dict[str, yaml.Node]) -> yaml.Node:
+    """Build one node from the event stream (CParser has no public compose_node)."""
+    if isinstance(event, yaml.AliasEvent):
+        if event.anchor not in anchors:
+            raise yaml.composer.ComposerError(
+                None, None, f"found undefined alias {event.anchor!r}", event.start_mark
+            )
+        return anchors[event.anchor]
+
+    if isinstance(event, yaml.ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.ScalarNode, event.value, event.implicit)
+        node: yaml.Node = yaml.ScalarNode(
+            tag, event.value, event.start_mark, event.end_mark, style=event.style
+        )
+    elif isinstance(event, yaml.SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.SequenceNode, None, event.implicit)
+        node = yaml.SequenceNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        while not loader.check_event(yaml.SequenceEndEvent):
+            node.value.append(_compose_node(loader, loader.get_event(), anchors))
+        node.end_mark = loader.get_event().end_mark
+    elif isinstance(event, yaml.MappingStartEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.MappingNode, None, event.implicit)
+        node = yaml.MappingNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = _compose_node(loader, loader.get_event(), anchors)
+            value = _compose_node(loader, loader.get_event(), anchors)
+            node.value.append((key, value))
+        node.end_mark = loader.get_event().end_mark
+    else:
+        raise yaml.composer.ComposerError(
+            None, None, f"unexpected {type(event).__name__}", event.start_mark
+        )
+
+    if getattr(event, "anchor", None):
+        anchors[event.anchor] = node
+    return node
+
+
+def _iter_yaml_records(path: Path) -> Iterator[tuple[str, dict[str, Any]]]:
+    with path.open("r", encoding="utf-8") as fp:
+        loader = _YAML_LOADER(fp)
+        anchors: dict[str, yaml.Node] = {}
+        try:
+            loader.get_event()  # StreamStart
+            if loader.check_event(yaml.StreamEndEvent):
+                return
+            loader.get_event()  # DocumentStart
+            if not loader.check_event(yaml.MappingStartEvent):
+                return
+            loader.get_event()
+            while not loader.check_event(yaml.MappingEndEvent):
+                key_node = _compose_node(loader, loader.get_event(), anchors)
+                section = key_node.value if isinstance(key_node, yaml.ScalarNode) else None
+                if section in ONTOLOGY_SECTIONS and loader.check_event(yaml.SequenceStartEvent):
+                    loader.get_event()
+                    # Each list item is composed and constructed on its own, so only
+                    # one item is held in memory at a time.
+                    while not loader.check_event(yaml.SequenceEndEvent):
+                        item = loader.construct_document(
+                            _compose_node(loader, loader.get_event(), anchors)
+                        )
+                        if isinstance(item, dict):
+                            yield section, item
+                    loader.get_event()
+                else:
+                    _compose_node(loader, loader.get_event(), anchors)
+        finally:
+            loader.dispose()
+
+
+def _iter_jsonl_records(path: Path) -> Iterator[tuple[str, dict[str, Any]]]:
+    with path.open("r", encoding="utf-8") as fp:
+        for line_no, line in enumerate(fp, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            section = JSONL_KINDS.get(record.pop("kind", None)) if isinstance(record, dict) else None
+            if section is None:
+                raise ValueError(f"{path}:{line_no}: expected a 'kind' of {', '.join(JSONL_KINDS)}")
+            yield section, record
+
+
+def iter_ontology_records(path: str | Path) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Yield (section, item) one at a time from a YAML or JSONL ontology file.
+
+    section is one of "classes", "instances", "relations"; memory stays bounded
+    by the largest single item, not the file size.
+    """
+    path = Path(path)
+    if path.suffix.lower() in JSONL_SUFFIXES:
+        return _iter_jsonl_records(path)
+    return _iter_yaml_records(path)
+
+
+def count_ontology_records(path: str | Path) -> dict[str, int]:
+    counts = {section: 0 for section in ONTOLOGY_SECTIONS}
+    for section, _ in iter_ontology_records(path):
+        counts[section] += 1
+    return counts
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Generic, Iterator, TypeVar
+
+POOL_MAX_DBS_DEFAULT = 8
+POOL_MAX_IDLE_DEFAULT = 4
+MMAP_SIZE_DEFAULT = 256 * 1024 * 1024
+CACHE_SIZE_KB_DEFAULT = 64 * 1024
+BUSY_TIMEOUT_SEC = 5.0
+
+T = TypeVar("T")
+
+# Called with the resolved path of every database the pool evicts.
+_EVICT_HOOKS: list[Callable[[str], None]] = []
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        return max(int(os.getenv(name, "").strip()), minimum)
+    except ValueError:
+        return default
+
+
+def _tune(conn: sqlite3.Connection, mmap_size: int, cache_size_kb: int) -> None:
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    # Negative cache_size is in KiB rather than pages.
+    conn.execute(f"PRAGMA cache_size = {-int(cache_size_kb)}")
+
+
+class _DbEntry:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.idle: list[sqlite3.Connection] = []
+        self.active = 0
+        self.writer: sqlite3.Connection | None = None
+        self.writer_lock = threading.Lock()
+        self.writer_busy = False
+        self.last_used = time.time()
+        self.opened = 0
+        self.reused = 0
+        self.closed = 0
+        self.writer_uses = 0
+
+    def close(self) -> None:
+        for conn in self.idle:
+            conn.close()
+        self.closed += len(self.idle)
+        self.idle.clear()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class ConnectionPool:
+    """SQLite connections keyed by database path.
+
+    Readers are pooled `mode=ro` URI connections handed to one thread at a
+    time; each database has a single writer connection (WAL, serialized by a
+    lock) for ingest and schema changes. When more than `max_dbs` databases
+    are open, the least recently used idle ones are closed — requests may name
+    arbitrary `db_path`s.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_dbs: int = POOL_MAX_DBS_DEFAULT,
+        max_idle: int = POOL_MAX_IDLE_DEFAULT,
+        mmap_size: int = MMAP_SIZE_DEFAULT,
+        cache_size_kb: int = CACHE_SIZE_KB_DEFAULT,
+    ) -> None:
+        self.max_dbs = max_dbs
+        self.max_idle = max_idle
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, _DbEntry] = OrderedDict()
+        self._evicted = 0
+
+    def _entry(self, db_path: str) -> _DbEntry:
+        key = str(Path(db_path).resolve())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _DbEntry(key)
+            self._entries.move_to_end(key)
+            entry.last_used = time.time()
+            evicted = self._evict_locked()
+        _run_evict_hooks(evicted)
+        return entry
+
+    def _evict_locked(self) -> list[str]:
+        """Close least recently used idle databases past `max_dbs`; hooks run after the lock is released."""
+        evicted: list[str] = []
+        excess = len(self._entries) - self.max_dbs
+        if excess <= 0:
+            return evicted
+        for key in list(self._entries)[:-1]:
+            if excess <= 0:
+                break
+            entry = self._entries[key]
+            if entry.active or entry.writer_busy:
+                continue
+            entry.close()
+            del self._entries[key]
+            self._evicted += 1
+            evicted.append(key)
+            excess -= 1
+        return evicted
+
+    def _open_reader(self, path: str) -> sqlite3.Connection:
+        if not Path(path).exists():
+            raise FileNotFoundError(f"SQLite database not found: {path}")
+        conn = sqlite3.connect(
+            f"{Path(path).as_uri()}?mode=ro",
+            uri=True,
+            timeout=BUSY_TIMEOUT_SEC,
+            check_same_thread=False,
+        )
+        _tune(conn, self.mmap_size, self.cache_size_kb)
+        return conn
+
+    def _open_writer(self, path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SEC, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        _tune(conn, self.mmap_size, self.cache_size_kb)
+        return conn
+
+    @contextmanager
+    def reader(self, db_path: str) -> Iterator[sqlite3.Connection]:
+        """Lease a read-only connection for the duration of the block."""
+        entry = self._entry(db_path)
+        with self._lock:
+            conn = entry.idle.pop() if entry.idle else None
+            entry.active += 1
+            if conn is not None:
+                entry.reused += 1
+        try:
+            if conn is None:
+                conn = self._open_reader(entry.path)
+                with self._lock:
+                    entry.opened += 1
+            yield conn
+        except BaseException:
+            if conn is not None:
+                conn.close()
+                with self._lock:
+                    entry.closed += 1
+                conn = None
+            raise
+        finally:
+            with self._lock:
+                entry.active -= 1
+                if conn is not None:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    if len(entry.idle) < self.max_idle and self._entries.get(entry.path) is entry:
+                        entry.idle.append(conn)
+                    else:
+                        conn.close()
+                        entry.closed += 1
+                evicted = self._evict_locked()
+            _run_evict_hooks(evicted)
+
+    @contextmanager
+    def writer(self, db_path: str) -> Iterator[sqlite3.Connection]:
+        """The database's single writer connection; callers commit, errors roll back."""
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        entry = self._entry(db_path)
+        with entry.writer_lock:
+            with self._lock:
+                entry.writer_busy = True
+                entry.writer_uses += 1
+            try:
+                if entry.writer is None:
+                    entry.writer = self._open_writer(entry.path)
+                try:
+                    yield entry.writer
+                except BaseException:
+                    entry.writer.rollback()
+                    raise
+            finally:
+                with self._lock:
+                    entry.writer_busy = False
+                    if self._entries.get(entry.path) is not entry and entry.writer is not None:
+                        entry.writer.close()
+                        entry.writer = None
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            databases = [
+                {
+                    "db_path": entry.path,
+                    "idle": len(entry.idle),
+                    "active": entry.active,
+                    "opened": entry.opened,
+                    "reused": entry.reused,
+                    "closed": entry.closed,
+                    "writer_open": entry.writer is not None,
+                    "writer_busy": entry.writer_busy,
+                    "writer_uses": entry.writer_uses,
+                    "idle_sec": round(time.time() - entry.last_used, 3),
+                }
+                for entry in reversed(self._entries.values())
+            ]
+            return {
+                "max_dbs": self.max_dbs,
+                "max_idle": self.max_idle,
+                "mmap_size": self.mmap_size,
+                "cache_size_kb": self.cache_size_kb,
+                "open_dbs": len(databases),
+                "evicted": self._evicted,
+                "databases": databases,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            for entry in self._entries.values():
+                entry.close()
+            self._entries.clear()
+
+
+def _run_evict_hooks(paths: list[str]) -> None:
+    for path in paths:
+        for hook in list(_EVICT_HOOKS):
+            hook(path)
+
+
+class DbScopedCache(Generic[T]):
+    """Per-database derived objects (CSR graph, linker automaton, ...) tagged
+    with the stamp they were built from, usually the ontology version.
+
+    At most `max_dbs` databases are kept (least recently used dropped first;
+    default: the pool's SQLITE_POOL_MAX_DBS), and a database's entry is
+    dropped as soon as the pool evicts it. `db_path_of` maps a cache key to
+    its database file when the key is not the path itself.
+    """
+
+    def __init__(
+        self, *, max_dbs: int | None = None, db_path_of: Callable[[str], str] | None = None
+    ) -> None:
+        self._max_dbs = max_dbs
+        self._db_path_of = db_path_of or (lambda key: key)
+        self._entries: OrderedDict[str, tuple[int, T]] = OrderedDict()
+        self._lock = threading.Lock()
+        _EVICT_HOOKS.append(self._on_db_evicted)
+
+    def get(self, cache_key: tuple[str, int], build: Callable[[], T]) -> T:
+        """The object for (key, stamp), building it (outside the lock) when missing or stale."""
+        key, stamp = cache_key
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached and cached[0] == stamp:
+                self._entries.move_to_end(key)
+                return cached[1]
+        value = build()
+        with self._lock:
+            self._entries[key] = (stamp, value)
+            self._entries.move_to_end(key)
+            limit = self._max_dbs or get_pool().max_dbs
+            while len(self._entries) > limit:
+                self._entries.popitem(last=False)
+        return value
+
+    def discard(self, key: str | None = None) -> None:
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _on_db_evicted(self, db_path: str) -> None:
+        with self._lock:
+            stale = [
+                key for key in self._entries if str(Path(self._db_path_of(key)).resolve()) == db_path
+            ]
+            for key in stale:
+                del self._entries[key]
+
+
+_POOL: ConnectionPool | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ConnectionPool(
+                max_dbs=_env_int("SQLITE_POOL_MAX_DBS", POOL_MAX_DBS_DEFAULT, minimum=1),
+                max_idle=_env_int("SQLITE_POOL_MAX_IDLE", POOL_MAX_IDLE_DEFAULT),
+                mmap_size=_env_int("SQLITE_MMAP_SIZE", MMAP_SIZE_DEFAULT),
+                cache_size_kb=_env_int("SQLITE_CACHE_SIZE_KB", CACHE_SIZE_KB_DEFAULT),
+            )
+        return _POOL
+
+
+def read_connection(db_path: str):
+    return get_pool().reader(db_path)
+
+
+def write_connection(db_path: str):
+    return get_pool().writer(db_path)
+
+
+def pool_stats() -> dict[str, Any]:
+    return get_pool().stats()
@@ -73,6 +73,7 @@ def compress_ontology_context(
     max_relations: int,
     max_context_chars: int,
     mode: str,
+    terms: list[str] | None = None,
 ) -> str:
     if not ontology_context or ontology_context == "No matching ontology facts found.":
         return ontology_context
@@ -93,7 +94,7 @@ def compress_ontology_context(
     if not fact_lines:
         return ontology_context[:max_context_chars] if len(ontology_context) > max_context_chars else ontology_context
 
-    terms = set(extract_query_terms(question))
+    terms = set(extract_query_terms(question) if terms is None else terms)
     price_q = is_price_question(question)
 
     scored_facts: list[tuple[int, int, str]] = []
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Protocol
+
+from ontology_llm.tools.linker_tools import EntityMention
+from ontology_llm.tools.pool_tools import DbScopedCache
+
+QUERY_ANALYSIS_CACHE_SIZE = 1024
+MIN_TERM_CHARS = 2
+
+_TOKEN_RE = re.compile(r"[0-9A-Za-z가-힣]+")
+_HANGUL_END_RE = re.compile(r"[가-힣]$")
+
+# Josa and copula endings, longest first so "에서는" wins over "는".
+KOREAN_PARTICLES = tuple(
+    sorted(
+        (
+            "으로부터", "에서부터", "이라고", "이라는", "이에요", "입니다", "인가요", "으로는",
+            "으로서", "으로써", "에서는", "에게서", "에게는", "까지는", "부터는",
+            "에서", "에게", "한테", "까지", "부터", "보다", "처럼", "만큼", "으로", "이랑",
+            "이나", "이고", "이며", "이야", "인지", "라고", "라는", "하고", "에는", "와는", "과는",
+            "은", "는", "이", "가", "을", "를", "의", "에", "도", "만", "와", "과", "로", "랑",
+        ),
+        key=len,
+        reverse=True,
+    )
+)
+
+
+class Segmenter(Protocol):
+    def link(self, text: str) -> list[EntityMention]: ...
+
+
+@dataclass(frozen=True)
+class QueryAnalysis:
+    """One analyzed question, shared by every retrieval step of a request.
+
+    `terms` are lowercased: dictionary surfaces first (label/alias hits, kept
+    whole even when they span words), then the remaining tokens with
+    particles stripped. `mentions` are the segmenter's linked spans in the
+    original question.
+    """
+
+    question: str
+    terms: tuple[str, ...]
+    mentions: tuple[EntityMention, ...] = ()
+
+    @property
+    def lookup_terms(self) -> list[str]:
+        """`terms`, or [""] (match-anything) when the question has none."""
+        return list(self.terms) or [""]
+
+
+def strip_particle(token: str) -> str:
+    """Drop one trailing josa/copula ending from a Hangul token, keeping a stem of 2+ chars."""
+    if not _HANGUL_END_RE.search(token):
+        return token
+    for particle in KOREAN_PARTICLES:
+        if token.endswith(particle) and len(token) - len(particle) >= MIN_TERM_CHARS:
+            return token[: -len(particle)]
+    return token
+
+
+def _fold(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+class QueryAnalyzer:
+    """Question -> QueryAnalysis, memoized per analyzer (QUERY_ANALYSIS_CACHE_SIZE questions).
+
+    With a segmenter (the label/alias entity linker), dictionary surfaces
+    found inside a token split it, e.g. "빠나우유가격은" -> "빠나우유" + "가격";
+    only the leftover pieces go through particle stripping. Without one the
+    analysis is regex tokens plus particle stripping.
+    """
+
+    def __init__(self, segmenter: Segmenter | None = None, *, cache_size: int = QUERY_ANALYSIS_CACHE_SIZE) -> None:
+        self.segmenter = segmenter
+        self.analyze: Callable[[str], QueryAnalysis] = lru_cache(maxsize=cache_size)(self._analyze)
+
+    def _analyze(self, question: str) -> QueryAnalysis:
+        mentions = self.segmenter.link(question) if self.segmenter else []
+        spans = sorted({(m.start, m.end) for m in mentions})
+        terms = [_fold(question[start:end]) for start, end in spans]
+        for match in _TOKEN_RE.finditer(question):
+            cursor = match.start()
+            for start, end in spans:
+                if start >= cursor and end <= match.end():
+                    terms.append(strip_particle(_fold(question[cursor:start])))
+                    cursor = end
+            terms.append(strip_particle(_fold(question[cursor : match.end()])))
+        deduped = dict.fromkeys(t for t in terms if len(t) >= MIN_TERM_CHARS)
+        return QueryAnalysis(question=question, terms=tuple(deduped), mentions=tuple(mentions))
+
+
+_DEFAULT_ANALYZER = QueryAnalyzer()
+_ANALYZER_CACHE: DbScopedCache[QueryAnalyzer] = DbScopedCache()
+
+
+def analyze_question(question: str) -> QueryAnalysis:
+    """Dictionary-free analysis, for callers without a database."""
+    return _DEFAULT_ANALYZER.analyze(question)
+
+
+def get_query_analyzer(
+    cache_key: tuple[str, int],
+    load_segmenter: Callable[[], Segmenter],
+) -> QueryAnalyzer:
+    """Return the analyzer for (db identity, ontology version); a new version starts a fresh cache."""
+    return _ANALYZER_CACHE.get(cache_key, lambda: QueryAnalyzer(load_segmenter()))
+
@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any
+
+from ontology_llm.tools.pool_tools import read_connection, write_connection
+
+RESULT_CACHE_MAX_ENTRIES_DEFAULT = 1024
+RESULT_CACHE_TTL_SECONDS_DEFAULT = 300.0
+
+RESULT_CACHE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS result_cache (
+    cache_key TEXT PRIMARY KEY,
+    db_key TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_result_cache_last_used ON result_cache(last_used);
+CREATE INDEX IF NOT EXISTS idx_result_cache_db_version ON result_cache(db_key, version);
+"""
+
+RESULT_CACHE_EVICT_SQL = """
+DELETE FROM result_cache
+WHERE cache_key IN (SELECT cache_key FROM result_cache ORDER BY last_used LIMIT ?)
+"""
+
+_SPACE_RE = re.compile(r"\s+")
+
+# (db identity, ontology version, settings stamp, normalized question, method id, limit)
+ResultKey = tuple[str, int, str, str, str, int]
+
+
+def normalize_question(question: str) -> str:
+    """NFKC, lowercase, whitespace collapsed: "빠나  우유 가격 " and "빠나 우유 가격" share an entry."""
+    return _SPACE_RE.sub(" ", unicodedata.normalize("NFKC", question)).strip().lower()
+
+
+class ResultCache:
+    """LRU + TTL cache of JSON-serializable lookup results.
+
+    The key carries the ontology version, so an ingest or reset (which bump
+    it) makes older entries unreachable; the first lookup at a newer version
+    also drops that database's older entries right away (`invalidated`).
+    In-process by default; with `path` the entries live in a SQLite file
+    shared by every worker using the same path (counters stay per process).
+    SQLite lookups use pooled read connections outside the cache lock; hits
+    only queue their `last_used` refresh, written with the next put, and
+    expired rows are left for put/eviction to overwrite. Payloads are stored
+    as JSON, so each hit returns a fresh copy.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES_DEFAULT,
+        ttl_seconds: float = RESULT_CACHE_TTL_SECONDS_DEFAULT,
+        path: str | None = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path or None
+        self._entries: OrderedDict[ResultKey, tuple[float, str]] = OrderedDict()
+        self._versions: dict[str, int] = {}
+        self._touched: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._ready = False
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.invalidated = 0
+
+    def _connection(self):
+        self._ensure_schema()
+        return write_connection(self.path)
+
+    def _reader(self):
+        self._ensure_schema()
+        return read_connection(self.path)
+
+    def _ensure_schema(self) -> None:
+        if not self._ready:
+            with write_connection(self.path) as conn:
+                conn.executescript(RESULT_CACHE_SCHEMA_SQL)
+            self._ready = True
+
+    def _observe_version(self, db_key: str, version: int) -> bool:
+        """Record `version` for the database (caller holds the lock); True when it is newer than
+        the last one seen, i.e. that database's older entries must be dropped."""
+        if self._versions.get(db_key, version) >= version:
+            self._versions.setdefault(db_key, version)
+            return False
+        self._versions[db_key] = version
+        if not self.path:
+            stale = [key for key in self._entries if key[0] == db_key and key[1] < version]
+            for key in stale:
+                del self._entries[key]
+            self.invalidated += len(stale)
+        return True
+
+    def _drop_older(self, db_key: str, version: int) -> None:
+        with self._connection() as conn:
+            dropped = conn.execute(
+                "DELETE FROM result_cache WHERE db_key = ? AND version < ?", (db_key, version)
+            ).rowcount
+            conn.commit()
+        with self._lock:
+            self.invalidated += dropped
+
+    def get(self, key: ResultKey) -> Any | None:
+        now = time.time()
+        if not self.path:
+            with self._lock:
+                self._observe_version(key[0], key[1])
+                payload = self._get_memory(key, now)
+                self._count(payload is not None)
+        else:
+            with self._lock:
+                newer = self._observe_version(key[0], key[1])
+            if newer:
+                self._drop_older(key[0], key[1])
+            payload = self._get_sqlite(key, now)
+        if payload is None:
+            return None
+        return json.loads(payload)
+
+    def _count(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def _get_memory(self, key: ResultKey, now: float) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry[0] > self.ttl_seconds:
+            del self._entries[key]
+            self.expired += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _get_sqlite(self, key: ResultKey, now: float) -> str | None:
+        cache_key = json.dumps(key, ensure_ascii=False)
+        with self._reader() as conn:
+            row = conn.execute(
+                "SELECT payload, created FROM result_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+        with self._lock:
+            expired = row is not None and now - row[1] > self.ttl_seconds
+            if expired:
+                self.expired += 1
+            elif row is not None:
+                self._touched[cache_key] = now
+            self._count(row is not None and not expired)
+        return None if row is None or expired else row[0]
+
+    def put(self, key: ResultKey, value: Any) -> None:
+        try:
+            payload = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return
+        now = time.time()
+        with self._lock:
+            newer = self._observe_version(key[0], key[1])
+            if self._versions[key[0]] > key[1]:
+                return
+            if not self.path:
+                self._entries[key] = (now, payload)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evicted += 1
+                return
+            touched, self._touched = self._touched, {}
+        if newer:
+            self._drop_older(key[0], key[1])
+        with self._connection() as conn:
+            conn.executemany(
+                "UPDATE result_cache SET last_used = ? WHERE cache_key = ?",
+                [(used, cache_key) for cache_key, used in touched.items()],
+            )
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO result_cache(cache_key, db_key, version, payload, created, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (json.dumps(key, ensure_ascii=False), key[0], key[1], payload, now, now),
+            )
+            excess = conn.execute("SELECT count(*) FROM result_cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(RESULT_CACHE_EVICT_SQL, (excess,))
+            conn.commit()
+        with self._lock:
+            self.evicted += max(excess, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._touched.clear()
+        if self.path:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM result_cache")
+                conn.commit()
+
+    def stats(self) -> dict[str, object]:
+        if self.path:
+            with self._reader() as conn:
+                entries = conn.execute("SELECT count(*) FROM result_cache").fetchone()[0]
+        with self._lock:
+            if not self.path:
+                entries = len(self._entries)
+            lookups = self.hits + self.misses
+            return {
+                "backend": "sqlite" if self.path else "memory",
+                "path": self.path,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "invalidated": self.invalidated,
+            }
+
+
+_CACHE: ResultCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_result_cache() -> ResultCache | None:
+    """Process-wide cache from RESULT_CACHE_MAX_ENTRIES (0 disables), RESULT_CACHE_TTL_SECONDS
+    and RESULT_CACHE_PATH (empty = in-process, else a SQLite file shared across workers)."""
+    global _CACHE
+    try:
+        max_entries = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", ""))
+    except ValueError:
+        max_entries = RESULT_CACHE_MAX_ENTRIES_DEFAULT
+    if max_entries <= 0:
+        return None
+    try:
+        ttl_seconds = float(os.getenv("RESULT_CACHE_TTL_SECONDS", ""))
+    except ValueError:
+        ttl_seconds = RESULT_CACHE_TTL_SECONDS_DEFAULT
+    path = os.getenv("RESULT_CACHE_PATH", "").strip() or None
+    with _CACHE_LOCK:
+        if _CACHE is None or (_CACHE.max_entries, _CACHE.ttl_seconds, _CACHE.path) != (max_entries, ttl_seconds, path):
+            _CACHE = ResultCache(max_entries=max_entries, ttl_seconds=ttl_seconds, path=path)
+        return _CACHE
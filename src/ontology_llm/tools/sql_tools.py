@@ -1,10 +1,46 @@
 from __future__ import annotations
 
+import hashlib
+import importlib.util
+import json
+import os
 import re
+import shutil
 import sqlite3
-from typing import Any
-
-import yaml
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from ontology_llm.tools.ann_tools import (
+    ANN_BACKENDS,
+    HNSW_EF_DEFAULT,
+    HNSW_M_DEFAULT,
+    IVF_NPROBE_DEFAULT,
+)
+from ontology_llm.tools.bm25_tools import BM25_B, BM25_K1, bm25_terms, query_term_weights
+from ontology_llm.tools.community_tools import (
+    COMMUNITY_RESOLUTION_DEFAULT,
+    detect_communities,
+    summarize_community,
+)
+from ontology_llm.tools.embedding_tools import (
+    EMBEDDING_BATCH_SIZE_DEFAULT,
+    EMBEDDING_DTYPES,
+    EMBEDDING_MODEL_DEFAULT,
+    EmbeddingIndex,
+    encode_query,
+    encode_texts,
+    get_embedding_index,
+    index_dir,
+)
+from ontology_llm.tools.graph_tools import RelationGraph, get_relation_graph
+from ontology_llm.tools.linker_tools import EntityMention, get_entity_linker
+from ontology_llm.tools.loader_tools import iter_ontology_records
+from ontology_llm.tools.query_tools import QueryAnalysis, analyze_question, get_query_analyzer
+from ontology_llm.tools.result_cache_tools import get_result_cache, normalize_question
+from ontology_llm.tools.termdoc_tools import TermDocIndex, get_term_doc_index
 
 INIT_SCHEMA_SQL = """
 CREATE TABLE IF NOT EXISTS onto_classes (
@@ -35,6 +71,125 @@ CREATE TABLE IF NOT EXISTS onto_relations (
     FOREIGN KEY(source_id) REFERENCES onto_instances(id),
     FOREIGN KEY(target_id) REFERENCES onto_instances(id)
 );
+
+CREATE TABLE IF NOT EXISTS onto_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS onto_hashes (
+    source TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY(source, kind, key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS onto_changes (
+    version INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    op TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_onto_changes_version ON onto_changes(version);
+
+CREATE TABLE IF NOT EXISTS onto_instance_docs (
+    instance_id TEXT PRIMARY KEY,
+    class_name TEXT NOT NULL,
+    label TEXT NOT NULL,
+    props TEXT NOT NULL,
+    search_text TEXT NOT NULL,
+    fact_line TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS onto_surface_forms (
+    form_id INTEGER PRIMARY KEY,
+    instance_id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    surface TEXT NOT NULL,
+    norm TEXT NOT NULL,
+    UNIQUE(instance_id, field, surface)
+);
+
+CREATE TABLE IF NOT EXISTS onto_surface_grams (
+    gram TEXT NOT NULL,
+    form_id INTEGER NOT NULL,
+    PRIMARY KEY(gram, form_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS onto_bm25_docs (
+    instance_id TEXT PRIMARY KEY,
+    length INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS onto_bm25_terms (
+    term TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS onto_bm25_postings (
+    term TEXT NOT NULL,
+    instance_id TEXT NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY(term, instance_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS onto_isa_closure (
+    ancestor_id TEXT NOT NULL,
+    descendant_id TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY(ancestor_id, descendant_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS onto_communities (
+    community_id INTEGER PRIMARY KEY,
+    size INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    summary TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS onto_community_members (
+    instance_id TEXT PRIMARY KEY,
+    community_id INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Secondary indexes for the relation/property access paths used by retrieval.
+# Kept apart from INIT_SCHEMA_SQL so bulk loads can build them after the data.
+INDEX_SCHEMA_SQL = """
+CREATE INDEX IF NOT EXISTS idx_onto_relations_target ON onto_relations(target_id, type, source_id);
+CREATE INDEX IF NOT EXISTS idx_onto_relations_type ON onto_relations(type);
+CREATE INDEX IF NOT EXISTS idx_onto_properties_key_value ON onto_properties(key, value);
+CREATE INDEX IF NOT EXISTS idx_onto_properties_lower_key ON onto_properties(lower(key));
+CREATE INDEX IF NOT EXISTS idx_onto_properties_lower_value ON onto_properties(lower(COALESCE(value, '')));
+CREATE INDEX IF NOT EXISTS idx_onto_instances_lower_class ON onto_instances(lower(class_name));
+CREATE INDEX IF NOT EXISTS idx_onto_hashes_kind_key ON onto_hashes(kind, key);
+CREATE INDEX IF NOT EXISTS idx_onto_isa_closure_descendant ON onto_isa_closure(descendant_id, ancestor_id);
+CREATE INDEX IF NOT EXISTS idx_onto_community_members_community ON onto_community_members(community_id);
+CREATE INDEX IF NOT EXISTS idx_onto_bm25_postings_instance ON onto_bm25_postings(instance_id, term);
+"""
+
+# Property keys whose values are indexed as surface forms next to the label.
+SURFACE_PROPERTY_KEYS = ("alias", "keyword", "descriptor")
+SURFACE_MATCH_LIMIT = 200
+
+# Rows per executemany batch (and per derived-index refresh) during bulk loads.
+BULK_BATCH_SIZE = 5000
+
+# onto_changes rows older than this many versions are pruned.
+CHANGE_LOG_KEEP_VERSIONS = 64
+
+# Full-text index over instance id/class/label and property keys/values.
+FTS_SCHEMA_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS onto_fts USING fts5(
+    id,
+    class_name,
+    label,
+    prop_keys,
+    prop_values,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
 """
 
 LOOKUP_QUERY_TEMPLATE = """
@@ -47,10 +202,417 @@ GROUP BY i.id, i.class_name, i.label
 LIMIT ?
 """
 
-RELATIONS_BY_IDS_TEMPLATE = """
+# onto_instance_docs rows: (instance_id, class_name, label, props, search_text, fact_line).
+# search_text is the lowercased id/class/label/props joined by SEARCH_FIELD_SEP.
+SEARCH_FIELD_SEP = "\x1f"
+
+GRAPH_MAX_HOPS_DEFAULT = 2
+GRAPH_FAN_OUT_DEFAULT = 12
+# Recursive-CTE rows allowed per requested path before the walk stops expanding.
+GRAPH_ROW_BUDGET_PER_PATH = 16
+# Personalized PageRank for ranked relation evidence (method3).
+PPR_ALPHA_DEFAULT = 0.15
+PPR_EPSILON_DEFAULT = 1e-4
+GRAPH_TOP_K_DEFAULT = 20
+
+# Superseded compiled ontology DBs younger than this are kept by prune-ontology-cache.
+COMPILED_DB_GRACE_HOURS_DEFAULT = 24.0
+
+# Shortest-path search budgets (GRAPH_PATH_MAX_DEPTH / GRAPH_PATH_TIME_BUDGET_MS).
+PATH_MAX_DEPTH_DEFAULT = 6
+PATH_TIME_BUDGET_MS_DEFAULT = 50.0
+PATH_MAX_VISITED_DEFAULT = 200_000
+
+# Hybrid retrieval (method5/6): fused = alpha * cosine + (1 - alpha) * normalized BM25.
+HYBRID_ALPHA_DEFAULT = 0.7
+HYBRID_POOL_FACTOR = 4
+DENSE_RETRIEVAL_TYPES = {"hybrid": "hybrid-dense-bm25", "bm25": "bm25", "token-proxy": "dense-proxy"}
+
+INSTANCE_AGGREGATE_QUERY = """
+SELECT i.id, i.class_name, COALESCE(i.label, ''),
+       COALESCE(group_concat(p.key || '=' || p.value, '; '), '')
+FROM onto_instances i
+LEFT JOIN onto_properties p ON p.instance_id = i.id
+WHERE i.id IN (SELECT value FROM json_each(?))
+GROUP BY i.id, i.class_name, i.label
+"""
+
+# Stand-in for onto_instance_docs on databases created before the table existed.
+LEGACY_INSTANCE_DOCS_SQL = """(
+    SELECT instance_id, class_name, label, props,
+           lower(instance_id || char(31) || class_name || char(31) || label || char(31) || props)
+               AS search_text,
+           '- ' || instance_id || ' (' || class_name || ') label=''' || label || ''' props=['
+               || props || ']' AS fact_line
+    FROM (
+        SELECT i.id AS instance_id, i.class_name AS class_name, COALESCE(i.label, '') AS label,
+               COALESCE(group_concat(p.key || '=' || p.value, '; '), '') AS props
+        FROM onto_instances i
+        LEFT JOIN onto_properties p ON p.instance_id = i.id
+        GROUP BY i.id, i.class_name, i.label
+    )
+)"""
+
+FTS_LOOKUP_QUERY = """
+WITH hits AS (
+    SELECT id, bm25(onto_fts, 3.0, 1.0, 4.0, 1.0, 2.0) AS rank
+    FROM onto_fts
+    WHERE onto_fts MATCH ?
+    ORDER BY rank
+    LIMIT ?
+)
+SELECT d.instance_id, d.class_name, d.label, d.props, d.search_text, d.fact_line
+FROM hits h
+JOIN onto_instance_docs d ON d.instance_id = h.id
+ORDER BY h.rank, d.instance_id
+"""
+
+FTS_DELETE_SQL = """
+DELETE FROM onto_fts
+WHERE rowid IN (SELECT rowid FROM onto_fts WHERE onto_fts MATCH ?)
+  AND id = ?
+"""
+
+FTS_REFRESH_SQL = """
+INSERT INTO onto_fts(id, class_name, label, prop_keys, prop_values)
+SELECT i.id, i.class_name, COALESCE(i.label, ''),
+       COALESCE((SELECT group_concat(p.key, ' ') FROM onto_properties p WHERE p.instance_id = i.id), ''),
+       COALESCE((SELECT group_concat(p.value, ' ') FROM onto_properties p WHERE p.instance_id = i.id), '')
+FROM onto_instances i
+WHERE i.id = ?
+"""
+
+FTS_PRICE_FACT_QUERY = """
+SELECT i.id, COALESCE(i.label, ''), p.value
+FROM onto_fts f
+JOIN onto_instances i ON i.id = f.id
+JOIN onto_properties p ON p.instance_id = i.id
+WHERE onto_fts MATCH ?
+  AND p.key = 'price_krw'
+ORDER BY bm25(onto_fts, 3.0, 1.0, 4.0, 1.0, 2.0)
+LIMIT 1
+"""
+
+SURFACE_FORMS_BY_INSTANCE_QUERY = """
+SELECT form_id, norm FROM onto_surface_forms WHERE instance_id = ?
+"""
+
+SURFACE_SOURCES_QUERY = """
+SELECT 'label', label FROM onto_instances WHERE id = ? AND label IS NOT NULL
+UNION ALL
+SELECT key, value FROM onto_properties
+WHERE instance_id = ? AND key IN ('alias', 'keyword', 'descriptor') AND value IS NOT NULL
+"""
+
+LINKER_SURFACES_QUERY = """
+SELECT instance_id, field, surface
+FROM onto_surface_forms
+WHERE field IN ('label', 'alias')
+"""
+
+INSTANCE_DOCS_TEMPLATE = """
+SELECT d.instance_id, d.class_name, d.label, d.props, d.search_text, d.fact_line
+FROM {docs} d
+WHERE d.instance_id IN (SELECT value FROM json_each(?))
+"""
+
+SURFACE_BIGRAM_QUERY = """
+SELECT f.instance_id, f.field
+FROM onto_surface_grams g
+JOIN onto_surface_forms f ON f.form_id = g.form_id
+WHERE g.gram = ?
+LIMIT ?
+"""
+
+SURFACE_TRIGRAM_QUERY = """
+SELECT f.instance_id, f.field
+FROM onto_surface_forms f
+WHERE f.form_id IN (
+    SELECT form_id
+    FROM onto_surface_grams
+    WHERE gram IN (SELECT value FROM json_each(?))
+    GROUP BY form_id
+    HAVING count(*) = ?
+)
+  AND instr(f.norm, ?) > 0
+LIMIT ?
+"""
+
+PRICE_BY_IDS_QUERY = """
+SELECT i.id, COALESCE(i.label, ''), p.value
+FROM onto_instances i
+JOIN onto_properties p ON p.instance_id = i.id
+WHERE p.key = 'price_krw'
+  AND i.id IN (SELECT value FROM json_each(?))
+"""
+
+RELATIONS_BY_IDS_JSON_QUERY = """
 SELECT source_id, type, target_id
 FROM onto_relations
-WHERE source_id IN ({qmarks})
+WHERE source_id IN (SELECT value FROM json_each(?))
+"""
+
+CONSTRAINT_FACTS_TEMPLATE = """
+WITH matched(id) AS (
+    SELECT id FROM onto_instances
+    WHERE lower(class_name) IN ('constraint', 'rule', 'policy', 'guardrail')
+    UNION
+    SELECT instance_id FROM onto_properties
+    WHERE lower(key) IN ('constraint', 'rule', 'template', 'policy', 'guardrail')
+)
+SELECT d.instance_id, d.label, d.props
+FROM matched m
+JOIN {docs} d ON d.instance_id = m.id
+LIMIT ?
+"""
+
+# Scope edges: applies_to/constrains point from the constraint to what it
+# covers, governed_by points at it. A constraint applies to a seed when it
+# covers the seed or one of its is_a ancestors (one closure index lookup per
+# seed), or is a seed itself. Constraints without any scope edge are global and
+# always kept; applicable ones sort first.
+# Params: ?1 seeds JSON, ?2 limit.
+CONSTRAINT_APPLICABILITY_TEMPLATE = """
+WITH matched(id) AS (
+    SELECT id FROM onto_instances
+    WHERE lower(class_name) IN ('constraint', 'rule', 'policy', 'guardrail')
+    UNION
+    SELECT instance_id FROM onto_properties
+    WHERE lower(key) IN ('constraint', 'rule', 'template', 'policy', 'guardrail')
+),
+seeds(id) AS (SELECT value FROM json_each(?1)),
+scope(id) AS (
+    SELECT id FROM seeds
+    UNION
+    SELECT ancestor_id FROM onto_isa_closure WHERE descendant_id IN (SELECT id FROM seeds)
+),
+covering(id) AS (
+    SELECT id FROM seeds
+    UNION
+    SELECT source_id FROM onto_relations
+    WHERE target_id IN (SELECT id FROM scope) AND type IN ('applies_to', 'constrains')
+    UNION
+    SELECT target_id FROM onto_relations
+    WHERE source_id IN (SELECT id FROM scope) AND type = 'governed_by'
+)
+SELECT d.instance_id, d.label, d.props, m.id IN (SELECT id FROM covering) AS applies
+FROM matched m
+JOIN {docs} d ON d.instance_id = m.id
+WHERE applies
+   OR NOT EXISTS (
+        SELECT 1 FROM onto_relations r
+        WHERE r.source_id = m.id AND r.type IN ('applies_to', 'constrains')
+   ) AND NOT EXISTS (
+        SELECT 1 FROM onto_relations r
+        WHERE r.target_id = m.id AND r.type = 'governed_by'
+   )
+ORDER BY applies DESC, d.instance_id
+LIMIT ?2
+"""
+
+# Community summaries of the seeds' communities, most seeds first. Params: ?1 seeds JSON, ?2 limit.
+COMMUNITY_SUMMARIES_QUERY = """
+SELECT c.community_id, c.size, c.title, c.summary, count(*) AS hits
+FROM json_each(?1) s
+JOIN onto_community_members m ON m.instance_id = s.value
+JOIN onto_communities c ON c.community_id = m.community_id
+GROUP BY c.community_id
+ORDER BY hits DESC, c.size DESC, c.community_id
+LIMIT ?2
+"""
+
+# Global fallback when no seed belongs to a community; one row per community.
+TOP_COMMUNITIES_QUERY = """
+SELECT community_id, size, title, summary, 0
+FROM onto_communities
+ORDER BY size DESC, community_id
+LIMIT ?
+"""
+
+COMMUNITY_IDS_QUERY = """
+SELECT DISTINCT community_id FROM onto_community_members
+WHERE instance_id IN (SELECT value FROM json_each(?))
+"""
+
+COMMUNITY_MEMBERS_QUERY = """
+SELECT instance_id FROM onto_community_members
+WHERE community_id IN (SELECT value FROM json_each(?))
+"""
+
+COMMUNITY_EDGES_QUERY = """
+SELECT source_id, type, target_id FROM onto_relations
+WHERE source_id IN (SELECT value FROM json_each(?1))
+  AND target_id IN (SELECT value FROM json_each(?1))
+"""
+
+ISA_EDGES_QUERY = """
+SELECT source_id, target_id FROM onto_relations WHERE type = 'is_a'
+"""
+
+# One primary-key range per matched node: its is_a descendants.
+ISA_DESCENDANTS_QUERY = """
+SELECT descendant_id FROM onto_isa_closure
+WHERE ancestor_id = ?
+ORDER BY descendant_id
+LIMIT ?
+"""
+
+# Params: ?1 candidate ids JSON, ?2 matched ids JSON.
+ISA_ANCESTOR_HITS_QUERY = """
+SELECT descendant_id, ancestor_id FROM onto_isa_closure
+WHERE descendant_id IN (SELECT value FROM json_each(?1))
+  AND ancestor_id IN (SELECT value FROM json_each(?2))
+ORDER BY descendant_id, depth, ancestor_id
+"""
+
+# ID lists are bound as one JSON array parameter, so the statement text is the
+# same for any seed count (statement-cache friendly, no host-parameter limit).
+# Each branch is cut to the limit before the union, so a hub seed with many
+# incoming edges costs a bounded sort instead of materializing every edge;
+# `+source_id` keeps the target branch on idx_onto_relations_target.
+# Params: ?1 seeds JSON, ?2 limit.
+RELATION_EVIDENCE_QUERY = """
+WITH seeds(id) AS (SELECT value FROM json_each(?1))
+SELECT source_id, type, target_id FROM (
+    SELECT * FROM (
+        SELECT source_id, type, target_id FROM onto_relations
+        WHERE source_id IN (SELECT id FROM seeds)
+        ORDER BY source_id, type, target_id
+        LIMIT ?2
+    )
+    UNION
+    SELECT * FROM (
+        SELECT source_id, type, target_id FROM onto_relations
+        WHERE target_id IN (SELECT id FROM seeds)
+        ORDER BY +source_id, type, target_id
+        LIMIT ?2
+    )
+)
+ORDER BY source_id, type, target_id
+LIMIT ?2
+"""
+
+# Outgoing paths of up to `max_hops` edges from the seeds in one statement.
+# Each step keeps at most `fan_out` edges per node (ordered by type, target) and
+# never revisits a node already on the path; the outer LIMIT caps total rows.
+# Params: seeds JSON, max_hops, relation types JSON or NULL (twice), fan_out, row budget.
+GRAPH_PATHS_QUERY = """
+WITH RECURSIVE walk(depth, node, nodes, edges) AS (
+    SELECT 0, seed.value, json_array(seed.value), json_array()
+    FROM json_each(?) seed
+    UNION ALL
+    SELECT w.depth + 1, r.target_id,
+           json_insert(w.nodes, '$[#]', r.target_id),
+           json_insert(w.edges, '$[#]', r.type)
+    FROM walk w
+    JOIN onto_relations r ON r.source_id = w.node
+    WHERE w.depth < ?
+      AND (r.type, r.target_id) IN (
+          SELECT r2.type, r2.target_id
+          FROM onto_relations r2
+          WHERE r2.source_id = w.node
+            AND (? IS NULL OR r2.type IN (SELECT value FROM json_each(?)))
+            AND r2.target_id NOT IN (SELECT value FROM json_each(w.nodes))
+          ORDER BY r2.type, r2.target_id
+          LIMIT ?
+      )
+    LIMIT ?
+)
+SELECT nodes, edges FROM walk WHERE depth > 0
+"""
+
+DENSE_PROXY_TEMPLATE = """
+SELECT d.instance_id, d.class_name, d.label, d.props, d.search_text
+FROM {docs} d
+"""
+
+# dense_proxy_context weights per TERM_DOC_FIELDS entry (id, class, label, props).
+DENSE_PROXY_FIELD_WEIGHTS = (3, 1, 5, 2)
+
+# ?1 = {term: idf x query tf}; ?3..?5 = k1, b, average document length.
+BM25_SEARCH_QUERY = """
+WITH q AS (SELECT key AS term, value AS weight FROM json_each(?1))
+SELECT p.instance_id,
+       sum(q.weight * p.tf * (?3 + 1.0) / (p.tf + ?3 * (1.0 - ?4 + ?4 * d.length / ?5))) AS score
+FROM q
+JOIN onto_bm25_postings p ON p.term = q.term
+JOIN onto_bm25_docs d ON d.instance_id = p.instance_id
+GROUP BY p.instance_id
+ORDER BY score DESC, p.instance_id
+LIMIT ?2
+"""
+
+# Same scoring restricted to the candidate ids in ?2 (hybrid fusion).
+BM25_SCORES_QUERY = """
+WITH q AS (SELECT key AS term, value AS weight FROM json_each(?1))
+SELECT p.instance_id,
+       sum(q.weight * p.tf * (?3 + 1.0) / (p.tf + ?3 * (1.0 - ?4 + ?4 * d.length / ?5))) AS score
+FROM q
+JOIN onto_bm25_postings p ON p.term = q.term AND p.instance_id IN (SELECT value FROM json_each(?2))
+JOIN onto_bm25_docs d ON d.instance_id = p.instance_id
+GROUP BY p.instance_id
+"""
+
+BM25_DF_QUERY = """
+SELECT term, df FROM onto_bm25_terms WHERE term IN (SELECT value FROM json_each(?))
+"""
+
+BM25_DOC_TERMS_QUERY = """
+SELECT term, count(*) FROM onto_bm25_postings
+WHERE instance_id IN (SELECT value FROM json_each(?))
+GROUP BY term
+"""
+
+EMBEDDING_DOCS_TEMPLATE = """
+SELECT d.instance_id, d.class_name, d.label, d.props
+FROM {docs} d
+ORDER BY d.instance_id
+"""
+
+ENRICHMENT_TARGETS_QUERY = """
+SELECT i.id, COALESCE(i.label, ''), p.key, COALESCE(p.value, '')
+FROM onto_properties p
+JOIN onto_instances i ON i.id = p.instance_id
+WHERE lower(COALESCE(p.value, '')) IN ('', 'unknown', 'todo', 'n/a', '?')
+LIMIT ?
+"""
+
+HASHES_FOR_KEYS_QUERY = """
+SELECT key, hash FROM onto_hashes
+WHERE source = ? AND kind = ? AND key IN (SELECT value FROM json_each(?))
+"""
+
+INGEST_SEEN_SCHEMA_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS ingest_seen (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY(kind, key)
+) WITHOUT ROWID;
+
+CREATE TEMP TABLE IF NOT EXISTS ingest_gone (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY(kind, key)
+) WITHOUT ROWID;
+"""
+
+# Keys `source` loaded last time that the streamed file no longer has.
+INGEST_GONE_SQL = """
+INSERT INTO temp.ingest_gone(kind, key)
+SELECT h.kind, h.key
+FROM onto_hashes h
+WHERE h.source = ?
+  AND NOT EXISTS (SELECT 1 FROM temp.ingest_seen s WHERE s.kind = h.kind AND s.key = h.key)
+"""
+
+OTHER_SOURCE_HASH_QUERY = """
+SELECT 1 FROM onto_hashes WHERE kind = ? AND key = ? AND source <> ? LIMIT 1
+"""
+
+RELATIONS_TOUCHING_QUERY = """
+SELECT source_id, type, target_id FROM onto_relations WHERE source_id = ?
+UNION
+SELECT source_id, type, target_id FROM onto_relations WHERE target_id = ?
 """
 
 PRICE_FACT_QUERY_TEMPLATE = """
@@ -70,52 +632,1105 @@ def get_db(db_path: str) -> sqlite3.Connection:
 
 
 def init_schema(conn: sqlite3.Connection) -> None:
+    had_surface_index = has_surface_index(conn)
+    had_instance_docs = has_instance_docs(conn)
+    had_isa_closure = has_isa_closure(conn)
+    had_bm25_index = has_bm25_index(conn)
     conn.executescript(INIT_SCHEMA_SQL)
+    conn.executescript(INDEX_SCHEMA_SQL)
+    # Interval labels from earlier builds were never read; the closure covers subsumption.
+    conn.execute("DROP TABLE IF EXISTS onto_isa_labels")
+    if not had_surface_index:
+        rebuild_surface_index(conn)
+    if not had_instance_docs:
+        rebuild_instance_docs(conn)
+    if not had_isa_closure:
+        rebuild_isa_closure(conn)
+    if not had_bm25_index and had_instance_docs:
+        rebuild_bm25_index(conn)
+    had_fts = has_fts_index(conn)
+    try:
+        conn.executescript(FTS_SCHEMA_SQL)
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5: lookups keep using the LIKE path.
+        conn.commit()
+        return
+    if not had_fts:
+        # Databases ingested before the index existed are backfilled once.
+        rebuild_fts_index(conn)
+    conn.commit()
+
+
+def analyze_ontology(conn: sqlite3.Connection) -> None:
+    """Refresh planner statistics; analysis_limit keeps ANALYZE cheap on large tables."""
+    conn.execute("PRAGMA analysis_limit = 1000")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def get_ontology_version(conn: sqlite3.Connection) -> int:
+    if not _table_exists(conn, "onto_meta"):
+        return 0
+    row = conn.execute("SELECT value FROM onto_meta WHERE key = 'version'").fetchone()
+    return int(row[0]) if row and row[0] is not None else 0
+
+
+def bump_ontology_version(conn: sqlite3.Connection) -> int:
+    version = get_ontology_version(conn) + 1
+    conn.execute(
+        "INSERT OR REPLACE INTO onto_meta(key, value) VALUES ('version', ?)", (str(version),)
+    )
+    return version
+
+
+def ontology_cache_key(conn: sqlite3.Connection) -> tuple[str, int]:
+    """(database identity, ontology version) for caches of derived indexes."""
+    db_file = ""
+    for _, name, file in conn.execute("PRAGMA database_list"):
+        if name == "main":
+            db_file = file or ""
+    return (db_file or f":memory:{id(conn)}", get_ontology_version(conn))
+
+
+def _iter_id_chunks(
+    conn: sqlite3.Connection, sql: str, size: int | None = None
+) -> Iterator[list[str]]:
+    """Ids from a single-column query, `size` at a time (BULK_BATCH_SIZE by default)."""
+    cursor = conn.execute(sql)
+    while True:
+        chunk = [row[0] for row in cursor.fetchmany(size or BULK_BATCH_SIZE)]
+        if not chunk:
+            return
+        yield chunk
+
+
+def has_fts_index(conn: sqlite3.Connection) -> bool:
+    return _table_exists(conn, "onto_fts")
+
+
+def has_surface_index(conn: sqlite3.Connection) -> bool:
+    return _table_exists(conn, "onto_surface_forms")
+
+
+def normalize_surface(text: str) -> str:
+    return "".join(text.lower().split())
+
+
+def _surface_grams(norm: str) -> set[str]:
+    grams: set[str] = set()
+    for size in (2, 3):
+        grams.update(norm[i : i + size] for i in range(len(norm) - size + 1))
+    return grams
+
+
+def refresh_surface_index(
+    conn: sqlite3.Connection,
+    instance_ids: list[str],
+    extra_surfaces: dict[str, list[tuple[str, str]]] | None = None,
+) -> None:
+    """Re-index label/alias/keyword/descriptor surfaces of the given instances.
+
+    `extra_surfaces` carries (field, surface) pairs that onto_properties cannot
+    hold, e.g. repeated `alias` keys from the YAML source.
+    """
+    if not instance_ids or not has_surface_index(conn):
+        return
+    ids = [inst_id for inst_id in dict.fromkeys(instance_ids) if inst_id]
+
+    stale_grams: list[tuple[str, int]] = []
+    for inst_id in ids:
+        for form_id, norm in conn.execute(SURFACE_FORMS_BY_INSTANCE_QUERY, (inst_id,)):
+            stale_grams.extend((gram, form_id) for gram in _surface_grams(norm))
+    conn.executemany(
+        "DELETE FROM onto_surface_grams WHERE gram = ? AND form_id = ?", stale_grams
+    )
+    conn.executemany(
+        "DELETE FROM onto_surface_forms WHERE instance_id = ?", [(inst_id,) for inst_id in ids]
+    )
+
+    for inst_id in ids:
+        surfaces = conn.execute(SURFACE_SOURCES_QUERY, (inst_id, inst_id)).fetchall()
+        surfaces.extend((extra_surfaces or {}).get(inst_id, []))
+
+        for field, surface in dict.fromkeys(surfaces):
+            norm = normalize_surface(surface)
+            if not norm:
+                continue
+            cur = conn.execute(
+                """
+                INSERT OR IGNORE INTO onto_surface_forms(instance_id, field, surface, norm)
+                VALUES (?, ?, ?, ?)
+                """,
+                (inst_id, field, surface, norm),
+            )
+            if not cur.rowcount:
+                continue
+            conn.executemany(
+                "INSERT OR IGNORE INTO onto_surface_grams(gram, form_id) VALUES (?, ?)",
+                [(gram, cur.lastrowid) for gram in _surface_grams(norm)],
+            )
+
+
+def rebuild_surface_index(
+    conn: sqlite3.Connection,
+    extra_surfaces: dict[str, list[tuple[str, str]]] | None = None,
+) -> None:
+    if not has_surface_index(conn):
+        return
+    conn.execute("DELETE FROM onto_surface_grams")
+    conn.execute("DELETE FROM onto_surface_forms")
+    for ids in _iter_id_chunks(conn, "SELECT id FROM onto_instances"):
+        refresh_surface_index(conn, ids, extra_surfaces)
+
+
+def lookup_surface_matches(
+    conn: sqlite3.Connection, terms: list[str]
+) -> dict[str, dict[str, set[str]]]:
+    """Resolve substring hits of query terms on indexed surfaces.
+
+    Returns {instance_id: {term: {field, ...}}}. Two-character terms are
+    answered by a single bigram probe; longer terms intersect their trigram
+    postings and confirm the substring on the normalized surface.
+    """
+    if not has_surface_index(conn):
+        return {}
+    hits: dict[str, dict[str, set[str]]] = {}
+    for term in terms:
+        norm = normalize_surface(term)
+        if len(norm) < 2:
+            continue
+        if len(norm) == 2:
+            rows = conn.execute(SURFACE_BIGRAM_QUERY, (norm, SURFACE_MATCH_LIMIT)).fetchall()
+        else:
+            trigrams = sorted({norm[i : i + 3] for i in range(len(norm) - 2)})
+            rows = conn.execute(
+                SURFACE_TRIGRAM_QUERY,
+                (json.dumps(trigrams), len(trigrams), norm, SURFACE_MATCH_LIMIT),
+            ).fetchall()
+        for inst_id, field in rows:
+            hits.setdefault(inst_id, {}).setdefault(term, set()).add(field)
+    return hits
+
+
+def _rank_surface_hits(hits: dict[str, dict[str, set[str]]]) -> list[str]:
+    return sorted(
+        hits,
+        key=lambda inst_id: (
+            -len(hits[inst_id]),
+            -max(len(t) for t in hits[inst_id]),
+            inst_id,
+        ),
+    )
+
+
+def refresh_fts_index(conn: sqlite3.Connection, instance_ids: list[str]) -> None:
+    if not instance_ids or not has_fts_index(conn):
+        return
+    ids = [inst_id for inst_id in dict.fromkeys(instance_ids) if inst_id]
+    conn.executemany(
+        FTS_DELETE_SQL,
+        [(f"id : {_fts_phrase(inst_id)}", inst_id) for inst_id in ids],
+    )
+    conn.executemany(FTS_REFRESH_SQL, [(inst_id,) for inst_id in ids])
+
+
+def rebuild_fts_index(conn: sqlite3.Connection) -> None:
+    if not has_fts_index(conn):
+        return
+    conn.execute("DELETE FROM onto_fts")
+    for ids in _iter_id_chunks(conn, "SELECT id FROM onto_instances"):
+        conn.executemany(FTS_REFRESH_SQL, [(inst_id,) for inst_id in ids])
+
+
+def has_instance_docs(conn: sqlite3.Connection) -> bool:
+    return _table_exists(conn, "onto_instance_docs")
+
+
+def instance_docs_source(conn: sqlite3.Connection) -> str:
+    return "onto_instance_docs" if has_instance_docs(conn) else LEGACY_INSTANCE_DOCS_SQL
+
+
+def _doc_row(inst_id: str, cls: str, label: str, props: str) -> tuple[str, str, str, str, str, str]:
+    search_text = SEARCH_FIELD_SEP.join((inst_id or "", cls or "", label or "", props or "")).lower()
+    fact_line = f"- {inst_id} ({cls}) label='{label}' props=[{props}]"
+    return inst_id, cls, label, props, search_text, fact_line
+
+
+def _split_search_text(search_text: str) -> list[str]:
+    return search_text.split(SEARCH_FIELD_SEP, 3)
+
+
+def refresh_instance_docs(conn: sqlite3.Connection, instance_ids: list[str]) -> None:
+    """Re-render the materialized document row of each given instance."""
+    if not instance_ids or not has_instance_docs(conn):
+        return
+    ids = [inst_id for inst_id in dict.fromkeys(instance_ids) if inst_id]
+    rows = conn.execute(INSTANCE_AGGREGATE_QUERY, (json.dumps(ids),)).fetchall()
+    conn.executemany(
+        "DELETE FROM onto_instance_docs WHERE instance_id = ?", [(inst_id,) for inst_id in ids]
+    )
+    conn.executemany(
+        """
+        INSERT INTO onto_instance_docs(instance_id, class_name, label, props, search_text, fact_line)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        [_doc_row(*row) for row in rows],
+    )
+    refresh_bm25_index(conn, ids, rows)
+
+
+def rebuild_instance_docs(conn: sqlite3.Connection) -> None:
+    if not has_instance_docs(conn):
+        return
+    conn.execute("DELETE FROM onto_instance_docs")
+    _clear_bm25_index(conn)
+    for ids in _iter_id_chunks(conn, "SELECT id FROM onto_instances"):
+        refresh_instance_docs(conn, ids)
+
+
+def has_bm25_index(conn: sqlite3.Connection) -> bool:
+    return _table_exists(conn, "onto_bm25_docs")
+
+
+def _bm25_stats(conn: sqlite3.Connection) -> tuple[int, int]:
+    """(documents, total term count) kept in onto_meta next to the postings."""
+    stats = dict(
+        conn.execute("SELECT key, value FROM onto_meta WHERE key IN ('bm25_docs', 'bm25_length')").fetchall()
+    )
+    return int(stats.get("bm25_docs") or 0), int(stats.get("bm25_length") or 0)
+
+
+def _clear_bm25_index(conn: sqlite3.Connection) -> None:
+    if not has_bm25_index(conn):
+        return
+    conn.execute("DELETE FROM onto_bm25_postings")
+    conn.execute("DELETE FROM onto_bm25_terms")
+    conn.execute("DELETE FROM onto_bm25_docs")
+    conn.execute("DELETE FROM onto_meta WHERE key IN ('bm25_docs', 'bm25_length')")
+
+
+def refresh_bm25_index(
+    conn: sqlite3.Connection, instance_ids: list[str], rows: list[tuple[str, str, str, str]]
+) -> None:
+    """Replace the postings of `instance_ids` with those of `rows` (id, class, label, props).
+
+    Document frequencies and the corpus length stats are adjusted by the
+    difference, so an ingest only touches the changed documents.
+    """
+    if not instance_ids or not has_bm25_index(conn):
+        return
+    ids_json = json.dumps(instance_ids)
+    old_terms = conn.execute(BM25_DOC_TERMS_QUERY, (ids_json,)).fetchall()
+    old_docs, old_length = conn.execute(
+        "SELECT count(*), COALESCE(sum(length), 0) FROM onto_bm25_docs "
+        "WHERE instance_id IN (SELECT value FROM json_each(?))",
+        (ids_json,),
+    ).fetchone()
+    conn.executemany("UPDATE onto_bm25_terms SET df = df - ? WHERE term = ?", [(n, t) for t, n in old_terms])
+    conn.execute(
+        "DELETE FROM onto_bm25_terms WHERE df <= 0 AND term IN (SELECT value FROM json_each(?))",
+        (json.dumps([term for term, _ in old_terms]),),
+    )
+    conn.execute(
+        "DELETE FROM onto_bm25_postings WHERE instance_id IN (SELECT value FROM json_each(?))", (ids_json,)
+    )
+    conn.execute("DELETE FROM onto_bm25_docs WHERE instance_id IN (SELECT value FROM json_each(?))", (ids_json,))
+
+    postings: list[tuple[str, str, int]] = []
+    lengths: list[tuple[str, int]] = []
+    df: dict[str, int] = {}
+    for inst_id, cls, label, props in rows:
+        terms = bm25_terms(" ".join((inst_id, cls, label, props)))
+        lengths.append((inst_id, sum(terms.values())))
+        postings.extend((term, inst_id, tf) for term, tf in terms.items())
+        for term in terms:
+            df[term] = df.get(term, 0) + 1
+    conn.executemany("INSERT INTO onto_bm25_docs(instance_id, length) VALUES (?, ?)", lengths)
+    conn.executemany("INSERT INTO onto_bm25_postings(term, instance_id, tf) VALUES (?, ?, ?)", postings)
+    conn.executemany(
+        "INSERT INTO onto_bm25_terms(term, df) VALUES (?, ?) "
+        "ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+        list(df.items()),
+    )
+    docs, length = _bm25_stats(conn)
+    conn.executemany(
+        "INSERT OR REPLACE INTO onto_meta(key, value) VALUES (?, ?)",
+        [
+            ("bm25_docs", str(docs - old_docs + len(lengths))),
+            ("bm25_length", str(length - old_length + sum(n for _, n in lengths))),
+        ],
+    )
+
+
+def rebuild_bm25_index(conn: sqlite3.Connection) -> None:
+    if not has_bm25_index(conn) or not has_instance_docs(conn):
+        return
+    _clear_bm25_index(conn)
+    cursor = conn.execute("SELECT instance_id, class_name, label, props FROM onto_instance_docs")
+    while True:
+        rows = cursor.fetchmany(BULK_BATCH_SIZE)
+        if not rows:
+            return
+        refresh_bm25_index(conn, [row[0] for row in rows], rows)
+
+
+def has_isa_closure(conn: sqlite3.Connection) -> bool:
+    return _table_exists(conn, "onto_isa_closure")
+
+
+def rebuild_isa_closure(conn: sqlite3.Connection) -> int:
+    """Materialize the is_a ancestor/descendant closure (cycles tolerated); returns its row count."""
+    if not has_isa_closure(conn):
+        return 0
+    conn.execute("DELETE FROM onto_isa_closure")
+    parents: dict[str, set[str]] = {}
+    for child, parent in conn.execute(ISA_EDGES_QUERY):
+        if child != parent:
+            parents.setdefault(child, set()).add(parent)
+
+    total = 0
+    batch: list[tuple[str, str, int]] = []
+    for node in sorted(parents):
+        depth = {node: 0}
+        frontier = [node]
+        while frontier:
+            nxt: list[str] = []
+            for current in frontier:
+                for parent in parents.get(current, ()):
+                    if parent not in depth:
+                        depth[parent] = depth[current] + 1
+                        nxt.append(parent)
+            frontier = nxt
+        del depth[node]
+        batch.extend((ancestor, node, hops) for ancestor, hops in depth.items())
+        if len(batch) >= BULK_BATCH_SIZE:
+            conn.executemany(
+                "INSERT INTO onto_isa_closure(ancestor_id, descendant_id, depth) VALUES (?, ?, ?)", batch
+            )
+            total += len(batch)
+            batch.clear()
+    conn.executemany(
+        "INSERT INTO onto_isa_closure(ancestor_id, descendant_id, depth) VALUES (?, ?, ?)", batch
+    )
+    total += len(batch)
+    return total
+
+
+def isa_descendants(conn: sqlite3.Connection, ancestor_id: str, limit: int) -> list[str]:
+    if not has_isa_closure(conn):
+        return []
+    return [row[0] for row in conn.execute(ISA_DESCENDANTS_QUERY, (ancestor_id, limit))]
+
+
+def _load_linker_surfaces(conn: sqlite3.Connection) -> list[tuple[str, str, str]]:
+    if has_surface_index(conn):
+        return conn.execute(LINKER_SURFACES_QUERY).fetchall()
+    return conn.execute(
+        """
+        SELECT id, 'label', label FROM onto_instances WHERE label IS NOT NULL
+        UNION ALL
+        SELECT instance_id, 'alias', value FROM onto_properties
+        WHERE key = 'alias' AND value IS NOT NULL
+        """
+    ).fetchall()
+
+
+def link_entities(
+    conn: sqlite3.Connection, question: str, analysis: QueryAnalysis | None = None
+) -> list[EntityMention]:
+    """Link label/alias surface forms in the question to instance IDs."""
+    return list((analysis or analyze_query(conn, question)).mentions)
+
+
+def analyze_query(conn: sqlite3.Connection, question: str) -> QueryAnalysis:
+    """Terms and entity mentions of `question`, segmented with this database's labels/aliases.
+
+    Memoized per (database, ontology version); build it once per request and
+    pass it to the retrieval functions below.
+    """
+    key = ontology_cache_key(conn)
+    analyzer = get_query_analyzer(
+        key, lambda: get_entity_linker(key, lambda: _load_linker_surfaces(conn))
+    )
+    return analyzer.analyze(question)
+
+
+def _flatten_record(section: str, item: dict[str, Any]) -> dict[str, Any]:
+    """Insert-ready rows and content hash for one streamed ontology item."""
+    if section == "classes":
+        name, description = item.get("name"), item.get("description")
+        return {
+            "kind": "class",
+            "key": name,
+            "hash": _content_hash(description),
+            "classes": [(name, description)],
+        }
+    if section == "relations":
+        rel = (item.get("source"), item.get("type"), item.get("target"))
+        return {
+            "kind": "relation",
+            "key": _relation_key(*rel),
+            "hash": _content_hash(list(rel)),
+            "relations": [rel],
+        }
+
+    inst_id = item.get("id")
+    label = (item.get("label") or "").strip() or None
+    properties: list[tuple[str, str, str | None]] = []
+    surfaces: dict[str, list[str]] = {}
+    for prop in item.get("properties", []) or []:
+        value = prop.get("value")
+        properties.append((inst_id, prop.get("key"), str(value) if value is not None else None))
+        if prop.get("key") in SURFACE_PROPERTY_KEYS and value is not None:
+            surfaces.setdefault(prop["key"], []).append(str(value))
+    return {
+        "kind": "instance",
+        "key": inst_id,
+        "hash": _content_hash([item.get("class"), label, [[key, value] for _, key, value in properties]]),
+        "instances": [(inst_id, item.get("class"), label)],
+        "properties": properties,
+        # onto_properties keeps one value per key, so repeated aliases travel separately.
+        "extra_surfaces": [
+            (key, value) for key, values in surfaces.items() if len(values) > 1 for value in values
+        ],
+    }
+
+
+def _insert_ontology_rows(conn: sqlite3.Connection, rows: dict[str, Any]) -> None:
+    conn.executemany(
+        "INSERT OR REPLACE INTO onto_classes(name, description) VALUES (?, ?)", rows["classes"]
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO onto_instances(id, class_name, label) VALUES (?, ?, ?)",
+        rows["instances"],
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO onto_properties(instance_id, key, value) VALUES (?, ?, ?)",
+        rows["properties"],
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO onto_relations(source_id, type, target_id) VALUES (?, ?, ?)",
+        rows["relations"],
+    )
+
+
+def _ontology_source(yaml_path: str) -> str:
+    return str(Path(yaml_path).resolve())
+
+
+def _relation_key(source_id: str, rel_type: str, target_id: str) -> str:
+    return SEARCH_FIELD_SEP.join((source_id or "", rel_type or "", target_id or ""))
+
+
+def _content_hash(payload: Any) -> str:
+    blob = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def _owned_elsewhere(conn: sqlite3.Connection, source: str, kind: str, key: str) -> bool:
+    return conn.execute(OTHER_SOURCE_HASH_QUERY, (kind, key, source)).fetchone() is not None
+
+
+def _record_changes(
+    conn: sqlite3.Connection, version: int, changes: list[tuple[str, str, str]]
+) -> None:
+    conn.executemany(
+        "INSERT INTO onto_changes(version, kind, key, op) VALUES (?, ?, ?, ?)",
+        [(version, kind, key, op) for kind, key, op in changes],
+    )
+    conn.execute(
+        "DELETE FROM onto_changes WHERE version <= ?", (version - CHANGE_LOG_KEEP_VERSIONS,)
+    )
+
+
+def ontology_changes_since(
+    conn: sqlite3.Connection, version: int
+) -> list[tuple[int, str, str, str]] | None:
+    """Change log rows after `version`, or None when a full rebuild is required.
+
+    None means the log cannot explain every version in between: it was pruned,
+    a bulk reload/reset happened, or the version was bumped without a log entry.
+    """
+    current = get_ontology_version(conn)
+    if version >= current:
+        return []
+    if not _table_exists(conn, "onto_changes"):
+        return None
+    rows = conn.execute(
+        "SELECT version, kind, key, op FROM onto_changes WHERE version > ? ORDER BY version",
+        (version,),
+    ).fetchall()
+    if {row[0] for row in rows} != set(range(version + 1, current + 1)):
+        return None
+    if any(op in ("reload", "reset") for _, _, _, op in rows):
+        return None
+    return rows
+
+
+def ontology_sources(conn: sqlite3.Connection) -> list[str]:
+    """Sources (YAML paths or explicit names) with rows recorded in onto_hashes."""
+    return [row[0] for row in conn.execute("SELECT DISTINCT source FROM onto_hashes ORDER BY source")]
+
+
+def reset_ontology(conn: sqlite3.Connection) -> int:
+    """Delete all ontology rows plus derived tables and hashes; returns the new version."""
+    conn.execute("DELETE FROM onto_relations")
+    conn.execute("DELETE FROM onto_properties")
+    conn.execute("DELETE FROM onto_instances")
+    conn.execute("DELETE FROM onto_classes")
+    conn.execute("DELETE FROM onto_hashes")
+    conn.execute("DELETE FROM onto_instance_docs")
+    conn.execute("DELETE FROM onto_surface_grams")
+    conn.execute("DELETE FROM onto_surface_forms")
+    conn.execute("DELETE FROM onto_isa_closure")
+    conn.execute("DELETE FROM onto_community_members")
+    conn.execute("DELETE FROM onto_communities")
+    conn.execute("DELETE FROM onto_meta WHERE key IN ('community_version', 'community_build')")
+    _clear_bm25_index(conn)
+    if has_fts_index(conn):
+        conn.execute("DELETE FROM onto_fts")
+    version = bump_ontology_version(conn)
+    _record_changes(conn, version, [("ontology", "*", "reset")])
+    conn.commit()
+    return version
+
+
+def _delete_relations(conn: sqlite3.Connection, keys: Iterable[str]) -> None:
+    """Drop relation rows and every source's hash for them."""
+    keys = list(keys)
+    conn.executemany(
+        "DELETE FROM onto_relations WHERE source_id = ? AND type = ? AND target_id = ?",
+        [key.split(SEARCH_FIELD_SEP) for key in keys],
+    )
+    conn.executemany("DELETE FROM onto_hashes WHERE kind = 'relation' AND key = ?", [(key,) for key in keys])
+
+
+def ingest_ontology_yaml(
+    conn: sqlite3.Connection,
+    yaml_path: str,
+    *,
+    source: str | None = None,
+    batch_size: int = BULK_BATCH_SIZE,
+) -> dict[str, Any]:
+    """Apply only the difference between the YAML/JSONL file and what `source` loaded last time.
+
+    Records are streamed and compared by content hash (onto_hashes) one batch
+    at a time; the keys seen so far go to a temp table, so memory stays at one
+    batch however large the file is. Inserts, updates and deletes are applied
+    and logged in onto_changes under the new ontology version. Rows also
+    loaded by another source are not deleted. Returns per-kind
+    inserted/updated/deleted counts.
+    """
+    source = source or _ontology_source(yaml_path)
+    version = get_ontology_version(conn) + 1
+    counts = {kind: {"inserted": 0, "updated": 0, "deleted": 0} for kind in ("class", "instance", "relation")}
+    isa_key_part = f"{SEARCH_FIELD_SEP}is_a{SEARCH_FIELD_SEP}"
+    isa_changed = False
+    total = 0
+
+    for stmt in INGEST_SEEN_SCHEMA_SQL.split(";"):
+        if stmt.strip():
+            conn.execute(stmt)
+    conn.execute("DELETE FROM temp.ingest_seen")
+    conn.execute("DELETE FROM temp.ingest_gone")
+    # Batches may name rows from later batches (a relation before its target).
+    conn.execute("PRAGMA defer_foreign_keys = ON")
+
+    def log(changes: list[tuple[str, str, str]]) -> None:
+        conn.executemany(
+            "INSERT INTO onto_changes(version, kind, key, op) VALUES (?, ?, ?, ?)",
+            [(version, kind, key, op) for kind, key, op in changes],
+        )
+
+    batch: list[dict[str, Any]] = []
+
+    def flush() -> None:
+        nonlocal isa_changed
+        by_kind: dict[str, dict[str, dict[str, Any]]] = {}
+        for flat in batch:
+            by_kind.setdefault(flat["kind"], {})[flat["key"]] = flat
+        rows: dict[str, list[tuple[Any, ...]]] = {"classes": [], "instances": [], "properties": [], "relations": []}
+        hashes: list[tuple[str, str, str, str]] = []
+        changes: list[tuple[str, str, str]] = []
+        upserted: list[str] = []
+        updated: list[str] = []
+        surfaces: dict[str, list[tuple[str, str]]] = {}
+        for kind, flats in by_kind.items():
+            old = dict(conn.execute(HASHES_FOR_KEYS_QUERY, (source, kind, json.dumps(list(flats)))))
+            for key, flat in flats.items():
+                if key not in old:
+                    op = "inserted"
+                elif old[key] != flat["hash"]:
+                    op = "updated"
+                else:
+                    continue
+                counts[kind][op] += 1
+                changes.append((kind, key, op))
+                hashes.append((source, kind, key, flat["hash"]))
+                for table in rows:
+                    rows[table].extend(flat.get(table, []))
+                if kind == "instance":
+                    upserted.append(key)
+                    if op == "updated":
+                        updated.append(key)
+                    if flat.get("extra_surfaces"):
+                        surfaces[key] = flat["extra_surfaces"]
+                elif kind == "relation" and isa_key_part in key:
+                    isa_changed = True
+        conn.executemany(
+            "INSERT OR IGNORE INTO temp.ingest_seen(kind, key) VALUES (?, ?)",
+            [(kind, key) for kind, flats in by_kind.items() for key in flats],
+        )
+        # Updated instances get their property set replaced, not merged.
+        conn.executemany("DELETE FROM onto_properties WHERE instance_id = ?", [(inst_id,) for inst_id in updated])
+        _insert_ontology_rows(conn, rows)
+        conn.executemany(
+            "INSERT OR REPLACE INTO onto_hashes(source, kind, key, hash) VALUES (?, ?, ?, ?)", hashes
+        )
+        log(changes)
+        refresh_instance_docs(conn, upserted)
+        refresh_fts_index(conn, upserted)
+        refresh_surface_index(conn, upserted, surfaces)
+        batch.clear()
+
+    pending = 0
+    for section, item in iter_ontology_records(yaml_path):
+        flat = _flatten_record(section, item)
+        batch.append(flat)
+        total += 1
+        pending += 1 + len(flat.get("properties", []))
+        if pending >= batch_size:
+            flush()
+            pending = 0
+    flush()
+
+    conn.execute(INGEST_GONE_SQL, (source,))
+    for keys in _iter_id_chunks(conn, "SELECT key FROM temp.ingest_gone WHERE kind = 'relation'", batch_size):
+        gone = [key for key in keys if not _owned_elsewhere(conn, source, "relation", key)]
+        _delete_relations(conn, gone)
+        counts["relation"]["deleted"] += len(gone)
+        isa_changed = isa_changed or any(isa_key_part in key for key in gone)
+        log([("relation", key, "deleted") for key in gone])
+
+    for ids in _iter_id_chunks(conn, "SELECT key FROM temp.ingest_gone WHERE kind = 'instance'", batch_size):
+        gone = [inst_id for inst_id in ids if not _owned_elsewhere(conn, source, "instance", inst_id)]
+        # Relations hanging off deleted instances go too, whoever loaded them.
+        touching = sorted(
+            {
+                _relation_key(*rel)
+                for inst_id in gone
+                for rel in conn.execute(RELATIONS_TOUCHING_QUERY, (inst_id, inst_id))
+            }
+        )
+        _delete_relations(conn, touching)
+        conn.executemany("DELETE FROM onto_properties WHERE instance_id = ?", [(inst_id,) for inst_id in gone])
+        conn.executemany("DELETE FROM onto_instances WHERE id = ?", [(inst_id,) for inst_id in gone])
+        refresh_instance_docs(conn, gone)
+        refresh_fts_index(conn, gone)
+        refresh_surface_index(conn, gone, {})
+        counts["instance"]["deleted"] += len(gone)
+        counts["relation"]["deleted"] += len(touching)
+        isa_changed = isa_changed or any(isa_key_part in key for key in touching)
+        log([("instance", inst_id, "deleted") for inst_id in gone])
+        log([("relation", key, "deleted") for key in touching])
+
+    for names in _iter_id_chunks(conn, "SELECT key FROM temp.ingest_gone WHERE kind = 'class'", batch_size):
+        gone = [
+            name
+            for name in names
+            if not _owned_elsewhere(conn, source, "class", name)
+            and conn.execute(
+                "SELECT 1 FROM onto_instances WHERE class_name = ? LIMIT 1", (name,)
+            ).fetchone() is None
+        ]
+        conn.executemany("DELETE FROM onto_classes WHERE name = ?", [(name,) for name in gone])
+        counts["class"]["deleted"] += len(gone)
+        log([("class", name, "deleted") for name in gone])
+
+    conn.execute(
+        """
+        DELETE FROM onto_hashes
+        WHERE source = ?
+          AND EXISTS (
+            SELECT 1 FROM temp.ingest_gone g WHERE g.kind = onto_hashes.kind AND g.key = onto_hashes.key
+          )
+        """,
+        (source,),
+    )
+    conn.execute("DELETE FROM temp.ingest_seen")
+    conn.execute("DELETE FROM temp.ingest_gone")
+    if isa_changed:
+        rebuild_isa_closure(conn)
+
+    changed = any(n for ops in counts.values() for n in ops.values())
+    if changed:
+        version = bump_ontology_version(conn)
+        _record_changes(conn, version, [])
+    else:
+        version = get_ontology_version(conn)
+    conn.commit()
+    if changed:
+        analyze_ontology(conn)
+
+    return {
+        "source": source,
+        "version": version,
+        "changed": changed,
+        "classes": counts["class"],
+        "instances": counts["instance"],
+        "relations": {op: n for op, n in counts["relation"].items() if op != "updated"},
+        "unchanged": total - sum(ops["inserted"] + ops["updated"] for ops in counts.values()),
+    }
+
+
+def _index_statements() -> list[tuple[str, str]]:
+    """(index name, CREATE statement) pairs from INDEX_SCHEMA_SQL."""
+    statements = [stmt.strip() for stmt in INDEX_SCHEMA_SQL.split(";") if stmt.strip()]
+    return [(re.search(r"EXISTS\s+(\w+)", stmt).group(1), stmt) for stmt in statements]
+
+
+def bulk_ingest_ontology_yaml(
+    conn: sqlite3.Connection, yaml_path: str, *, batch_size: int = BULK_BATCH_SIZE
+) -> dict[str, Any]:
+    """Stream a (large) YAML/JSONL ontology into SQLite in one transaction and report throughput.
+
+    Records are read one at a time and written in executemany batches, so
+    memory stays bounded regardless of file size. Foreign keys are validated
+    once with `PRAGMA foreign_key_check` instead of per row, secondary indexes
+    are rebuilt after the data is in, and the load runs with WAL +
+    synchronous=OFF; the caller's journal mode and pragmas are restored
+    afterwards. A foreign-key violation rolls everything back.
+    """
+    started = time.perf_counter()
+    source = _ontology_source(yaml_path)
+    counts = {"classes": 0, "instances": 0, "properties": 0, "relations": 0}
+
+    conn.commit()
+    fk_enabled = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        conn.execute("BEGIN")
+        was_empty = conn.execute("SELECT 1 FROM onto_instances LIMIT 1").fetchone() is None
+        for name, _ in _index_statements():
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS bulk_touched(id TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.bulk_touched")
+        conn.execute("DELETE FROM onto_hashes WHERE source = ?", (source,))
+
+        batch: dict[str, list[tuple[Any, ...]]] = {key: [] for key in counts}
+        hashes: list[tuple[str, str, str, str]] = []
+        surfaces: dict[str, list[tuple[str, str]]] = {}
+
+        def flush() -> None:
+            _insert_ontology_rows(conn, batch)
+            ids = [row[0] for row in batch["instances"]]
+            conn.executemany("INSERT OR IGNORE INTO temp.bulk_touched(id) VALUES (?)", [(i,) for i in ids])
+            conn.executemany(
+                "INSERT OR REPLACE INTO onto_hashes(source, kind, key, hash) VALUES (?, ?, ?, ?)",
+                hashes,
+            )
+            # Surfaces are indexed with their batch: repeated aliases exist only in the record.
+            refresh_surface_index(conn, ids, surfaces)
+            for rows in batch.values():
+                rows.clear()
+            hashes.clear()
+            surfaces.clear()
+
+        pending = 0
+        for section, item in iter_ontology_records(yaml_path):
+            flat = _flatten_record(section, item)
+            for table in counts:
+                rows = flat.get(table, [])
+                batch[table].extend(rows)
+                counts[table] += len(rows)
+                pending += len(rows)
+            hashes.append((source, flat["kind"], flat["key"], flat["hash"]))
+            if flat.get("extra_surfaces"):
+                surfaces[flat["key"]] = flat["extra_surfaces"]
+            if pending >= batch_size:
+                flush()
+                pending = 0
+        flush()
+        loaded = time.perf_counter()
+
+        violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+        if violations:
+            table, rowid, parent, _ = violations[0]
+            raise ValueError(
+                f"Foreign key check failed for {yaml_path}: {len(violations)} violation(s), "
+                f"first {table} rowid={rowid} -> {parent}"
+            )
+
+        for _, stmt in _index_statements():
+            conn.execute(stmt)
+
+        if was_empty:
+            rebuild_instance_docs(conn)
+            rebuild_fts_index(conn)
+        else:
+            for ids in _iter_id_chunks(conn, "SELECT id FROM temp.bulk_touched", batch_size):
+                refresh_instance_docs(conn, ids)
+                refresh_fts_index(conn, ids)
+        rebuild_isa_closure(conn)
+        conn.execute("DELETE FROM temp.bulk_touched")
+        version = bump_ontology_version(conn)
+        _record_changes(conn, version, [("ontology", source, "reload")])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute(f"PRAGMA synchronous = {int(synchronous)}")
+        conn.execute(f"PRAGMA foreign_keys = {'ON' if fk_enabled else 'OFF'}")
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    analyze_ontology(conn)
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    return {
+        **counts,
+        "rows": total,
+        "load_sec": round(loaded - started, 3),
+        "elapsed_sec": round(elapsed, 3),
+        "rows_per_sec": round(total / elapsed, 1) if elapsed > 0 else float(total),
+    }
+
+
+def ontology_file_digest(yaml_path: str) -> str:
+    """sha256 of the ontology file plus the schema it compiles into."""
+    digest = hashlib.sha256()
+    for sql in (INIT_SCHEMA_SQL, INDEX_SCHEMA_SQL, FTS_SCHEMA_SQL):
+        digest.update(sql.encode("utf-8"))
+    with open(yaml_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compile_ontology_db(yaml_path: str, cache_dir: str | Path) -> str:
+    """Compile `yaml_path` once into `<cache_dir>/<stem>-<digest>.db` and return its path.
+
+    The file is built under a temporary name and renamed into place, so
+    concurrent callers never see a half-built database. Older builds are
+    left alone (a running process may still read them); see
+    prune_compiled_ontology_dbs.
+    """
+    stem = Path(yaml_path).stem
+    target = Path(cache_dir) / f"{stem}-{ontology_file_digest(yaml_path)[:16]}.db"
+    if target.exists():
+        return str(target)
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f"{target.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    conn = get_db(str(tmp))
+    try:
+        init_schema(conn)
+        bulk_ingest_ontology_yaml(conn, yaml_path)
+        rebuild_communities(conn)
+        if embedding_enabled():
+            rebuild_embedding_index(conn, index_dir(tmp))
+        conn.close()
+        if index_dir(tmp).exists():
+            shutil.rmtree(index_dir(target), ignore_errors=True)
+            os.replace(index_dir(tmp), index_dir(target))
+        os.replace(tmp, target)
+    except Exception:
+        conn.close()
+        for path in (tmp, Path(f"{tmp}-wal"), Path(f"{tmp}-shm")):
+            path.unlink(missing_ok=True)
+        shutil.rmtree(index_dir(tmp), ignore_errors=True)
+        raise
+    return str(target)
+
+
+def prune_compiled_ontology_dbs(
+    cache_dir: str | Path, *, grace_hours: float = COMPILED_DB_GRACE_HOURS_DEFAULT, dry_run: bool = False
+) -> list[str]:
+    """Remove superseded `<stem>-<digest>.db` builds and their sidecars; return the removed paths.
+
+    Per stem the newest build is always kept; older ones go only once their
+    file is more than `grace_hours` old, so a reader pinned to the previous
+    digest is not pulled out from under it.
+    """
+    builds: dict[str, list[Path]] = {}
+    for path in Path(cache_dir).glob("*.db"):
+        match = re.fullmatch(r"(.+)-[0-9a-f]{16}\.db", path.name)
+        if match:
+            builds.setdefault(match.group(1), []).append(path)
+    cutoff = time.time() - grace_hours * 3600
+    removed: list[str] = []
+    for paths in builds.values():
+        paths.sort(key=lambda path: path.stat().st_mtime, reverse=True)
+        for stale in paths[1:]:
+            if stale.stat().st_mtime > cutoff:
+                continue
+            removed.append(str(stale))
+            if dry_run:
+                continue
+            for path in (stale, Path(f"{stale}-wal"), Path(f"{stale}-shm")):
+                path.unlink(missing_ok=True)
+            shutil.rmtree(index_dir(stale), ignore_errors=True)
+    return sorted(removed)
+
+
+def has_communities(conn: sqlite3.Connection) -> bool:
+    return _table_exists(conn, "onto_communities")
+
+
+def _community_version(conn: sqlite3.Connection) -> int | None:
+    row = conn.execute("SELECT value FROM onto_meta WHERE key = 'community_version'").fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+def _stamp_communities(conn: sqlite3.Connection) -> None:
+    """Record the ontology version a build covers, plus a build stamp that
+    changes on every (re)build even at the same version (result cache key)."""
+    conn.executemany(
+        "INSERT OR REPLACE INTO onto_meta(key, value) VALUES (?, ?)",
+        [("community_version", str(get_ontology_version(conn))), ("community_build", str(time.time_ns()))],
+    )
+
+
+def _write_communities(
+    conn: sqlite3.Connection, communities: list[list[str]], start_id: int
+) -> None:
+    for community_id, members in enumerate(communities, start=start_id):
+        ids_json = json.dumps(members)
+        labels: dict[str, str] = {}
+        classes: dict[str, str] = {}
+        facts: dict[str, str] = {}
+        for inst_id, cls, label, _, _, fact_line in conn.execute(
+            INSTANCE_DOCS_TEMPLATE.format(docs=instance_docs_source(conn)), (ids_json,)
+        ):
+            labels[inst_id], classes[inst_id], facts[inst_id] = label, cls, fact_line
+        edges = conn.execute(COMMUNITY_EDGES_QUERY, (ids_json,)).fetchall()
+        digest = summarize_community(members, labels=labels, classes=classes, facts=facts, edges=edges)
+        conn.execute(
+            "INSERT INTO onto_communities(community_id, size, title, summary) VALUES (?, ?, ?, ?)",
+            (community_id, len(members), digest.title, digest.summary),
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO onto_community_members(instance_id, community_id) VALUES (?, ?)",
+            [(inst_id, community_id) for inst_id in members],
+        )
+
+
+def rebuild_communities(
+    conn: sqlite3.Connection, *, resolution: float = COMMUNITY_RESOLUTION_DEFAULT
+) -> dict[str, Any]:
+    """Partition the whole relation graph (Louvain) and store members + extractive summaries."""
+    started = time.perf_counter()
+    communities = detect_communities(
+        conn.execute("SELECT source_id, target_id FROM onto_relations"), resolution=resolution
+    )
+    conn.execute("DELETE FROM onto_community_members")
+    conn.execute("DELETE FROM onto_communities")
+    _write_communities(conn, communities, 1)
+    _stamp_communities(conn)
+    conn.commit()
+    return {
+        "mode": "full",
+        "communities": len(communities),
+        "members": sum(len(members) for members in communities),
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+    }
+
+
+def refresh_communities(
+    conn: sqlite3.Connection, *, resolution: float = COMMUNITY_RESOLUTION_DEFAULT
+) -> dict[str, Any]:
+    """Recompute only the communities an ingest touched since the last build.
+
+    Touched = instances changed since then plus both endpoints of every
+    added/removed relation, so each changed edge lies inside the re-partitioned
+    set. Their communities are dissolved and re-partitioned together; the rest
+    keep their ids and summaries. Falls back to rebuild_communities when the
+    change log cannot explain the gap.
+    """
+    started = time.perf_counter()
+    last = _community_version(conn)
+    changes = None if last is None else ontology_changes_since(conn, last)
+    if changes is None:
+        return rebuild_communities(conn, resolution=resolution)
+    if not changes:
+        return {"mode": "unchanged", "communities": 0, "members": 0, "elapsed_sec": 0.0}
+
+    touched: set[str] = set()
+    for _, kind, key, _ in changes:
+        if kind == "instance":
+            touched.add(key)
+        elif kind == "relation":
+            source_id, _, target_id = key.split(SEARCH_FIELD_SEP)
+            touched.update((source_id, target_id))
+    affected = [
+        row[0] for row in conn.execute(COMMUNITY_IDS_QUERY, (json.dumps(sorted(touched)),))
+    ]
+    affected_json = json.dumps(affected)
+    nodes = touched | {row[0] for row in conn.execute(COMMUNITY_MEMBERS_QUERY, (affected_json,))}
+
+    edges = conn.execute(COMMUNITY_EDGES_QUERY, (json.dumps(sorted(nodes)),)).fetchall()
+    communities = detect_communities(((s, d) for s, _, d in edges), resolution=resolution)
+    conn.execute(
+        "DELETE FROM onto_community_members WHERE community_id IN (SELECT value FROM json_each(?))",
+        (affected_json,),
+    )
+    conn.execute(
+        "DELETE FROM onto_communities WHERE community_id IN (SELECT value FROM json_each(?))",
+        (affected_json,),
+    )
+    start = (conn.execute("SELECT max(community_id) FROM onto_communities").fetchone()[0] or 0) + 1
+    _write_communities(conn, communities, start)
+    _stamp_communities(conn)
     conn.commit()
+    return {
+        "mode": "incremental",
+        "dissolved": len(affected),
+        "communities": len(communities),
+        "members": sum(len(members) for members in communities),
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+    }
 
 
-def ingest_ontology_yaml(conn: sqlite3.Connection, yaml_path: str) -> None:
-    with open(yaml_path, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f) or {}
-
-    for elem in data.get("classes", []):
-        conn.execute(
-            "INSERT OR REPLACE INTO onto_classes(name, description) VALUES (?, ?)",
-            (elem.get("name"), elem.get("description")),
-        )
-
-    for inst in data.get("instances", []):
-        inst_id = inst.get("id")
-        class_name = inst.get("class")
-        label = (inst.get("label") or "").strip() or None
-        conn.execute(
-            "INSERT OR REPLACE INTO onto_instances(id, class_name, label) VALUES (?, ?, ?)",
-            (inst_id, class_name, label),
-        )
-        for prop in inst.get("properties", []):
-            conn.execute(
-                "INSERT OR REPLACE INTO onto_properties(instance_id, key, value) VALUES (?, ?, ?)",
-                (inst_id, prop.get("key"), str(prop.get("value")) if prop.get("value") is not None else None),
-            )
+def community_summaries(
+    conn: sqlite3.Connection, seed_ids: list[str], limit: int = 2
+) -> list[dict[str, Any]]:
+    """Stored summaries of the seeds' communities (primary-key lookups), or the
+    largest communities when no seed is in one (global questions)."""
+    if not has_communities(conn):
+        return []
+    rows = []
+    if seed_ids:
+        rows = conn.execute(COMMUNITY_SUMMARIES_QUERY, (json.dumps(seed_ids), limit)).fetchall()
+    if not rows:
+        rows = conn.execute(TOP_COMMUNITIES_QUERY, (limit,)).fetchall()
+    return [
+        {"community_id": cid, "size": size, "title": title, "summary": summary, "seed_hits": hits}
+        for cid, size, title, summary, hits in rows
+    ]
 
-    for rel in data.get("relations", []):
-        conn.execute(
-            "INSERT OR REPLACE INTO onto_relations(source_id, type, target_id) VALUES (?, ?, ?)",
-            (rel.get("source"), rel.get("type"), rel.get("target")),
-        )
 
-    conn.commit()
+def format_community_summaries(summaries: list[dict[str, Any]]) -> str:
+    blocks = []
+    for item in summaries:
+        body = "\n".join(f"  {line}" for line in item["summary"].splitlines())
+        blocks.append(f"- [community {item['community_id']}] {item['title']}\n{body}")
+    return "\n".join(blocks)
 
 
 def extract_query_terms(question: str) -> list[str]:
-    terms = [question.strip().lower()]
-    terms.extend(
-        token.lower()
-        for token in re.findall(r"[0-9A-Za-z가-힣]+", question)
-        if len(token) >= 2
-    )
-    deduped = list(dict.fromkeys(t for t in terms if t))
-    return deduped or [""]
+    """Particle-stripped tokens without a database dictionary (see analyze_query)."""
+    return analyze_question(question).lookup_terms
 
 
 def _build_lookup_where_clause(terms: list[str]) -> tuple[str, list[object]]:
@@ -137,25 +1752,144 @@ def _build_lookup_where_clause(terms: list[str]) -> tuple[str, list[object]]:
     return where_clause, params
 
 
-def lookup_ontology_debug(
-    conn: sqlite3.Connection, question: str, limit: int = 5
-) -> dict[str, Any]:
-    terms = extract_query_terms(question)
-    where_clause, params = _build_lookup_where_clause(terms)
-    params.append(limit)
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _fts_match_expression(terms: list[str]) -> str:
+    # Prefix phrases keep "바나나" matching the "바나나우유" label token.
+    return " OR ".join(f"{_fts_phrase(t)}*" for t in terms if t)
+
 
+def _fetch_instance_rows(
+    conn: sqlite3.Connection, instance_ids: list[str]
+) -> list[tuple[str, str, str, str, str, str]]:
+    if not instance_ids:
+        return []
     rows = conn.execute(
-        LOOKUP_QUERY_TEMPLATE.format(where_clause=where_clause),
-        params,
+        INSTANCE_DOCS_TEMPLATE.format(docs=instance_docs_source(conn)),
+        (json.dumps(instance_ids),),
     ).fetchall()
+    order = {inst_id: idx for idx, inst_id in enumerate(instance_ids)}
+    return sorted(rows, key=lambda row: order[row[0]])
+
+
+def _fetch_lookup_rows(
+    conn: sqlite3.Connection,
+    terms: list[str],
+    limit: int,
+    surface_hits: dict[str, dict[str, set[str]]] | None = None,
+) -> list[tuple[str, str, str, str, str, str]]:
+    """Surface (substring) hits first, then FTS hits ranked by bm25, then LIKE matches.
+
+    FTS5 only matches whole tokens or token prefixes, so a term found only
+    inside a property value ("우유" in "바나나우유맛") still needs the LIKE
+    scan; it runs only while free slots remain.
+    """
+    rows = _fetch_instance_rows(conn, _rank_surface_hits(surface_hits or {})[:limit])
+    if len(rows) >= limit:
+        return rows
+
+    match_expr = _fts_match_expression(terms)
+    if match_expr and has_fts_index(conn) and has_instance_docs(conn):
+        seen = {row[0] for row in rows}
+        fts_rows = conn.execute(FTS_LOOKUP_QUERY, (match_expr, limit + len(seen))).fetchall()
+        rows.extend(row for row in fts_rows if row[0] not in seen)
+        if len(rows) >= limit:
+            return rows[:limit]
+
+    seen = {row[0] for row in rows}
+    where_clause, params = _build_lookup_where_clause(terms)
+    params.append(limit + len(seen))
+    rows.extend(
+        _doc_row(*row)
+        for row in conn.execute(
+            LOOKUP_QUERY_TEMPLATE.format(where_clause=where_clause),
+            params,
+        )
+        if row[0] not in seen
+    )
+    return rows[:limit]
+
 
+def _expand_isa(
+    conn: sqlite3.Connection,
+    rows: list[tuple[str, str, str, str, str, str]],
+    limit: int,
+) -> tuple[list[tuple[str, str, str, str, str, str]], dict[str, list[str]]]:
+    """Fill free slots with is_a descendants of matched rows (e.g. "우유" -> every Milk).
+
+    Returns the rows plus, per row, the matched rows it inherits from.
+    """
+    if not rows or not has_isa_closure(conn):
+        return rows, {}
+    matched = [row[0] for row in rows]
+    seen = set(matched)
+    extra: list[str] = []
+    for inst_id in matched:
+        free = limit - len(rows) - len(extra)
+        if free <= 0:
+            break
+        for desc in isa_descendants(conn, inst_id, free + len(seen)):
+            if desc not in seen:
+                seen.add(desc)
+                extra.append(desc)
+                if len(extra) >= limit - len(rows):
+                    break
+    rows = rows + _fetch_instance_rows(conn, extra)
+
+    inherited: dict[str, list[str]] = {}
+    for desc, ancestor in conn.execute(
+        ISA_ANCESTOR_HITS_QUERY, (json.dumps([row[0] for row in rows]), json.dumps(matched))
+    ):
+        inherited.setdefault(desc, []).append(ancestor)
+    return rows, inherited
+
+
+@dataclass(frozen=True)
+class RetrievalResult:
+    """One lexical retrieval pass; context text, debug payload and price hint derive from it."""
+
+    question: str
+    terms: list[str]
+    rows: list[tuple[str, str, str, str, str, str]]
+    candidates: list[dict[str, Any]]
+    prioritized_terms: list[str]
+    relations: list[tuple[str, str, str]]
+    price_fact: str | None = None
+    analysis: QueryAnalysis | None = None
+
+    @property
+    def seed_ids(self) -> list[str]:
+        return [item["id"] for item in self.candidates[:5] if item.get("id")]
+
+    def context(self) -> str:
+        if not self.rows:
+            return "No matching ontology facts found."
+        lines = [row[5] for row in self.rows]
+        if self.relations:
+            lines.append("relations:")
+            lines.extend([f"- {s} -[{t}]-> {d}" for s, t, d in self.relations])
+        return "\n".join(lines)
+
+    def debug(self) -> dict[str, Any]:
+        return {
+            "query_terms": [t for t in self.terms if t],
+            "prioritized_terms": self.prioritized_terms,
+            "candidates": self.candidates,
+        }
+
+
+def _score_candidates(
+    terms: list[str],
+    rows: list[tuple[str, str, str, str, str, str]],
+    surface_hits: dict[str, dict[str, set[str]]],
+    inherited: dict[str, list[str]] | None = None,
+) -> tuple[list[dict[str, Any]], list[str]]:
     candidates: list[dict[str, Any]] = []
     keyword_scores: dict[str, int] = {t: 0 for t in terms}
-    for inst_id, cls, label, props in rows:
-        inst_id_l = (inst_id or "").lower()
-        cls_l = (cls or "").lower()
-        label_l = (label or "").lower()
-        props_l = (props or "").lower()
+    for inst_id, cls, label, _, search_text, _ in rows:
+        inst_id_l, cls_l, label_l, props_l = _split_search_text(search_text)
 
         matched_terms: list[str] = []
         matched_fields: set[str] = set()
@@ -182,6 +1916,14 @@ def lookup_ontology_debug(
                 if in_props:
                     matched_fields.add("properties")
                     score += 2
+        # Substring hits the raw text misses, e.g. "빠나우유" vs alias "빠나 우유".
+        for t, fields in surface_hits.get(inst_id, {}).items():
+            if t in matched_terms:
+                continue
+            matched_terms.append(t)
+            keyword_scores[t] += 1
+            matched_fields.update(f"surface:{field}" for field in fields)
+            score += 4 if "label" in fields else 2
         if "alias=" in props_l:
             score += 1
         if "price_krw=" in props_l:
@@ -198,6 +1940,18 @@ def lookup_ontology_debug(
             }
         )
 
+    # Members of a matched class inherit its terms, e.g. MILK001 for "우유" via MILK_CLASS.
+    by_id = {item["id"]: item for item in candidates}
+    for inst_id, ancestors in (inherited or {}).items():
+        item = by_id[inst_id]
+        for ancestor in ancestors:
+            item["matched_terms"].extend(
+                t for t in by_id[ancestor]["matched_terms"] if t not in item["matched_terms"]
+            )
+        item["matched_fields"] = sorted({*item["matched_fields"], "is_a"})
+        item["is_a"] = ancestors
+        item["score"] += 2
+
     prioritized_terms = [
         term
         for term, _ in sorted(
@@ -207,40 +1961,59 @@ def lookup_ontology_debug(
         if term
     ]
     candidates.sort(key=lambda item: (-item["score"], item["id"]))
-    return {
-        "query_terms": [t for t in terms if t],
-        "prioritized_terms": prioritized_terms,
-        "candidates": candidates,
-    }
+    return candidates, prioritized_terms
 
 
-def lookup_ontology_context(conn: sqlite3.Connection, question: str, limit: int = 5) -> str:
-    terms = extract_query_terms(question)
-    where_clause, params = _build_lookup_where_clause(terms)
-    params.append(limit)
+def retrieve_ontology(
+    conn: sqlite3.Connection,
+    question: str,
+    limit: int = 5,
+    *,
+    with_price: bool | None = None,
+    analysis: QueryAnalysis | None = None,
+) -> RetrievalResult:
+    """Terms, scored candidates, relations and (for price questions) the price fact in one pass.
 
-    rows = conn.execute(
-        LOOKUP_QUERY_TEMPLATE.format(where_clause=where_clause),
-        params,
-    ).fetchall()
+    with_price=None resolves the price fact only when is_price_question(question).
+    """
+    analysis = analysis or analyze_query(conn, question)
+    terms = analysis.lookup_terms
+    surface_hits = lookup_surface_matches(conn, terms)
+    rows = _fetch_lookup_rows(conn, terms, limit, surface_hits)
+    rows, inherited = _expand_isa(conn, rows, limit)
+    candidates, prioritized_terms = _score_candidates(terms, rows, surface_hits, inherited)
+
+    ids = [row[0] for row in rows]
+    relations: list[tuple[str, str, str]] = []
+    if ids:
+        relations = conn.execute(RELATIONS_BY_IDS_JSON_QUERY, (json.dumps(ids),)).fetchall()
+
+    if with_price is None:
+        with_price = is_price_question(question)
+    price_fact = None
+    if with_price and terms:
+        price_fact = _priority_price_fact(conn, terms, _rank_surface_hits(surface_hits) + ids)
+
+    return RetrievalResult(
+        question=question,
+        terms=terms,
+        rows=rows,
+        candidates=candidates,
+        prioritized_terms=prioritized_terms,
+        relations=relations,
+        price_fact=price_fact,
+        analysis=analysis,
+    )
 
-    if not rows:
-        return "No matching ontology facts found."
 
-    lines: list[str] = []
-    for inst_id, cls, label, props in rows:
-        lines.append(f"- {inst_id} ({cls}) label='{label}' props=[{props}]")
+def lookup_ontology_debug(
+    conn: sqlite3.Connection, question: str, limit: int = 5
+) -> dict[str, Any]:
+    return retrieve_ontology(conn, question, limit, with_price=False).debug()
 
-    qmarks = ",".join("?" for _ in rows)
-    rels = conn.execute(
-        RELATIONS_BY_IDS_TEMPLATE.format(qmarks=qmarks),
-        [r[0] for r in rows],
-    ).fetchall()
-    if rels:
-        lines.append("relations:")
-        lines.extend([f"- {s} -[{t}]-> {d}" for s, t, d in rels])
 
-    return "\n".join(lines)
+def lookup_ontology_context(conn: sqlite3.Connection, question: str, limit: int = 5) -> str:
+    return retrieve_ontology(conn, question, limit, with_price=False).context()
 
 
 def is_price_question(question: str) -> bool:
@@ -249,10 +2022,34 @@ def is_price_question(question: str) -> bool:
     return any(k in q for k in keywords)
 
 
-def extract_priority_price_fact(conn: sqlite3.Connection, question: str) -> str | None:
-    terms = extract_query_terms(question)
+def extract_priority_price_fact(
+    conn: sqlite3.Connection, question: str, analysis: QueryAnalysis | None = None
+) -> str | None:
+    terms = (analysis or analyze_query(conn, question)).lookup_terms
     if not terms:
         return None
+    return _priority_price_fact(conn, terms, _rank_surface_hits(lookup_surface_matches(conn, terms)))
+
+
+def _priority_price_fact(
+    conn: sqlite3.Connection, terms: list[str], ranked_ids: list[str]
+) -> str | None:
+    """First priced instance among already-ranked ids, else the best FTS/LIKE match."""
+    ranked_ids = list(dict.fromkeys(ranked_ids))
+    if ranked_ids:
+        prices = {
+            row[0]: row
+            for row in conn.execute(PRICE_BY_IDS_QUERY, (json.dumps(ranked_ids),))
+        }
+        for inst_id in ranked_ids:
+            if inst_id in prices:
+                return _format_price_fact(prices[inst_id])
+
+    match_expr = _fts_match_expression(terms)
+    if match_expr and has_fts_index(conn):
+        row = conn.execute(FTS_PRICE_FACT_QUERY, (match_expr,)).fetchone()
+        if row is not None:
+            return _format_price_fact(row)
 
     where_parts: list[str] = []
     params: list[str] = []
@@ -277,7 +2074,10 @@ def extract_priority_price_fact(conn: sqlite3.Connection, question: str) -> str
         ),
         params,
     ).fetchone()
+    return _format_price_fact(row)
+
 
+def _format_price_fact(row: tuple[str, str, str | None] | None) -> str | None:
     if not row:
         return None
     inst_id, label, price = row
@@ -286,24 +2086,24 @@ def extract_priority_price_fact(conn: sqlite3.Connection, question: str) -> str
     return f"{label or inst_id}의 가격은 {price}원입니다. (source: price_krw={price})"
 
 
-def constraint_facts(conn: sqlite3.Connection, limit: int) -> list[str]:
-    rows = conn.execute(
-        """
-        SELECT i.id, COALESCE(i.label, ''), COALESCE(group_concat(p.key || '=' || p.value, '; '), '')
-        FROM onto_instances i
-        LEFT JOIN onto_properties p ON p.instance_id = i.id
-        WHERE lower(i.class_name) IN ('constraint', 'rule', 'policy', 'guardrail')
-           OR EXISTS (
-                SELECT 1
-                FROM onto_properties p2
-                WHERE p2.instance_id = i.id
-                  AND lower(p2.key) IN ('constraint', 'rule', 'template', 'policy', 'guardrail')
-           )
-        GROUP BY i.id, i.label
-        LIMIT ?
-        """,
-        (limit,),
-    ).fetchall()
+def constraint_facts(
+    conn: sqlite3.Connection, limit: int, seed_ids: list[str] | None = None
+) -> list[str]:
+    """Constraint/rule facts; with seeds, only those applicable to them (or global ones).
+
+    Applicability follows the is_a closure, so a rule on MILK_CLASS covers a
+    question about MILK001 and a rule on MILK001 covers a question about 우유.
+    """
+    docs = instance_docs_source(conn)
+    if not seed_ids or not has_isa_closure(conn):
+        rows = conn.execute(CONSTRAINT_FACTS_TEMPLATE.format(docs=docs), (limit,)).fetchall()
+    else:
+        rows = [
+            row[:3]
+            for row in conn.execute(
+                CONSTRAINT_APPLICABILITY_TEMPLATE.format(docs=docs), (json.dumps(seed_ids), limit)
+            )
+        ]
     return [f"- {inst_id} label='{label}' props=[{props}]" for inst_id, label, props in rows]
 
 
@@ -314,119 +2114,296 @@ def relation_evidence(
 ) -> list[str]:
     if not seed_ids:
         return []
-    qmarks = ",".join("?" for _ in seed_ids)
-    params: list[Any] = [*seed_ids, *seed_ids, limit]
-    rows = conn.execute(
-        f"""
-        SELECT source_id, type, target_id
-        FROM onto_relations
-        WHERE source_id IN ({qmarks}) OR target_id IN ({qmarks})
-        ORDER BY source_id, type, target_id
-        LIMIT ?
-        """,
-        params,
-    ).fetchall()
+    if graph_backend() == "sqlite":
+        rows = conn.execute(RELATION_EVIDENCE_QUERY, (json.dumps(seed_ids), limit)).fetchall()
+    else:
+        rows = relation_graph(conn).edges_touching(seed_ids, limit)
     return [f"- {source} -[{rel}]-> {target}" for source, rel, target in rows]
 
 
-def multihop_paths(
+def graph_top_k() -> int:
+    try:
+        return max(1, int(os.getenv("GRAPH_TOP_K", "")))
+    except ValueError:
+        return GRAPH_TOP_K_DEFAULT
+
+
+def candidate_seed_weights(candidates: list[dict[str, Any]], limit: int) -> dict[str, float]:
+    """Restart weights for PPR from scored lookup candidates (score, at least 1)."""
+    return {item["id"]: float(max(item.get("score", 0), 1)) for item in candidates[:limit] if item.get("id")}
+
+
+def ranked_relations(
     conn: sqlite3.Connection,
-    seed_ids: list[str],
-    per_hop_limit: int = 12,
-) -> list[str]:
-    if not seed_ids:
+    seed_weights: dict[str, float],
+    limit: int,
+    *,
+    alpha: float = PPR_ALPHA_DEFAULT,
+    epsilon: float = PPR_EPSILON_DEFAULT,
+) -> list[tuple[str, str, str, float]]:
+    """Top relations by personalized PageRank flow from the weighted seeds.
+
+    Unlike relation_evidence this reaches past the seeds' own edges and orders
+    by relevance. Always runs on the CSR graph; per-seed vectors are cached on
+    it until the ontology version changes.
+    """
+    if not seed_weights:
         return []
-    qmarks = ",".join("?" for _ in seed_ids)
-    first_hop = conn.execute(
-        f"""
-        SELECT source_id, type, target_id
-        FROM onto_relations
-        WHERE source_id IN ({qmarks})
-        LIMIT ?
-        """,
-        [*seed_ids, per_hop_limit],
-    ).fetchall()
-    if not first_hop:
+    return relation_graph(conn).ranked_edges(seed_weights, limit, alpha=alpha, epsilon=epsilon)
+
+
+def graph_backend() -> str:
+    """'csr' (in-memory graph, default) or 'sqlite' (one SQL statement per call)."""
+    return "sqlite" if os.getenv("GRAPH_BACKEND", "").strip().lower() == "sqlite" else "csr"
+
+
+def relation_graph(conn: sqlite3.Connection) -> RelationGraph:
+    """CSR adjacency for this database, rebuilt when the ontology version changes."""
+    return get_relation_graph(
+        ontology_cache_key(conn),
+        lambda: (row[0] for row in conn.execute("SELECT id FROM onto_instances")),
+        lambda: conn.execute("SELECT source_id, type, target_id FROM onto_relations"),
+    )
+
+
+@dataclass(frozen=True)
+class GraphPath:
+    """A relation chain: nodes[0] -[relations[0]]-> nodes[1] -> ...
+
+    `forward` (empty = all True) marks relations walked against their
+    direction, rendered as nodes[i] <-[rel]- nodes[i + 1].
+    """
+
+    nodes: tuple[str, ...]
+    relations: tuple[str, ...]
+    forward: tuple[bool, ...] = ()
+
+    @property
+    def hops(self) -> int:
+        return len(self.relations)
+
+    def line(self) -> str:
+        parts = [self.nodes[0]]
+        for i, (rel, node) in enumerate(zip(self.relations, self.nodes[1:])):
+            if self.forward and not self.forward[i]:
+                parts.append(f"<-[{rel}]- {node}")
+            else:
+                parts.append(f"-[{rel}]-> {node}")
+        return "- " + " ".join(parts)
+
+    def as_dict(self) -> dict[str, Any]:
+        payload: dict[str, Any] = {
+            "nodes": list(self.nodes),
+            "relations": list(self.relations),
+            "hops": self.hops,
+        }
+        if self.forward:
+            payload["forward"] = list(self.forward)
+        return payload
+
+
+@dataclass(frozen=True)
+class PathSearch:
+    """Outcome of one shortest_path call; `stopped` names the budget that ended a miss."""
+
+    source_id: str
+    target_id: str
+    path: GraphPath | None
+    visited: int
+    depth: int
+    elapsed_ms: float
+    stopped: str | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "source_id": self.source_id,
+            "target_id": self.target_id,
+            "found": self.path is not None,
+            "path": self.path.as_dict() if self.path else None,
+            "line": self.path.line() if self.path else None,
+            "visited": self.visited,
+            "depth": self.depth,
+            "elapsed_ms": self.elapsed_ms,
+            "stopped": self.stopped,
+        }
+
+
+def graph_max_hops() -> int:
+    try:
+        return max(1, int(os.getenv("GRAPH_MAX_HOPS", "")))
+    except ValueError:
+        return GRAPH_MAX_HOPS_DEFAULT
+
+
+def graph_relation_types() -> list[str] | None:
+    raw = os.getenv("GRAPH_RELATION_TYPES", "")
+    types = [item.strip() for item in raw.split(",") if item.strip()]
+    return types or None
+
+
+def graph_paths(
+    conn: sqlite3.Connection,
+    seed_ids: list[str],
+    *,
+    max_hops: int | None = None,
+    fan_out: int = GRAPH_FAN_OUT_DEFAULT,
+    relation_types: Iterable[str] | None = None,
+    max_paths: int = 24,
+) -> list[GraphPath]:
+    """Maximal outgoing paths (no revisited nodes) from the seeds.
+
+    Runs on the in-memory CSR graph, or GRAPH_PATHS_QUERY when GRAPH_BACKEND=sqlite.
+
+    max_hops/relation_types default to GRAPH_MAX_HOPS / GRAPH_RELATION_TYPES.
+    Paths are grouped by seed in the given order; a path that another result
+    extends is dropped, so each chain appears once at its longest.
+    """
+    seeds = list(dict.fromkeys(seed_ids))
+    if not seeds:
         return []
+    if max_hops is None:
+        max_hops = graph_max_hops()
+    if relation_types is None:
+        relation_types = graph_relation_types()
+    relation_types = list(relation_types or []) or None
+    budget = len(seeds) + GRAPH_ROW_BUDGET_PER_PATH * max(1, max_paths)
+    if graph_backend() == "sqlite":
+        types_json = json.dumps(relation_types) if relation_types else None
+        rows = conn.execute(
+            GRAPH_PATHS_QUERY,
+            (json.dumps(seeds), max_hops, types_json, types_json, fan_out, budget),
+        ).fetchall()
+        walks = [GraphPath(tuple(json.loads(nodes)), tuple(json.loads(edges))) for nodes, edges in rows]
+    else:
+        walks = [
+            GraphPath(nodes, edges)
+            for nodes, edges in relation_graph(conn).walk(
+                seeds, max_hops=max_hops, fan_out=fan_out, relation_types=relation_types, budget=budget
+            )
+        ]
+    extended = {walk.nodes[:-1] for walk in walks if walk.hops > 1}
+    order = {seed: i for i, seed in enumerate(seeds)}
+    paths = [walk for walk in walks if walk.nodes not in extended]
+    paths.sort(key=lambda path: (order[path.nodes[0]], path.nodes, path.relations))
+    return paths[:max_paths]
 
-    targets = list({target for _, _, target in first_hop})
-    qmarks2 = ",".join("?" for _ in targets)
-    second_hop = conn.execute(
-        f"""
-        SELECT source_id, type, target_id
-        FROM onto_relations
-        WHERE source_id IN ({qmarks2})
-        LIMIT ?
-        """,
-        [*targets, per_hop_limit],
-    ).fetchall()
 
-    paths: list[str] = []
-    second_by_source: dict[str, list[tuple[str, str, str]]] = {}
-    for s2, r2, t2 in second_hop:
-        second_by_source.setdefault(s2, []).append((s2, r2, t2))
-    for s1, r1, t1 in first_hop:
-        chained = second_by_source.get(t1, [])
-        if not chained:
-            paths.append(f"- {s1} -[{r1}]-> {t1}")
-            continue
-        for _, r2, t2 in chained:
-            paths.append(f"- {s1} -[{r1}]-> {t1} -[{r2}]-> {t2}")
-    return paths[: per_hop_limit * 2]
+def graph_path_max_depth() -> int:
+    try:
+        return max(1, int(os.getenv("GRAPH_PATH_MAX_DEPTH", "")))
+    except ValueError:
+        return PATH_MAX_DEPTH_DEFAULT
+
+
+def graph_path_time_budget_ms() -> float:
+    try:
+        return max(0.0, float(os.getenv("GRAPH_PATH_TIME_BUDGET_MS", "")))
+    except ValueError:
+        return PATH_TIME_BUDGET_MS_DEFAULT
+
+
+def shortest_path(
+    conn: sqlite3.Connection,
+    source_id: str,
+    target_id: str,
+    *,
+    max_depth: int | None = None,
+    time_budget_ms: float | None = None,
+    relation_types: Iterable[str] | None = None,
+    directed: bool = False,
+    max_visited: int = PATH_MAX_VISITED_DEFAULT,
+) -> PathSearch:
+    """Fewest-hop connection between two instances (bidirectional BFS on the CSR graph).
+
+    Relations may be followed backwards unless `directed`. max_depth and
+    time_budget_ms default to GRAPH_PATH_MAX_DEPTH / GRAPH_PATH_TIME_BUDGET_MS;
+    the time budget covers the search itself, not the one-off graph build.
+    """
+    if max_depth is None:
+        max_depth = graph_path_max_depth()
+    if time_budget_ms is None:
+        time_budget_ms = graph_path_time_budget_ms()
+    if relation_types is None:
+        relation_types = graph_relation_types()
+    graph = relation_graph(conn)
+    started = time.perf_counter()
+    found, stats = graph.shortest_path(
+        source_id,
+        target_id,
+        max_depth=max_depth,
+        relation_types=list(relation_types or []) or None,
+        directed=directed,
+        deadline=started + time_budget_ms / 1000.0,
+        max_visited=max_visited,
+    )
+    return PathSearch(
+        source_id=source_id,
+        target_id=target_id,
+        path=GraphPath(*found) if found else None,
+        visited=stats["visited"],
+        depth=stats["depth"],
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 3),
+        stopped=stats["stopped"],
+    )
+
+
+def connecting_path(
+    conn: sqlite3.Connection, question: str, analysis: QueryAnalysis | None = None
+) -> PathSearch | None:
+    """Path between the first and last distinct entities linked in the question."""
+    linked = list(dict.fromkeys(m.instance_id for m in link_entities(conn, question, analysis)))
+    if len(linked) < 2:
+        return None
+    return shortest_path(conn, linked[0], linked[-1])
+
+
+def term_doc_index(conn: sqlite3.Connection) -> TermDocIndex:
+    """Per-field term-document matrices for this database, rebuilt when the ontology version changes."""
+    return get_term_doc_index(
+        ontology_cache_key(conn),
+        lambda: (
+            (inst_id, _split_search_text(search_text))
+            for inst_id, _, _, _, search_text in conn.execute(
+                DENSE_PROXY_TEMPLATE.format(docs=instance_docs_source(conn))
+            )
+        ),
+    )
 
 
 def dense_proxy_context(
     conn: sqlite3.Connection,
     question: str,
     limit: int,
+    analysis: QueryAnalysis | None = None,
 ) -> tuple[str, dict[str, Any]]:
-    tokens = [t for t in extract_query_terms(question) if t and len(t) >= 2]
-    rows = conn.execute(
-        """
-        SELECT i.id, i.class_name, COALESCE(i.label, ''),
-               COALESCE(group_concat(p.key || '=' || p.value, '; '), '')
-        FROM onto_instances i
-        LEFT JOIN onto_properties p ON p.instance_id = i.id
-        GROUP BY i.id, i.class_name, i.label
-        """
-    ).fetchall()
-    scored: list[dict[str, Any]] = []
-    for inst_id, class_name, label, props in rows:
-        text_id = (inst_id or "").lower()
-        text_class = (class_name or "").lower()
-        text_label = (label or "").lower()
-        text_props = (props or "").lower()
-        score = 0
-        matched: list[str] = []
-        for token in tokens:
-            hit = False
-            if token in text_id:
-                score += 3
-                hit = True
-            if token in text_class:
-                score += 1
-                hit = True
-            if token in text_label:
-                score += 5
-                hit = True
-            if token in text_props:
-                score += 2
-                hit = True
-            if hit:
-                matched.append(token)
-        if score > 0:
-            scored.append(
-                {
-                    "id": inst_id,
-                    "class_name": class_name,
-                    "label": label,
-                    "props": props,
-                    "score": score,
-                    "matched_terms": sorted(set(matched)),
-                }
-            )
-    scored.sort(key=lambda item: (-item["score"], item["id"]))
-    top = scored[:limit]
+    """Token-score retrieval: per token, +3 id / +1 class / +5 label / +2 props substring hit."""
+    tokens = list((analysis or analyze_query(conn, question)).terms)
+    index = term_doc_index(conn)
+    scores, matched = index.score(tokens, DENSE_PROXY_FIELD_WEIGHTS)
+    best = index.top(scores, limit)
+    rows = {
+        row[0]: row
+        for row in conn.execute(
+            INSTANCE_DOCS_TEMPLATE.format(docs=instance_docs_source(conn)),
+            (json.dumps([index.ids[doc] for doc in best]),),
+        )
+    }
+    top: list[dict[str, Any]] = []
+    for doc in best:
+        inst_id = index.ids[doc]
+        if inst_id not in rows:
+            continue
+        _, class_name, label, props, _, _ = rows[inst_id]
+        top.append(
+            {
+                "id": inst_id,
+                "class_name": class_name,
+                "label": label,
+                "props": props,
+                "score": int(scores[doc]),
+                "matched_terms": sorted({token for token, hit in zip(tokens, matched) if hit[doc]}),
+            }
+        )
     if not top:
         return "No matching ontology facts found.", {"tokens": tokens, "scored_candidates": []}
     lines = [
@@ -436,41 +2413,375 @@ def dense_proxy_context(
     return "\n".join(lines), {"tokens": tokens, "scored_candidates": top}
 
 
-def enrichment_targets(conn: sqlite3.Connection, limit: int) -> list[dict[str, str]]:
+def embedding_model() -> str:
+    return os.getenv("EMBEDDING_MODEL", "").strip() or EMBEDDING_MODEL_DEFAULT
+
+
+def embedding_dtype() -> str:
+    dtype = os.getenv("EMBEDDING_INDEX_DTYPE", "").strip().lower()
+    return dtype if dtype in EMBEDDING_DTYPES else EMBEDDING_DTYPES[0]
+
+
+def embedding_batch_size() -> int:
+    try:
+        return max(1, int(os.getenv("EMBEDDING_BATCH_SIZE", "")))
+    except ValueError:
+        return EMBEDDING_BATCH_SIZE_DEFAULT
+
+
+def _env_int_default(name: str, default: int, minimum: int = 1) -> int:
+    try:
+        return max(minimum, int(os.getenv(name, "")))
+    except ValueError:
+        return default
+
+
+def embedding_ann() -> str:
+    """EMBEDDING_ANN: auto (ivf from ANN_MIN_ROWS rows), exact, ivf or hnsw (needs hnswlib)."""
+    backend = os.getenv("EMBEDDING_ANN", "").strip().lower()
+    return backend if backend in ANN_BACKENDS else "auto"
+
+
+def embedding_ann_params() -> dict[str, int | None]:
+    lists = _env_int_default("EMBEDDING_IVF_LISTS", 0, minimum=0)
+    return {"lists": lists or None, "m": _env_int_default("EMBEDDING_HNSW_M", HNSW_M_DEFAULT)}
+
+
+def embedding_search_params() -> dict[str, int]:
+    return {
+        "nprobe": _env_int_default("EMBEDDING_IVF_NPROBE", IVF_NPROBE_DEFAULT),
+        "ef": _env_int_default("EMBEDDING_HNSW_EF", HNSW_EF_DEFAULT),
+    }
+
+
+def embedding_enabled() -> bool:
+    """EMBEDDING_PROVIDER is sentence-transformers (default) and the package is installed."""
+    provider = os.getenv("EMBEDDING_PROVIDER", "sentence-transformers").strip().lower()
+    return provider == "sentence-transformers" and importlib.util.find_spec("sentence_transformers") is not None
+
+
+def _embedding_text(class_name: str, label: str, props: str) -> str:
+    return f"{label} ({class_name}): {props}" if props else f"{label} ({class_name})"
+
+
+def _embedding_path(conn: sqlite3.Connection, path: str | Path | None) -> Path:
+    return Path(path) if path is not None else index_dir(ontology_cache_key(conn)[0])
+
+
+def rebuild_embedding_index(
+    conn: sqlite3.Connection, path: str | Path | None = None, *, model: str | None = None
+) -> dict[str, Any]:
+    """Encode every instance document (batched, CPU) into `<db>.vectors/`."""
+    started = time.perf_counter()
+    model = model or embedding_model()
+    batch_size = embedding_batch_size()
+    docs = instance_docs_source(conn)
+    count = conn.execute(f"SELECT count(*) FROM {docs}").fetchone()[0]
+
+    def chunks() -> Iterator[tuple[list[str], Any]]:
+        cursor = conn.execute(EMBEDDING_DOCS_TEMPLATE.format(docs=docs))
+        while True:
+            rows = cursor.fetchmany(batch_size * 16)
+            if not rows:
+                return
+            yield [row[0] for row in rows], encode_texts(
+                model, [_embedding_text(*row[1:]) for row in rows], batch_size
+            )
+
+    index = EmbeddingIndex.build(
+        _embedding_path(conn, path),
+        model=model,
+        dtype=embedding_dtype(),
+        version=get_ontology_version(conn),
+        count=count,
+        chunks=chunks(),
+        ann=embedding_ann(),
+        **embedding_ann_params(),
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": "full",
+        "encoded": len(index.ids),
+        "dim": index.meta["dim"],
+        "ann": index.backend,
+        "elapsed_sec": round(elapsed, 3),
+        "docs_per_sec": round(len(index.ids) / elapsed, 1) if elapsed > 0 else float(len(index.ids)),
+    }
+
+
+def refresh_embedding_index(
+    conn: sqlite3.Connection, path: str | Path | None = None, *, model: str | None = None
+) -> dict[str, Any]:
+    """Re-encode only instances inserted/updated since the index was built.
+
+    Deleted instances free their rows. A missing index, a different model or
+    dtype, or a change log that cannot explain the gap falls back to
+    rebuild_embedding_index; a changed EMBEDDING_ANN setting only retrains
+    the ANN structure over the stored vectors.
+    """
+    started = time.perf_counter()
+    model = model or embedding_model()
+    path = _embedding_path(conn, path)
+    index = EmbeddingIndex.open(path)
+    if index is None or index.model != model or index.meta["dtype"] != embedding_dtype():
+        return rebuild_embedding_index(conn, path, model=model)
+    changes = ontology_changes_since(conn, index.version)
+    if changes is None:
+        return rebuild_embedding_index(conn, path, model=model)
+
+    encoded: list[str] = []
+    deleted: list[str] = []
+    if changes:
+        touched = sorted({key for _, kind, key, _ in changes if kind == "instance"})
+        rows = conn.execute(
+            INSTANCE_DOCS_TEMPLATE.format(docs=instance_docs_source(conn)), (json.dumps(touched),)
+        ).fetchall()
+        encoded = [row[0] for row in rows]
+        vectors = encode_texts(
+            model,
+            [_embedding_text(cls, label, props) for _, cls, label, props, _, _ in rows],
+            embedding_batch_size(),
+        )
+        deleted = sorted(set(touched) - set(encoded))
+        index = index.apply(
+            version=get_ontology_version(conn),
+            upserts=dict(zip(encoded, vectors)),
+            deletes=deleted,
+        )
+    params = embedding_ann_params()
+    if index.meta.get("ann_setting") != embedding_ann() or any(
+        index.meta.get("ann_params", {}).get(key) != value for key, value in params.items()
+    ):
+        index = index.train_ann(embedding_ann(), **params)
+    elif not changes:
+        return {"mode": "unchanged", "encoded": 0, "deleted": 0, "ann": index.backend, "elapsed_sec": 0.0}
+    return {
+        "mode": "incremental",
+        "encoded": len(encoded),
+        "deleted": len(deleted),
+        "ann": index.backend,
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+    }
+
+
+def hybrid_alpha() -> float:
+    """HYBRID_ALPHA: weight of the dense score in the fused score (BM25 gets the rest)."""
+    try:
+        return min(1.0, max(0.0, float(os.getenv("HYBRID_ALPHA", ""))))
+    except ValueError:
+        return HYBRID_ALPHA_DEFAULT
+
+
+def bm25_search(
+    conn: sqlite3.Connection, question: str, limit: int, *, ids: list[str] | None = None
+) -> list[tuple[str, float]]:
+    """BM25 (id, score) from the postings index: top `limit`, or the scores of `ids`."""
+    if not has_bm25_index(conn):
+        return []
+    docs, length = _bm25_stats(conn)
+    terms = bm25_terms(question)
+    if not docs or not terms:
+        return []
+    df = dict(conn.execute(BM25_DF_QUERY, (json.dumps(list(terms)),)).fetchall())
+    weights = query_term_weights(terms, df, docs)
+    if not weights:
+        return []
+    params = (BM25_K1, BM25_B, length / docs)
+    if ids is not None:
+        return conn.execute(BM25_SCORES_QUERY, (json.dumps(weights), json.dumps(ids), *params)).fetchall()
+    return conn.execute(BM25_SEARCH_QUERY, (json.dumps(weights), limit, *params)).fetchall()
+
+
+def hybrid_search(
+    conn: sqlite3.Connection, question: str, limit: int
+) -> tuple[list[dict[str, Any]], dict[str, Any]] | None:
+    """Fused dense + BM25 ranking for method5/6, or None when neither index exists.
+
+    Each side proposes HYBRID_POOL_FACTOR x `limit` candidates; every
+    candidate is then scored by both (cosine against its stored vector,
+    BM25 restricted to the candidate ids), so the fusion never treats
+    "not in the other side's top list" as zero. The fused score is
+    alpha * max(cosine, 0) + (1 - alpha) * bm25 / max bm25. Without an
+    embedding index the ranking is BM25 alone. Hits are joined back to the
+    current documents, so instances deleted after the last vector refresh drop out.
+    """
+    started = time.perf_counter()
+    index = None
+    if embedding_enabled():
+        index = get_embedding_index(_embedding_path(conn, None))
+        if index is not None and not index.ids:
+            index = None
+    if index is None and not has_bm25_index(conn):
+        return None
+    pool = max(limit, 1) * HYBRID_POOL_FACTOR
+    lexical = dict(bm25_search(conn, question, pool))
+    info: dict[str, Any] = {"hybrid_alpha": 0.0, "bm25_candidates": len(lexical)}
+    dense: dict[str, float] = {}
+    if index is not None:
+        query = encode_query(index.model, question.strip())
+        dense = dict(index.search(query, pool, **embedding_search_params()))
+        missing = [inst_id for inst_id in lexical if inst_id not in dense]
+        dense.update(index.score_ids(query, missing))
+        only_dense = [inst_id for inst_id in dense if inst_id not in lexical]
+        lexical.update(bm25_search(conn, question, pool, ids=only_dense) if only_dense else [])
+        info.update(
+            {
+                "hybrid_alpha": hybrid_alpha(),
+                "embedding_model": index.model,
+                "embedding_ann": index.backend,
+                "embedding_index_version": index.version,
+                "embedding_index_stale": index.version != get_ontology_version(conn),
+            }
+        )
+    alpha = info["hybrid_alpha"]
+    top_bm25 = max(lexical.values(), default=0.0) or 1.0
+    fused = {
+        inst_id: alpha * max(dense.get(inst_id, 0.0), 0.0) + (1 - alpha) * lexical.get(inst_id, 0.0) / top_bm25
+        for inst_id in {*dense, *lexical}
+    }
+    best = sorted(fused, key=lambda inst_id: (-fused[inst_id], inst_id))[:limit]
     rows = conn.execute(
-        """
-        SELECT i.id, COALESCE(i.label, ''), p.key, COALESCE(p.value, '')
-        FROM onto_instances i
-        JOIN onto_properties p ON p.instance_id = i.id
-        WHERE lower(COALESCE(p.value, '')) IN ('', 'unknown', 'todo', 'n/a', '?')
-        LIMIT ?
-        """,
-        (limit,),
+        INSTANCE_DOCS_TEMPLATE.format(docs=instance_docs_source(conn)), (json.dumps(best),)
     ).fetchall()
+    ranked = [
+        {
+            "id": inst_id,
+            "class_name": cls,
+            "label": label,
+            "props": props,
+            "score": round(fused[inst_id], 4),
+            "dense_score": round(dense[inst_id], 4) if inst_id in dense else None,
+            "bm25_score": round(lexical.get(inst_id, 0.0), 4),
+        }
+        for inst_id, cls, label, props, _, _ in rows
+    ]
+    ranked.sort(key=lambda item: (-item["score"], item["id"]))
+    info["dense_backend"] = "hybrid" if index is not None else "bm25"
+    info["hybrid_search_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return ranked, info
+
+
+def dense_context(
+    conn: sqlite3.Connection,
+    question: str,
+    limit: int,
+    analysis: QueryAnalysis | None = None,
+) -> tuple[str, dict[str, Any]]:
+    """Hybrid dense + BM25 retrieval for method5/6; token-score proxy on databases without either index."""
+    found = hybrid_search(conn, question, limit)
+    if found is None:
+        context, debug = dense_proxy_context(conn, question, limit, analysis)
+        return context, {**debug, "dense_backend": "token-proxy"}
+    ranked, info = found
+    if not ranked:
+        return "No matching ontology facts found.", {**info, "scored_candidates": []}
+    lines = [
+        f"- {item['id']} ({item['class_name']}) label='{item['label']}' score={item['score']} props=[{item['props']}]"
+        for item in ranked
+    ]
+    return "\n".join(lines), {**info, "scored_candidates": ranked}
+
+
+def enrichment_targets(conn: sqlite3.Connection, limit: int) -> list[dict[str, str]]:
+    rows = conn.execute(ENRICHMENT_TARGETS_QUERY, (limit,)).fetchall()
     return [
         {"id": inst_id, "label": label, "missing_key": key, "value": value}
         for inst_id, label, key, value in rows
     ]
 
 
+def entity_link_context(
+    conn: sqlite3.Connection, question: str, limit: int, analysis: QueryAnalysis | None = None
+) -> tuple[str, dict[str, Any]] | None:
+    """Context and debug payload built from linked entities, or None if nothing links."""
+    mentions = link_entities(conn, question, analysis)
+    if not mentions:
+        return None
+
+    by_id: dict[str, list[EntityMention]] = {}
+    for mention in mentions:
+        by_id.setdefault(mention.instance_id, []).append(mention)
+    ranked_ids = sorted(
+        by_id,
+        key=lambda inst_id: (
+            -sum(m.end - m.start for m in by_id[inst_id]),
+            min(m.start for m in by_id[inst_id]),
+            inst_id,
+        ),
+    )[:limit]
+    rows = _fetch_instance_rows(conn, ranked_ids)
+
+    lines = [row[5] for row in rows]
+    rels = conn.execute(RELATIONS_BY_IDS_JSON_QUERY, (json.dumps(ranked_ids),)).fetchall()
+    if rels:
+        lines.append("relations:")
+        lines.extend([f"- {s} -[{t}]-> {d}" for s, t, d in rels])
+
+    candidates = [
+        {
+            "id": inst_id,
+            "class_name": cls,
+            "label": label,
+            "matched_terms": list(dict.fromkeys(m.surface for m in by_id[inst_id])),
+            "matched_fields": sorted({m.field for m in by_id[inst_id]}),
+            "score": sum(4 if m.field == "label" else 3 for m in by_id[inst_id]),
+        }
+        for inst_id, cls, label, *_ in rows
+    ]
+    surfaces = list(dict.fromkeys(m.surface for m in mentions))
+    debug = {
+        "query_terms": surfaces,
+        "prioritized_terms": sorted(surfaces, key=lambda t: (-len(t), t)),
+        "candidates": candidates,
+        "entity_links": [
+            {
+                "id": m.instance_id,
+                "field": m.field,
+                "surface": m.surface,
+                "start": m.start,
+                "end": m.end,
+            }
+            for m in mentions
+        ],
+    }
+    return "\n".join(lines), debug
+
+
 def lookup_ontology_context_by_method(
     conn: sqlite3.Connection,
     *,
     question: str,
     method_id: str,
     limit: int,
+    retrieval: RetrievalResult | None = None,
 ) -> tuple[str, dict[str, Any], dict[str, Any]]:
-    base_context = lookup_ontology_context(conn, question, limit=limit)
-    base_debug = lookup_ontology_debug(conn, question, limit=limit)
-    seed_ids = [item["id"] for item in base_debug.get("candidates", [])[:5] if item.get("id")]
+    """Method-specific context/debug/trace on top of one lexical retrieval pass.
+
+    Pass `retrieval` (from retrieve_ontology with the same question/limit) to reuse
+    a pass the caller already made, e.g. for the price hint; its QueryAnalysis
+    is reused by every step below.
+    """
     method_trace: dict[str, Any] = {"method_id": method_id}
+    analysis = (retrieval.analysis if retrieval else None) or analyze_query(conn, question)
+    if method_id == "method1":
+        linked = entity_link_context(conn, question, limit, analysis)
+        if linked is not None:
+            method_trace["retrieval_type"] = "entity-link"
+            method_trace["entity_link_count"] = len(linked[1]["entity_links"])
+            return linked[0], linked[1], method_trace
+
+    if retrieval is None:
+        retrieval = retrieve_ontology(conn, question, limit, with_price=False, analysis=analysis)
+    base_context = retrieval.context()
+    base_debug = retrieval.debug()
+    seed_ids = retrieval.seed_ids
 
     if method_id == "method1":
         method_trace["retrieval_type"] = "lexical-grounding"
         return base_context, base_debug, method_trace
 
     if method_id == "method2":
-        constraints = constraint_facts(conn, limit=max(3, limit // 2))
+        constraints = constraint_facts(conn, limit=max(3, limit // 2), seed_ids=seed_ids)
         method_trace["constraint_count"] = len(constraints)
         context = base_context
         if constraints:
@@ -478,34 +2789,70 @@ def lookup_ontology_context_by_method(
         return context, {**base_debug, "constraint_hits": constraints}, method_trace
 
     if method_id == "method3":
-        rel_lines = relation_evidence(conn, seed_ids, limit=max(6, limit * 2))
+        ranked = ranked_relations(
+            conn, candidate_seed_weights(retrieval.candidates, limit), limit=graph_top_k()
+        )
+        rel_lines = [f"- {source} -[{rel}]-> {target}" for source, rel, target, _ in ranked]
+        communities = community_summaries(conn, seed_ids)
         method_trace["relation_evidence_count"] = len(rel_lines)
+        method_trace["community_count"] = len(communities)
+        method_trace["retrieval_type"] = "personalized-pagerank"
         context = base_context
         if rel_lines:
-            context = base_context + "\nrelations:\n" + "\n".join(rel_lines)
-        return context, {**base_debug, "graph_relations": rel_lines}, method_trace
+            context = context + "\nrelations:\n" + "\n".join(rel_lines)
+        if communities:
+            context = context + "\ncommunity_summaries:\n" + format_community_summaries(communities)
+        return (
+            context,
+            {
+                **base_debug,
+                "graph_relations": rel_lines,
+                "graph_relation_scores": [round(score, 6) for *_, score in ranked],
+                "community_summaries": communities,
+            },
+            method_trace,
+        )
 
     if method_id == "method4":
-        path_lines = multihop_paths(conn, seed_ids, per_hop_limit=max(6, limit))
+        max_hops = graph_max_hops()
+        paths = graph_paths(conn, seed_ids, max_hops=max_hops, fan_out=max(6, limit), max_paths=max(6, limit) * 2)
+        path_lines = [path.line() for path in paths]
         method_trace["multi_hop_path_count"] = len(path_lines)
+        method_trace["max_hops"] = max_hops
+        method_trace["longest_path_hops"] = max((path.hops for path in paths), default=0)
+        search = connecting_path(conn, question, analysis)
         context = base_context
+        if search is not None:
+            method_trace["connecting_path_hops"] = search.path.hops if search.path else None
+            method_trace["connecting_path_ms"] = search.elapsed_ms
+            if search.path:
+                context = context + "\nconnecting_path:\n" + search.path.line()
         if path_lines:
-            context = base_context + "\nreasoning_paths:\n" + "\n".join(path_lines)
-        return context, {**base_debug, "reasoning_paths": path_lines}, method_trace
+            context = context + "\nreasoning_paths:\n" + "\n".join(path_lines)
+        return (
+            context,
+            {
+                **base_debug,
+                "reasoning_paths": path_lines,
+                "reasoning_path_graph": [path.as_dict() for path in paths],
+                "connecting_path": search.as_dict() if search else None,
+            },
+            method_trace,
+        )
 
     if method_id == "method5":
-        dense_context, dense_debug = dense_proxy_context(conn, question, limit=limit)
-        method_trace["retrieval_type"] = "dense-proxy"
-        return dense_context, {**base_debug, **dense_debug}, method_trace
+        dense_text, dense_debug = dense_context(conn, question, limit=limit, analysis=analysis)
+        method_trace["retrieval_type"] = DENSE_RETRIEVAL_TYPES[dense_debug["dense_backend"]]
+        return dense_text, {**base_debug, **dense_debug}, method_trace
 
     if method_id == "method6":
-        dense_context, dense_debug = dense_proxy_context(conn, question, limit=limit)
-        constraints = constraint_facts(conn, limit=max(3, limit // 2))
+        dense_text, dense_debug = dense_context(conn, question, limit=limit, analysis=analysis)
+        constraints = constraint_facts(conn, limit=max(3, limit // 2), seed_ids=seed_ids)
         method_trace["retrieval_type"] = "neuro-symbolic"
         method_trace["constraint_count"] = len(constraints)
-        context = dense_context
+        context = dense_text
         if constraints:
-            context = "[Symbolic Rules]\n" + "\n".join(constraints) + "\n\n[Neural Retrieval]\n" + dense_context
+            context = "[Symbolic Rules]\n" + "\n".join(constraints) + "\n\n[Neural Retrieval]\n" + dense_text
         return context, {**base_debug, **dense_debug, "constraint_hits": constraints}, method_trace
 
     if method_id == "method7":
@@ -530,3 +2877,86 @@ def lookup_ontology_context_by_method(
 
     method_trace["retrieval_type"] = "default-lexical"
     return base_context, base_debug, method_trace
+
+
+def lookup_settings_stamp(conn: sqlite3.Connection) -> str:
+    """Fingerprint of what changes a lookup besides the ontology version:
+    community and embedding index builds (which do not bump it) and the
+    retrieval env settings (HYBRID_ALPHA, EMBEDDING_*, GRAPH_*)."""
+    try:
+        index_build = (_embedding_path(conn, None) / "meta.json").stat().st_mtime_ns
+    except OSError:
+        index_build = 0
+    community_build = None
+    if has_communities(conn):
+        row = conn.execute("SELECT value FROM onto_meta WHERE key = 'community_build'").fetchone()
+        community_build = row[0] if row else None
+    settings = {
+        "community_build": community_build,
+        "embedding_index": index_build,
+        "embedding_enabled": embedding_enabled(),
+        "embedding_model": embedding_model(),
+        "embedding_ann": embedding_ann(),
+        **embedding_search_params(),
+        "hybrid_alpha": hybrid_alpha(),
+        "graph_backend": graph_backend(),
+        "graph_top_k": graph_top_k(),
+        "graph_max_hops": graph_max_hops(),
+        "graph_relation_types": graph_relation_types(),
+        "graph_path_max_depth": graph_path_max_depth(),
+        "graph_path_time_budget_ms": graph_path_time_budget_ms(),
+    }
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class MethodLookup:
+    """Lookup stage of one chat turn: method context plus the lexical pass's terms and price fact."""
+
+    context: str
+    debug: dict[str, Any]
+    trace: dict[str, Any]
+    terms: list[str]
+    price_fact: str | None = None
+    cached: bool = False
+
+
+def cached_method_lookup(
+    conn: sqlite3.Connection,
+    *,
+    question: str,
+    method_id: str,
+    limit: int,
+) -> MethodLookup:
+    """retrieve_ontology + lookup_ontology_context_by_method behind the result cache.
+
+    Keyed by (database, ontology version, lookup_settings_stamp, normalized
+    question, method_id, limit): ingest/reset bump the version, and community
+    or embedding rebuilds and retrieval setting changes alter the stamp, so
+    stale results are never served.
+    """
+    cache = get_result_cache()
+    key = None
+    if cache is not None:
+        db_key, version = ontology_cache_key(conn)
+        key = (db_key, version, lookup_settings_stamp(conn), normalize_question(question), method_id, limit)
+        hit = cache.get(key)
+        if hit is not None:
+            return MethodLookup(**hit, cached=True)
+    retrieval = retrieve_ontology(conn, question, limit)
+    context, debug, trace = lookup_ontology_context_by_method(
+        conn, question=question, method_id=method_id, limit=limit, retrieval=retrieval
+    )
+    result = MethodLookup(context, debug, trace, retrieval.terms, retrieval.price_fact)
+    if key is not None:
+        cache.put(
+            key,
+            {
+                "context": context,
+                "debug": debug,
+                "trace": trace,
+                "terms": result.terms,
+                "price_fact": result.price_fact,
+            },
+        )
+    return result
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import re
+from typing import Callable, Iterable
+
+import numpy as np
+
+from ontology_llm.tools.pool_tools import DbScopedCache
+
+TERM_DOC_FIELDS = ("id", "class", "label", "props")
+
+# A query token made only of these characters occurs inside a single run of
+# them, so "token in field" equals "token in some run of the field".
+_RUN_RE = re.compile(r"[0-9a-z가-힣]+")
+_TERM_SEP = "\x00"
+
+
+def _gather(indptr: np.ndarray, postings: np.ndarray, terms: np.ndarray) -> np.ndarray:
+    """Concatenated posting rows of `terms` (CSR row gather without a Python loop)."""
+    starts = indptr[terms]
+    lengths = indptr[terms + 1] - starts
+    total = int(lengths.sum())
+    if not total:
+        return postings[:0]
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return postings[offsets + np.arange(total)]
+
+
+class FieldTerms:
+    """Sparse term x document incidence of one search field, CSR over a sorted vocabulary.
+
+    The vocabulary is also kept as one NUL-joined string so a substring query
+    resolves to its containing terms with a single C-level scan.
+    """
+
+    def __init__(self, texts: list[str]) -> None:
+        postings: dict[str, list[int]] = {}
+        for doc, text in enumerate(texts):
+            for term in set(_RUN_RE.findall(text)):
+                postings.setdefault(term, []).append(doc)
+        vocab = sorted(postings)
+        self.texts = texts
+        self.indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum([len(postings[term]) for term in vocab], out=self.indptr[1:])
+        self.postings = np.fromiter(
+            (doc for term in vocab for doc in postings[term]), dtype=np.int32, count=int(self.indptr[-1])
+        )
+        self.blob = _TERM_SEP.join(vocab)
+        self.term_starts = np.zeros(len(vocab), dtype=np.int64)
+        if vocab:
+            np.cumsum([len(term) + 1 for term in vocab[:-1]], out=self.term_starts[1:])
+
+    def hits(self, token: str, docs: int) -> np.ndarray:
+        """Boolean mask of documents whose field text contains `token`."""
+        mask = np.zeros(docs, dtype=bool)
+        if _RUN_RE.fullmatch(token):
+            positions = [m.start() for m in re.finditer(re.escape(token), self.blob)]
+            if positions:
+                terms = np.unique(np.searchsorted(self.term_starts, positions, side="right") - 1)
+                mask[_gather(self.indptr, self.postings, terms)] = True
+            return mask
+        # Tokens with separators (e.g. the whole question): every run inside
+        # must match, then confirm the exact substring on those candidates.
+        candidates = np.ones(docs, dtype=bool)
+        for piece in _RUN_RE.findall(token):
+            candidates &= self.hits(piece, docs)
+        for doc in np.flatnonzero(candidates):
+            mask[doc] = token in self.texts[doc]
+        return mask
+
+
+class TermDocIndex:
+    """Per-field term-document matrices over the instance documents, sorted by id."""
+
+    def __init__(self, ids: list[str], fields: list[FieldTerms]) -> None:
+        self.ids = ids
+        self.fields = fields
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple[str, list[str]]]) -> TermDocIndex:
+        """`rows` are (instance id, lowercased field texts in TERM_DOC_FIELDS order)."""
+        ordered = sorted(rows, key=lambda row: row[0])
+        ids = [inst_id for inst_id, _ in ordered]
+        columns = [[texts[i] if i < len(texts) else "" for _, texts in ordered] for i in range(len(TERM_DOC_FIELDS))]
+        return cls(ids, [FieldTerms(column) for column in columns])
+
+    def score(self, tokens: list[str], weights: tuple[int, ...]) -> tuple[np.ndarray, list[np.ndarray]]:
+        """Sum over tokens of the weights of the fields each token occurs in,
+        plus one "matched anywhere" mask per token."""
+        docs = len(self.ids)
+        scores = np.zeros(docs, dtype=np.int32)
+        matched: list[np.ndarray] = []
+        for token in tokens:
+            any_hit = np.zeros(docs, dtype=bool)
+            for field, weight in zip(self.fields, weights):
+                hit = field.hits(token, docs)
+                scores += weight * hit
+                any_hit |= hit
+            matched.append(any_hit)
+        return scores, matched
+
+    @staticmethod
+    def top(scores: np.ndarray, limit: int) -> np.ndarray:
+        """Positive-score documents, best `limit` by (-score, id)."""
+        candidates = np.flatnonzero(scores > 0)
+        if limit <= 0 or not len(candidates):
+            return candidates[:0]
+        if len(candidates) > limit:
+            kth = scores[candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]].min()
+            candidates = candidates[scores[candidates] >= kth]
+        # Rows are id-sorted, so the position breaks score ties by id.
+        return candidates[np.lexsort((candidates, -scores[candidates]))][:limit]
+
+
+_TERM_DOC_CACHE: DbScopedCache[TermDocIndex] = DbScopedCache()
+
+
+def get_term_doc_index(
+    cache_key: tuple[str, int],
+    load_rows: Callable[[], Iterable[tuple[str, list[str]]]],
+) -> TermDocIndex:
+    """Return the term-document index for (db identity, ontology version), building it once."""
+    return _TERM_DOC_CACHE.get(cache_key, lambda: TermDocIndex.from_rows(load_rows()))
+